@@ -0,0 +1,198 @@
+"""Benchmark JSON decoders on exchange WebSocket payloads.
+
+Decodes recorded-shape frames of Binance, Bybit, OKX and bitFlyer public
+streams with the standard library and with every optional decoder that is
+installed (orjson, ujson, msgspec, rapidjson), and reports CPU time per frame.
+A file of recorded frames, one JSON text per line, can be used instead.
+
+A decoder measured here can be passed to the client without patching the
+library, for example::
+
+    topgun.Client(json_loads=orjson.loads, json_dumps=lambda o: orjson.dumps(o).decode())
+
+    python benchmarks/json_decoders.py [--frames N] [--repeat N] [--file PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+Decoder = Callable[[str], Any]
+
+
+def _levels(rng: random.Random, mid: float, step: float, n: int) -> list[list[str]]:
+    return [
+        [f"{mid + step * i:.2f}", f"{rng.uniform(0.001, 5):.3f}"] for i in range(n)
+    ]
+
+
+def binance(rng: random.Random, n: int) -> list[str]:
+    """Combined stream ``depthUpdate`` diffs."""
+    return [
+        json.dumps(
+            {
+                "stream": "btcusdt@depth@100ms",
+                "data": {
+                    "e": "depthUpdate",
+                    "E": 1_700_000_000_000 + i,
+                    "s": "BTCUSDT",
+                    "U": i * 10,
+                    "u": i * 10 + 9,
+                    "b": _levels(rng, 40_000.0, -0.01, rng.randint(1, 20)),
+                    "a": _levels(rng, 40_000.01, 0.01, rng.randint(1, 20)),
+                },
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def bybit(rng: random.Random, n: int) -> list[str]:
+    """``orderbook.50`` deltas."""
+    return [
+        json.dumps(
+            {
+                "topic": "orderbook.50.BTCUSDT",
+                "type": "delta",
+                "ts": 1_700_000_000_000 + i,
+                "data": {
+                    "s": "BTCUSDT",
+                    "b": _levels(rng, 40_000.0, -0.1, rng.randint(1, 10)),
+                    "a": _levels(rng, 40_000.1, 0.1, rng.randint(1, 10)),
+                    "u": i,
+                    "seq": i * 3,
+                },
+                "cts": 1_700_000_000_000 + i,
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def okx(rng: random.Random, n: int) -> list[str]:
+    """``books`` updates with checksums."""
+    return [
+        json.dumps(
+            {
+                "arg": {"channel": "books", "instId": "BTC-USDT"},
+                "action": "update",
+                "data": [
+                    {
+                        "asks": [
+                            [*level, "0", "3"]
+                            for level in _levels(rng, 40_000.1, 0.1, rng.randint(1, 8))
+                        ],
+                        "bids": [
+                            [*level, "0", "2"]
+                            for level in _levels(rng, 40_000.0, -0.1, rng.randint(1, 8))
+                        ],
+                        "ts": str(1_700_000_000_000 + i),
+                        "checksum": rng.randint(-(2**31), 2**31 - 1),
+                        "seqId": i,
+                        "prevSeqId": i - 1,
+                    }
+                ],
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def bitflyer(rng: random.Random, n: int) -> list[str]:
+    """``lightning_executions`` batches."""
+    return [
+        json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "channelMessage",
+                "params": {
+                    "channel": "lightning_executions_FX_BTC_JPY",
+                    "message": [
+                        {
+                            "id": i * 10 + j,
+                            "side": rng.choice(["BUY", "SELL"]),
+                            "price": 6_000_000 + rng.randint(-500, 500),
+                            "size": round(rng.uniform(0.01, 1), 8),
+                            "exec_date": "2024-01-01T00:00:00.0000000Z",
+                            "buy_child_order_acceptance_id": f"JRF20240101-{j:06d}",
+                            "sell_child_order_acceptance_id": f"JRF20240101-{j:06d}",
+                        }
+                        for j in range(rng.randint(1, 5))
+                    ],
+                },
+            }
+        )
+        for i in range(n)
+    ]
+
+
+CASES: list[tuple[str, Callable[[random.Random, int], list[str]]]] = [
+    ("binance", binance),
+    ("bybit", bybit),
+    ("okx", okx),
+    ("bitflyer", bitflyer),
+]
+
+
+def decoders() -> list[tuple[str, Decoder]]:
+    """The standard library decoder followed by the installed optional ones."""
+    found: list[tuple[str, Decoder]] = [("json", json.loads)]
+    for name, attr in (
+        ("orjson", "loads"),
+        ("ujson", "loads"),
+        ("msgspec.json", "decode"),
+        ("rapidjson", "loads"),
+    ):
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        found.append((name, getattr(module, attr)))
+    return found
+
+
+def run(loads: Decoder, frames: list[str], repeat: int) -> float:
+    """Return the best CPU time of ``repeat`` passes."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for frame in frames:
+            loads(frame)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--file", help="recorded frames, one JSON text per line")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as fp:
+            payloads = [("file", [line for line in fp.read().splitlines() if line])]
+    else:
+        payloads = [
+            (name, generate(random.Random(0), args.frames)) for name, generate in CASES
+        ]
+
+    print(f"{'payload':<10}{'decoder':<14}{'us/frame':>10}{'MB/s':>10}")
+    for name, frames in payloads:
+        size = sum(len(frame) for frame in frames)
+        for decoder, loads in decoders():
+            elapsed = run(loads, frames, args.repeat)
+            print(
+                f"{name:<10}{decoder:<14}{elapsed / len(frames) * 1e6:>10.2f}"
+                f"{size / elapsed / 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Benchmark fanning one private message out to several DataStores.
+
+Replays recorded-shape bursts of bitFlyer ``child_order_events`` and KuCoin
+``tradeOrders`` messages through the collections, once with a deep copy of the
+message per consuming store and once with a single read-only view
+(``topgun.store._freeze``) shared by all of them, and reports CPU time per
+message.
+
+    python benchmarks/message_fanout.py [--orders N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+from topgun.models.bitflyer import bitFlyerDataStore
+from topgun.models.kucoin import KuCoinDataStore
+from topgun.store import DataStoreCollection
+
+Message = dict[str, Any]
+
+
+def bitflyer(rng: random.Random, orders: int) -> list[Message]:
+    """ORDER, partial EXECUTION and final EXECUTION events per child order."""
+    messages: list[Message] = []
+    for i in range(orders):
+        product_code = rng.choice(["FX_BTC_JPY", "BTC_JPY"])
+        side = rng.choice(["BUY", "SELL"])
+        price = 5_000_000 + rng.randint(-500, 500) * 5
+        common = {
+            "product_code": product_code,
+            "child_order_id": f"JOR20240101-000000-{i:06d}",
+            "child_order_acceptance_id": f"JRF20240101-000000-{i:06d}",
+            "event_date": "2024-01-01T00:00:00.000000Z",
+        }
+        events = [
+            {
+                **common,
+                "event_type": "ORDER",
+                "child_order_type": "LIMIT",
+                "side": side,
+                "price": price,
+                "size": 0.02,
+                "expire_date": "2024-01-31T00:00:00",
+            },
+            *(
+                {
+                    **common,
+                    "event_type": "EXECUTION",
+                    "exec_id": i * 2 + n,
+                    "side": side,
+                    "price": price,
+                    "size": 0.01,
+                    "commission": 0,
+                    "sfd": 0,
+                    "outstanding_size": outstanding,
+                }
+                for n, outstanding in enumerate([0.01, 0])
+            ),
+        ]
+        messages.extend(
+            {
+                "jsonrpc": "2.0",
+                "method": "channelMessage",
+                "params": {"channel": "child_order_events", "message": [event]},
+            }
+            for event in events
+        )
+    return messages
+
+
+def kucoin(rng: random.Random, orders: int) -> list[Message]:
+    """open, match and filled events per order."""
+    messages: list[Message] = []
+    for i in range(orders):
+        data = {
+            "symbol": "BTC-USDT",
+            "orderType": "limit",
+            "side": rng.choice(["buy", "sell"]),
+            "orderId": f"{i:024x}",
+            "price": str(40_000 + rng.randint(-500, 500)),
+            "size": "0.002",
+            "orderTime": 1_700_000_000_000_000_000 + i,
+            "ts": 1_700_000_000_000_000_000 + i,
+            "clientOid": f"client-{i}",
+        }
+        for tp, status, filled in (
+            ("open", "open", "0"),
+            ("match", "match", "0.001"),
+            ("filled", "done", "0.002"),
+        ):
+            messages.append(
+                {
+                    "type": "message",
+                    "topic": "/spotMarket/tradeOrders",
+                    "subject": "orderChange",
+                    "channelType": "private",
+                    "data": {
+                        **data,
+                        "type": tp,
+                        "status": status,
+                        "filledSize": filled,
+                        "remainSize": str(0.002 - float(filled)),
+                    },
+                }
+            )
+    return messages
+
+
+def bitflyer_store() -> bitFlyerDataStore:
+    store = bitFlyerDataStore()
+    store.collateral._onresponse(
+        {"collateral": 1_000_000.0, "open_position_pnl": 0.0}
+    )
+    store.balance._onresponse(
+        [
+            {"currency_code": "JPY", "amount": 10_000_000.0, "available": None},
+            {"currency_code": "BTC", "amount": 10.0, "available": None},
+        ]
+    )
+    return store
+
+
+def bitflyer_deepcopy(store: Any, msg: Message) -> None:
+    message = msg["params"]["message"]
+    store.childorderevents._onmessage(copy.deepcopy(message))
+    store.childorders._onmessage(copy.deepcopy(message))
+    store.positions._onmessage(copy.deepcopy(message), store.collateral)
+    store.balance._onmessage(copy.deepcopy(message))
+
+
+def kucoin_deepcopy(store: Any, msg: Message) -> None:
+    store.orderevents._onmessage(copy.deepcopy(msg))
+    store.orders._onmessage(copy.deepcopy(msg))
+
+
+def view(store: DataStoreCollection, msg: Message) -> None:
+    store._onmessage(msg)
+
+
+CASES: list[
+    tuple[
+        str,
+        Callable[[random.Random, int], list[Message]],
+        Callable[[], DataStoreCollection],
+        Callable[[Any, Message], None],
+    ]
+] = [
+    ("bitflyer", bitflyer, bitflyer_store, bitflyer_deepcopy),
+    ("kucoin", kucoin, KuCoinDataStore, kucoin_deepcopy),
+]
+
+
+def run(
+    factory: Callable[[], DataStoreCollection],
+    dispatch: Callable[[Any, Message], None],
+    messages: list[Message],
+    repeat: int,
+) -> float:
+    """Return the best CPU time of ``repeat`` passes."""
+    best = float("inf")
+    for _ in range(repeat):
+        store = factory()
+        start = time.process_time()
+        for msg in messages:
+            dispatch(store, msg)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'exchange':<10}{'fan-out':<10}{'us/msg':>10}")
+    for name, generate, factory, deepcopy in CASES:
+        messages = generate(random.Random(0), args.orders)
+        for mode, dispatch in (("deepcopy", deepcopy), ("view", view)):
+            elapsed = run(factory, dispatch, messages, args.repeat)
+            print(f"{name:<10}{mode:<10}{elapsed / len(messages) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark DataStore._batch on order book diff messages.
+
+Applies the same stream of diff messages to the order book stores with and
+without the batch context, and reports wake-ups and CPU time per message.
+
+    python benchmarks/store_batch.py [--messages N] [--levels N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import random
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from topgun.models.binance import OrderBook as BinanceOrderBook
+from topgun.models.bitbank import Depth as BitbankDepth
+from topgun.models.bitflyer import Board as BitflyerBoard
+from topgun.store import DataStore
+
+
+def counting(store_class: type[DataStore], batched: bool) -> type[DataStore]:
+    class Counting(store_class):  # type: ignore[valid-type, misc]
+        wakeups = 0
+
+        def _set(self) -> None:
+            if not self._batching:
+                self.wakeups += 1
+            super()._set()
+
+        if not batched:
+
+            @contextlib.contextmanager
+            def _batch(self) -> Iterator[None]:
+                yield
+
+    return Counting
+
+
+def levels(rng: random.Random, n: int) -> list[tuple[float, float]]:
+    return [
+        (round(5_000_000 + rng.randint(-n, n) * 5.0, 1), rng.choice([0.0, 0.01, 0.1]))
+        for _ in range(n)
+    ]
+
+
+def bitflyer(rng: random.Random, n: int) -> tuple[Any, ...]:
+    message = {
+        "mid_price": 5_000_000.0,
+        "asks": [{"price": p + n * 5, "size": s} for p, s in levels(rng, n // 2)],
+        "bids": [{"price": p - n * 5, "size": s} for p, s in levels(rng, n // 2)],
+    }
+    return ("FX_BTC_JPY", message)
+
+
+def bitbank(rng: random.Random, n: int) -> tuple[Any, ...]:
+    message = {
+        "a": [[str(p + n * 5), str(s)] for p, s in levels(rng, n // 2)],
+        "b": [[str(p - n * 5), str(s)] for p, s in levels(rng, n // 2)],
+        "t": 0,
+    }
+    return ("depth_diff_btc_jpy", message)
+
+
+def binance(rng: random.Random, n: int) -> tuple[Any, ...]:
+    message = {
+        "s": "BTCUSDT",
+        "a": [[str(p + n * 5), str(s)] for p, s in levels(rng, n // 2)],
+        "b": [[str(p - n * 5), str(s)] for p, s in levels(rng, n // 2)],
+    }
+    return (message,)
+
+
+CASES: list[tuple[str, type[DataStore], Callable[..., tuple[Any, ...]]]] = [
+    ("bitflyer.Board", BitflyerBoard, bitflyer),
+    ("bitbank.Depth", BitbankDepth, bitbank),
+    ("binance.OrderBook", BinanceOrderBook, binance),
+]
+
+
+def run(
+    store_class: type[DataStore],
+    messages: list[tuple[Any, ...]],
+    batched: bool,
+    repeat: int,
+) -> tuple[int, float]:
+    """Return wake-ups of one pass and the best CPU time of ``repeat`` passes."""
+    best = float("inf")
+    for _ in range(repeat):
+        store = counting(store_class, batched)()
+        start = time.process_time()
+        for args in messages:
+            store._onmessage(*args)
+        best = min(best, time.process_time() - start)
+    return store.wakeups, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--levels", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'store':<20}{'mode':<10}{'wake-ups/msg':>14}{'us/msg':>10}")
+    for name, store_class, factory in CASES:
+        rng = random.Random(0)
+        messages = [factory(rng, args.levels) for _ in range(args.messages)]
+        for batched in (False, True):
+            wakeups, elapsed = run(store_class, messages, batched, args.repeat)
+            print(
+                f"{name:<20}{'batch' if batched else 'per-row':<10}"
+                f"{wakeups / args.messages:>14.1f}"
+                f"{elapsed / args.messages * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark the DataStore storage backends.
+
+Applies the same stream of row operations to stores backed by the compact
+storage (key as row id, integer ids for keyless rows) and the UUID storage
+(a UUID per row plus a separate key to UUID map), and reports CPU time per
+row operation.
+
+    python benchmarks/store_storage.py [--operations N] [--levels N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+from topgun.store import DataStore, _CompactStorage, _Storage, _UUIDStorage
+
+Operation = tuple[str, list[dict[str, Any]]]
+
+
+def book(rng: random.Random, n: int, levels: int) -> list[Operation]:
+    """Diff updates of a keyed order book: update, replace and delete levels."""
+    operations: list[Operation] = []
+    for _ in range(n):
+        side = rng.choice(["asks", "bids"])
+        price = str(5_000_000 + rng.randint(0, levels) * 5)
+        row = {"symbol": "BTC_JPY", "side": side, "price": price}
+        action = rng.choice(["insert", "update", "delete"])
+        if action != "delete":
+            row["size"] = str(rng.choice([0.01, 0.1, 1.0]))
+        operations.append((action, [row]))
+    return operations
+
+
+def trades(rng: random.Random, n: int, levels: int) -> list[Operation]:
+    """Appends to a keyless trade history."""
+    return [
+        ("insert", [{"symbol": "BTC_JPY", "price": str(rng.randint(0, levels))}])
+        for _ in range(n)
+    ]
+
+
+CASES: list[tuple[str, list[str], Callable[..., list[Operation]]]] = [
+    ("keyed book", ["symbol", "side", "price"], book),
+    ("keyless trades", [], trades),
+]
+
+BACKENDS: list[tuple[str, type[_Storage]]] = [
+    ("compact", _CompactStorage),
+    ("uuid", _UUIDStorage),
+]
+
+
+def run(
+    storage: type[_Storage],
+    keys: list[str],
+    operations: list[Operation],
+    repeat: int,
+) -> float:
+    """Return the best CPU time of ``repeat`` passes."""
+
+    class Store(DataStore):
+        _KEYS = keys
+        _STORAGE = storage
+        _MAXLEN = 1000
+
+    best = float("inf")
+    for _ in range(repeat):
+        store = Store()
+        methods = {
+            "insert": store._insert,
+            "update": store._update,
+            "delete": store._delete,
+        }
+        start = time.process_time()
+        for action, data in operations:
+            methods[action](data)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=200_000)
+    parser.add_argument("--levels", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<18}{'backend':<10}{'ns/op':>10}")
+    for name, keys, factory in CASES:
+        rng = random.Random(0)
+        operations = factory(rng, args.operations, args.levels)
+        for backend, storage in BACKENDS:
+            elapsed = run(storage, keys, operations, args.repeat)
+            print(
+                f"{name:<18}{backend:<10}"
+                f"{elapsed / args.operations * 1e9:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -87,6 +87,37 @@ async def test_client_base_url() -> None:
     assert r.text == "Hello from alt"
 
 
+@pytest.mark.asyncio
+async def test_client_json_codec() -> None:
+    routes = web.RouteTableDef()
+
+    @routes.post("/")
+    async def echo(request: web.Request) -> web.Response:
+        return web.Response(text=await request.text())
+
+    app = web.Application()
+    app.add_routes(routes)
+
+    def loads(s: str | bytes) -> Any:
+        return {"decoded": json.loads(s)}
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    async with TestServer(app) as server:
+        url = str(server.make_url(URL("/")))
+        async with topgun.Client(json_loads=loads, json_dumps=dumps) as client:
+            r = await client.fetch("POST", url, json={"foo": "bar"}, auth=None)
+            async with client.post(url, json=[1], auth=None) as resp:
+                stdlib = await resp.json(loads=json.loads, content_type=None)
+            r2 = await client.fetch("POST", url, data="spam", auth=None)
+
+    assert r.text == '{"foo":"bar"}'
+    assert r.data == {"decoded": {"foo": "bar"}}
+    assert stdlib == [1]
+    assert isinstance(r2.data, topgun.NotJSONContent)
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "test_input",
@@ -306,6 +337,7 @@ async def test_client_ws_connect(mocker: pytest_mock.MockerFixture):
             autoping=True,
             heartbeat=42.0,
             auth=None,
+            inline=True,
         )
     assert m.called
     assert m.call_args == [
@@ -318,6 +350,10 @@ async def test_client_ws_connect(mocker: pytest_mock.MockerFixture):
             "hdlr_bytes": hdlr_bytes,
             "hdlr_json": hdlr_json,
             "backoff": (1.92, 60.0, 1.618, 5.0),
+            "inline": True,
+            "drain": False,
+            "json_loads": None,
+            "json_dumps": None,
             "autoping": True,
             "heartbeat": 42.0,
             "auth": None,
@@ -326,6 +362,28 @@ async def test_client_ws_connect(mocker: pytest_mock.MockerFixture):
     assert ret == m.return_value
 
 
+@pytest.mark.asyncio
+async def test_client_ws_connect_group(mocker: pytest_mock.MockerFixture):
+    m = mocker.patch("topgun.client.WebSocketGroup")
+    hdlr_json = mocker.Mock()
+    async with topgun.Client() as client:
+        ret = client.ws_connect_group(
+            "wss://stream.binance.com/ws",
+            ["btcusdt@trade", "ethusdt@trade"],
+            shards=2,
+            hdlr_json=hdlr_json,
+        )
+    assert m.call_args == [
+        (
+            client.ws_connect,
+            "wss://stream.binance.com/ws",
+            ["btcusdt@trade", "ethusdt@trade"],
+        ),
+        {"shards": 2, "weights": None, "hdlr_json": hdlr_json},
+    ]
+    assert ret == m.return_value
+
+
 @pytest.mark.asyncio
 async def test_client_ws_connect_hdlr_type(mocker: pytest_mock.MockerFixture) -> None:
     m = mocker.patch("topgun.client.WebSocketApp", new_callable=AsyncMock)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
+import zlib
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 import pytest
 import pytest_asyncio
@@ -15,6 +19,8 @@ if TYPE_CHECKING:
     from collections.abc import AsyncGenerator
     from typing import Any
 
+    import pytest_mock
+
     from topgun.typedefs import Item
 
 
@@ -1753,3 +1759,960 @@ def test_hyperliquid_active_orders() -> None:
 
     assert len(store.order_updates) == 0
     assert store.order_updates.get({"coin": "BTC", "oid": 91490942}) is None
+
+
+def _depth_update(
+    u_first: int, u_last: int, pu: int | None = None, price: str = "100.0"
+) -> dict[str, Any]:
+    data: dict[str, Any] = {
+        "e": "depthUpdate",
+        "s": "BTCUSDT",
+        "U": u_first,
+        "u": u_last,
+        "b": [[price, "1.0"]],
+        "a": [],
+    }
+    if pu is not None:
+        data["pu"] = pu
+    return data
+
+
+def _depth_snapshot(last_update_id: int) -> dict[str, Any]:
+    return {
+        "lastUpdateId": last_update_id,
+        "bids": [["99.0", "1.0"]],
+        "asks": [["101.0", "1.0"]],
+    }
+
+
+def test_binance_orderbook_sequence() -> None:
+    store = topgun.BinanceSpotDataStore()
+    ws: Any = object()
+
+    # Buffered before the snapshot, only events newer than it are replayed
+    store.onmessage(_depth_update(1, 10, price="98.0"), ws)
+    store.onmessage(_depth_update(11, 20, price="100.0"), ws)
+    assert not store.orderbook.initialized["BTCUSDT"]
+    store.orderbook._onresponse("BTCUSDT", _depth_snapshot(15))
+    assert store.orderbook.initialized["BTCUSDT"]
+    assert store.orderbook.sorted({"s": "BTCUSDT"}) == {
+        "a": [{"s": "BTCUSDT", "S": "a", "p": "101.0", "q": "1.0"}],
+        "b": [
+            {"s": "BTCUSDT", "S": "b", "p": "100.0", "q": "1.0"},
+            {"s": "BTCUSDT", "S": "b", "p": "99.0", "q": "1.0"},
+        ],
+    }
+
+    # Contiguous and already applied events
+    store.onmessage(_depth_update(21, 30), ws)
+    store.onmessage(_depth_update(25, 30, price="97.0"), ws)
+    assert store.orderbook.get({"s": "BTCUSDT", "S": "b", "p": "97.0"}) is None
+    assert store.orderbook.stale == set()
+
+    # Gap
+    store.onmessage(_depth_update(35, 40, price="96.0"), ws)
+    assert not store.orderbook.initialized["BTCUSDT"]
+    assert store.orderbook.stale == {"BTCUSDT"}
+    assert store.orderbook.get({"s": "BTCUSDT", "S": "b", "p": "96.0"}) is not None
+    store.onmessage(_depth_update(41, 50, price="95.0"), ws)
+
+    # Snapshot older than the buffer stays stale
+    store.orderbook._onresponse("BTCUSDT", _depth_snapshot(32))
+    assert store.orderbook.stale == {"BTCUSDT"}
+    assert len(store.orderbook._buff["BTCUSDT"]) == 2
+
+    store.orderbook._onresponse("BTCUSDT", _depth_snapshot(38))
+    assert store.orderbook.initialized["BTCUSDT"]
+    assert store.orderbook.stale == set()
+    assert [item["p"] for item in store.orderbook.find({"S": "b"})] == [
+        "99.0",
+        "96.0",
+        "95.0",
+    ]
+
+
+def test_binance_orderbook_sequence_futures() -> None:
+    store = topgun.BinanceUSDSMDataStore()
+    ws: Any = object()
+
+    store.orderbook._onresponse("BTCUSDT", _depth_snapshot(15))
+    store.onmessage(_depth_update(10, 20, pu=9), ws)
+    store.onmessage(_depth_update(25, 30, pu=20), ws)
+    assert store.orderbook.stale == set()
+    store.onmessage(_depth_update(35, 40, pu=31), ws)
+    assert store.orderbook.stale == {"BTCUSDT"}
+
+
+def test_binance_orderbook_schema() -> None:
+    store = topgun.BinanceUSDSMDataStore()
+    store.orderbook._SCHEMA = {"p": float, "q": float}
+    ws: Any = object()
+
+    store.orderbook._onresponse("BTCUSDT", _depth_snapshot(15))
+    update = _depth_update(16, 20, pu=15)
+    update["a"] = [["101.0", "0.000"], ["102.0", "2.5"]]
+    store.onmessage(update, ws)
+
+    # zero quantities are found on the converted values
+    assert store.orderbook.sorted({"s": "BTCUSDT"}) == {
+        "a": [{"s": "BTCUSDT", "S": "a", "p": 102.0, "q": 2.5}],
+        "b": [
+            {"s": "BTCUSDT", "S": "b", "p": 100.0, "q": 1.0},
+            {"s": "BTCUSDT", "S": "b", "p": 99.0, "q": 1.0},
+        ],
+    }
+
+
+@pytest_asyncio.fixture
+async def server_binance_depth() -> AsyncGenerator[str]:
+    routes = web.RouteTableDef()
+    requests: list[dict[str, str]] = []
+
+    @routes.get("/api/v3/depth")
+    async def depth(request: web.Request) -> web.Response:
+        requests.append(dict(request.query))
+        if len(requests) == 1:
+            return web.json_response({"code": -1003}, status=429)
+        return web.json_response(_depth_snapshot(38))
+
+    app = web.Application()
+    app.add_routes(routes)
+    app["requests"] = requests
+    async with TestServer(app) as server:
+        yield str(server.make_url(""))
+
+
+@pytest.mark.asyncio
+async def test_binance_orderbook_resnapshot(
+    server_binance_depth: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(topgun.BinanceSpotDataStore, "_RESNAPSHOT_INTERVAL", 0.0)
+    store = topgun.BinanceSpotDataStore()
+    ws: Any = object()
+
+    async with topgun.Client() as client:
+        store.enable_resnapshot(client, base_url=server_binance_depth, limit=100)
+        store.orderbook._onresponse("BTCUSDT", _depth_snapshot(15))
+        store.onmessage(_depth_update(35, 40, price="96.0"), ws)
+        store.onmessage(_depth_update(41, 50, price="95.0"), ws)
+        assert store._resnapshots == {"BTCUSDT"}
+
+        await asyncio.wait_for(store.orderbook.wait(), timeout=5.0)
+        for _ in range(500):
+            if not store._resnapshots:
+                break
+            await asyncio.sleep(0.01)
+
+    assert store.orderbook.initialized["BTCUSDT"]
+    assert store.orderbook.stale == set()
+    assert store.orderbook.get({"s": "BTCUSDT", "S": "b", "p": "95.0"}) is not None
+
+
+def _checksum(bids: list[list[str]], asks: list[list[str]]) -> int:
+    parts = []
+    for i in range(max(len(bids), len(asks))):
+        for levels in (bids, asks):
+            if i < len(levels):
+                parts.extend(levels[i][:2])
+    crc = zlib.crc32(":".join(parts).encode())
+    return crc - (1 << 32) if crc & (1 << 31) else crc
+
+
+@pytest.mark.asyncio
+async def test_okx_books_checksum(mocker: pytest_mock.MockerFixture) -> None:
+    store = topgun.OKXDataStore()
+    ws = mocker.AsyncMock(spec=topgun.ws.ClientWebSocketResponse)
+    arg = {"channel": "books", "instId": "BTC-USDT"}
+    bids = [["100", "1", "0", "1"], ["99", "2", "0", "1"]]
+    asks = [["101", "1", "0", "1"]]
+
+    store.onmessage(
+        {
+            "arg": arg,
+            "action": "snapshot",
+            "data": [
+                {
+                    "bids": bids,
+                    "asks": asks,
+                    "ts": "1",
+                    "checksum": _checksum(bids, asks),
+                }
+            ],
+        },
+        ws,
+    )
+    assert store.books.invalid == set()
+
+    update = {"bids": [["99", "3", "0", "1"]], "asks": [], "ts": "2"}
+    store.onmessage(
+        {
+            "arg": arg,
+            "action": "update",
+            "data": [{**update, "checksum": _checksum([bids[0], ["99", "3"]], asks)}],
+        },
+        ws,
+    )
+    assert store.books.invalid == set()
+
+    for _ in range(2):
+        store.onmessage(
+            {"arg": arg, "action": "update", "data": [{**update, "checksum": 1}]},
+            ws,
+        )
+    assert store.books.invalid == {"BTC-USDT"}
+    assert store.books.mismatches == {"BTC-USDT": 1}
+    await asyncio.sleep(0)
+    ws._resubscribe.assert_awaited_once_with([arg])
+
+    store.onmessage(
+        {
+            "arg": arg,
+            "action": "snapshot",
+            "data": [
+                {
+                    "bids": bids,
+                    "asks": asks,
+                    "ts": "3",
+                    "checksum": _checksum(bids, asks),
+                }
+            ],
+        },
+        ws,
+    )
+    assert store.books.invalid == set()
+    assert store.books.checksum == {"BTC-USDT": _checksum(bids, asks)}
+
+
+@pytest.mark.asyncio
+async def test_bitgetv2_book_checksum(mocker: pytest_mock.MockerFixture) -> None:
+    store = topgun.BitgetV2DataStore()
+    ws = mocker.AsyncMock(spec=topgun.ws.ClientWebSocketResponse)
+    arg = {"instType": "SPOT", "channel": "books", "instId": "BTCUSDT"}
+    bids = [["100", "1"]]
+    asks = [["101", "1"], ["102", "2"]]
+
+    store.onmessage(
+        {
+            "action": "snapshot",
+            "arg": arg,
+            "data": [{"bids": bids, "asks": asks, "checksum": _checksum(bids, asks)}],
+        },
+        ws,
+    )
+    store.onmessage(
+        {
+            "action": "update",
+            "arg": arg,
+            "data": [{"bids": [], "asks": [["102", "0"]], "checksum": 1}],
+        },
+        ws,
+    )
+    assert store.book.invalid == {("SPOT", "BTCUSDT")}
+    assert store.book.mismatches == {("SPOT", "BTCUSDT"): 1}
+    await asyncio.sleep(0)
+    ws._resubscribe.assert_awaited_once_with([arg])
+
+    # books5 snapshots are not verified
+    store.onmessage(
+        {
+            "action": "snapshot",
+            "arg": {**arg, "channel": "books5"},
+            "data": [{"bids": bids, "asks": asks, "checksum": 0}],
+        },
+        ws,
+    )
+    assert store.book.invalid == set()
+
+    # A zero checksum is still verified on books
+    store.onmessage(
+        {
+            "action": "snapshot",
+            "arg": arg,
+            "data": [{"bids": bids, "asks": asks, "checksum": 0}],
+        },
+        ws,
+    )
+    assert store.book.invalid == {("SPOT", "BTCUSDT")}
+
+
+def _kucoin_level2(
+    start: int, end: int, changes: dict[str, list[list[str]]]
+) -> dict[str, Any]:
+    return {
+        "type": "message",
+        "topic": "/market/level2:BTC-USDT",
+        "subject": "trade.l2update",
+        "data": {
+            "changes": {"asks": [], "bids": [], **changes},
+            "sequenceStart": start,
+            "sequenceEnd": end,
+            "symbol": "BTC-USDT",
+            "time": 1663747970273,
+        },
+    }
+
+
+def _kucoin_futures_level2(sequence: int, change: str) -> dict[str, Any]:
+    return {
+        "type": "message",
+        "topic": "/contractMarket/level2:XBTUSDM",
+        "subject": "level2",
+        "data": {"sequence": sequence, "change": change, "timestamp": 1},
+    }
+
+
+@pytest_asyncio.fixture
+async def server_kucoin_level2() -> AsyncGenerator[str]:
+    routes = web.RouteTableDef()
+    snapshots = [
+        {"sequence": "10", "bids": [["99", "1"]], "asks": [["101", "1"]]},
+        {"sequence": "20", "bids": [["99", "2"]], "asks": [["101", "1"]]},
+    ]
+
+    @routes.get("/api/v1/market/orderbook/level2_100")
+    async def spot(request: web.Request) -> web.Response:
+        data = snapshots.pop(0) if len(snapshots) > 1 else snapshots[0]
+        return web.json_response({"code": "200000", "data": data})
+
+    @routes.get("/api/v1/level2/snapshot")
+    async def futures(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "code": "200000",
+                "data": {
+                    "symbol": "XBTUSDM",
+                    "sequence": 100,
+                    "asks": [[5001.0, 10]],
+                    "bids": [[5000.0, 20], [4999, 5]],
+                },
+            }
+        )
+
+    app = web.Application()
+    app.add_routes(routes)
+    async with TestServer(app) as server:
+        yield str(server.make_url(""))
+
+
+@pytest.mark.asyncio
+async def test_kucoin_level2(server_kucoin_level2: str) -> None:
+    store = topgun.KuCoinDataStore()
+    ws: Any = object()
+
+    store.onmessage(_kucoin_level2(9, 11, {"bids": [["98", "1", "11"]]}), ws)
+    assert len(store.orderbook) == 0
+
+    async with topgun.Client(base_url=server_kucoin_level2) as client:
+        await store.initialize(
+            client.get(
+                "/api/v1/market/orderbook/level2_100", params={"symbol": "BTC-USDT"}
+            )
+        )
+    assert store.orderbook.initialized["BTC-USDT"]
+    assert store.orderbook.sorted({"symbol": "BTC-USDT"}) == {
+        "asks": [{"symbol": "BTC-USDT", "side": "asks", "price": "101", "size": "1"}],
+        "bids": [
+            {"symbol": "BTC-USDT", "side": "bids", "price": "99", "size": "1"},
+            {"symbol": "BTC-USDT", "side": "bids", "price": "98", "size": "1"},
+        ],
+    }
+
+    store.onmessage(_kucoin_level2(12, 12, {"asks": [["101", "0", "12"]]}), ws)
+    store.onmessage(_kucoin_level2(5, 12, {"asks": [["100", "1", "7"]]}), ws)
+    assert store.orderbook.find({"side": "asks"}) == []
+    assert store.orderbook.stale == set()
+
+    store.onmessage(_kucoin_level2(15, 15, {"asks": [["102", "1", "15"]]}), ws)
+    assert not store.orderbook.initialized["BTC-USDT"]
+    assert store.orderbook.stale == {"BTC-USDT"}
+    store.onmessage(_kucoin_level2(16, 16, {"asks": [["103", "1", "16"]]}), ws)
+
+    store.orderbook._onresponse(
+        "BTC-USDT", {"sequence": "15", "bids": [], "asks": [["102", "1"]]}
+    )
+    assert store.orderbook.stale == set()
+    assert [item["price"] for item in store.orderbook.find()] == ["102", "103"]
+
+    # futures
+    store.onmessage(_kucoin_futures_level2(101, "5000.0,buy,0"), ws)
+    async with topgun.Client(base_url=server_kucoin_level2) as client:
+        await store.initialize(
+            client.get("/api/v1/level2/snapshot", params={"symbol": "XBTUSDM"})
+        )
+    store.onmessage(_kucoin_futures_level2(102, "5002,sell,3"), ws)
+    assert store.orderbook.sorted({"symbol": "XBTUSDM"}) == {
+        "asks": [
+            {"symbol": "XBTUSDM", "side": "asks", "price": 5001.0, "size": 10.0},
+            {"symbol": "XBTUSDM", "side": "asks", "price": 5002.0, "size": 3.0},
+        ],
+        "bids": [{"symbol": "XBTUSDM", "side": "bids", "price": 4999.0, "size": 5.0}],
+    }
+    store.onmessage(_kucoin_futures_level2(104, "5003,sell,3"), ws)
+    assert store.orderbook.stale == {"XBTUSDM"}
+
+
+@pytest.mark.asyncio
+async def test_kucoin_level2_resnapshot(
+    server_kucoin_level2: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(topgun.KuCoinDataStore, "_RESNAPSHOT_INTERVAL", 0.0)
+    monkeypatch.setattr(
+        topgun.KuCoinDataStore,
+        "_LEVEL2_SNAPSHOT_URLS",
+        {False: server_kucoin_level2 + "/api/v1/market/orderbook/level2_100"},
+    )
+    store = topgun.KuCoinDataStore()
+    ws: Any = object()
+
+    async with topgun.Client() as client:
+        store.enable_resnapshot(client)
+        store.onmessage(_kucoin_level2(19, 21, {"bids": [["99", "3", "21"]]}), ws)
+        # the first snapshot is older than the buffer and is retried
+        store.orderbook._onresponse(
+            "BTC-USDT", {"sequence": "1", "bids": [], "asks": []}
+        )
+        assert store.orderbook.stale == {"BTC-USDT"}
+        store.onmessage(_kucoin_level2(22, 22, {"bids": [["98", "1", "22"]]}), ws)
+        assert store._resnapshots == {"BTC-USDT"}
+        for _ in range(500):
+            if not store._resnapshots:
+                break
+            await asyncio.sleep(0.01)
+
+    assert store.orderbook.stale == set()
+    assert store.orderbook.find({"side": "bids"}) == [
+        {"symbol": "BTC-USDT", "side": "bids", "price": "99", "size": "3"},
+        {"symbol": "BTC-USDT", "side": "bids", "price": "98", "size": "1"},
+    ]
+
+
+def test_kucoin_margin_orders() -> None:
+    store = topgun.KuCoinDataStore()
+    ws = object()
+
+    def loan(subject: str, lent_size: float) -> dict[str, Any]:
+        return {
+            "type": "message",
+            "topic": "/margin/loan:BTC",
+            "subject": subject,
+            "data": {
+                "currency": "BTC",
+                "orderId": "ac928c66ca53498f9c13a127a60e8",
+                "dailyIntRate": 0.0001,
+                "term": 7,
+                "size": 1,
+                "lentSize": lent_size,
+                "side": "lend",
+                "ts": 1553846081210004941,
+            },
+        }
+
+    store.onmessage(loan("order.open", 0), ws)  # type: ignore[arg-type]
+    # consecutive updates of the same order
+    store.onmessage(loan("order.update", 0.5), ws)  # type: ignore[arg-type]
+    store.onmessage(loan("order.update", 0.8), ws)  # type: ignore[arg-type]
+
+    row = store.marginorders.get({"orderId": "ac928c66ca53498f9c13a127a60e8"})
+    assert row is not None
+    assert row["lentSize"] == 0.8
+    assert type(row) is dict
+    assert all(
+        type(x) is dict and type(x["data"]) is dict for x in store.marginorderevents
+    )
+
+    store.onmessage(
+        {
+            "type": "message",
+            "topic": "/margin/position",
+            "subject": "debt.ratio",
+            "data": {
+                "debtRatio": 0.7505,
+                "totalDebt": "21.7505",
+                "debtList": {"BTC": "1.21", "USDT": "2121.2121"},
+                "timestamp": 1583212800000,
+            },
+        },
+        ws,  # type: ignore[arg-type]
+    )
+
+    (position,) = store.marginpositions.find()
+    assert type(position["debtList"]) is dict
+    position["debtList"]["BTC"] = "0"
+
+
+def test_bitflyer_board() -> None:
+    store = topgun.bitFlyerDataStore()
+    board = store.board
+    board._onsnapshot(
+        "FX_BTC_JPY",
+        {
+            "mid_price": 100.0,
+            "bids": [{"price": float(p), "size": 1.0} for p in range(90, 100)],
+            "asks": [{"price": float(p), "size": 1.0} for p in range(101, 111)],
+        },
+    )
+    assert len(board) == 20
+
+    # the mid moves up: asks at or below the mid and bids above it are crossed
+    board._onmessage(
+        "FX_BTC_JPY",
+        {
+            "mid_price": 103.0,
+            "bids": [{"price": 104.0, "size": 1.0}, {"price": 102.0, "size": 1.0}],
+            "asks": [{"price": 110.0, "size": 0.0}],
+        },
+    )
+    best = board.best({"product_code": "FX_BTC_JPY"})
+    assert best["asks"] is not None and best["asks"]["price"] == 104.0
+    assert best["bids"] is not None and best["bids"]["price"] == 102.0
+    assert [item["price"] for item in board.sorted(limit=100)["asks"]] == [
+        104.0,
+        105.0,
+        106.0,
+        107.0,
+        108.0,
+        109.0,
+    ]
+    assert len(board.find({"side": "bids"})) == 11
+
+    board._DEPTH = 3
+    board._onmessage("FX_BTC_JPY", {"mid_price": 103.0, "bids": [], "asks": []})
+    assert board.sorted({"product_code": "FX_BTC_JPY"}) == {
+        "asks": [
+            {"product_code": "FX_BTC_JPY", "side": "asks", "price": p, "size": 1.0}
+            for p in (104.0, 105.0, 106.0)
+        ],
+        "bids": [
+            {"product_code": "FX_BTC_JPY", "side": "bids", "price": p, "size": 1.0}
+            for p in (102.0, 99.0, 98.0)
+        ],
+    }
+    board._onmessage("BTC_JPY", {"mid_price": 1.0, "bids": [], "asks": []})
+
+
+def _bybit_orderbook(
+    type_: str,
+    u: int,
+    a: list[list[str]],
+    b: list[list[str]],
+    depth: int = 50,
+    symbol: str = "BTCUSDT",
+) -> dict[str, Any]:
+    return {
+        "topic": f"orderbook.{depth}.{symbol}",
+        "type": type_,
+        "ts": 1,
+        "data": {"s": symbol, "a": a, "b": b, "u": u, "seq": u * 10},
+        "cts": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_bybit_orderbook(mocker: pytest_mock.MockerFixture) -> None:
+    store = topgun.BybitDataStore()
+    ws = mocker.AsyncMock(spec=topgun.ws.ClientWebSocketResponse)
+
+    # deltas before the first snapshot are ignored
+    store.onmessage(_bybit_orderbook("delta", 9, [["105", "1"]], []), ws)
+    assert len(store.orderbook) == 0
+
+    store.onmessage(
+        _bybit_orderbook("snapshot", 10, [["101", "1"], ["102", "1"]], [["99", "1"]]),
+        ws,
+    )
+    store.onmessage(_bybit_orderbook("delta", 11, [["101", "0"]], [["99", "2"]]), ws)
+    # duplicate
+    store.onmessage(_bybit_orderbook("delta", 11, [["101", "5"]], []), ws)
+    assert store.orderbook.sorted() == {
+        "a": [{"s": "BTCUSDT", "S": "a", "p": "102", "v": "1"}],
+        "b": [{"s": "BTCUSDT", "S": "b", "p": "99", "v": "2"}],
+    }
+    assert store.orderbook.update_id == {"BTCUSDT": 11}
+    assert store.orderbook.seq == {"BTCUSDT": 110}
+
+    # gap
+    store.onmessage(_bybit_orderbook("delta", 13, [["103", "1"]], []), ws)
+    store.onmessage(_bybit_orderbook("delta", 15, [["104", "1"]], []), ws)
+    assert store.orderbook.stale == {"BTCUSDT"}
+    assert store.orderbook.gaps == {"BTCUSDT": 1}
+    await asyncio.sleep(0)
+    ws._resubscribe.assert_awaited_once_with(["orderbook.50.BTCUSDT"])
+
+    # u == 1 means a service restart and carries a full snapshot
+    store.onmessage(_bybit_orderbook("delta", 1, [["110", "1"]], [["90", "1"]]), ws)
+    assert store.orderbook.stale == set()
+    assert store.orderbook.find() == [
+        {"s": "BTCUSDT", "S": "a", "p": "110", "v": "1"},
+        {"s": "BTCUSDT", "S": "b", "p": "90", "v": "1"},
+    ]
+
+    # out of order by the cross sequence
+    delta = _bybit_orderbook("delta", 2, [["111", "1"]], [])
+    delta["data"]["seq"] = 5
+    store.onmessage(delta, ws)
+    assert store.orderbook.update_id == {"BTCUSDT": 1}
+
+    # capped at the subscribed depth
+    eth = functools.partial(_bybit_orderbook, depth=1, symbol="ETHUSDT")
+    store.onmessage(
+        eth("snapshot", 2, [["100.5", "1"]], [["100", "1"], ["99.5", "1"]]), ws
+    )
+    store.onmessage(eth("delta", 3, [["100.4", "1"]], [["100.1", "1"]]), ws)
+    assert store.orderbook.find({"s": "ETHUSDT"}) == [
+        {"s": "ETHUSDT", "S": "a", "p": "100.4", "v": "1"},
+        {"s": "ETHUSDT", "S": "b", "p": "100.1", "v": "1"},
+    ]
+
+
+def test_bybit_orderbook_mixed_depth(caplog: pytest.LogCaptureFixture) -> None:
+    store = topgun.BybitDataStore()
+    asks = [[str(101 + i), "1"] for i in range(3)]
+    bids = [[str(99 - i), "1"] for i in range(3)]
+
+    store.onmessage(_bybit_orderbook("snapshot", 5, asks, bids), None)
+    store.onmessage(
+        _bybit_orderbook("snapshot", 900, asks[:1], bids[:1], depth=1), None
+    )
+    store.onmessage(_bybit_orderbook("delta", 6, [["104", "1"]], []), None)
+    store.onmessage(_bybit_orderbook("delta", 901, [["101", "2"]], [], depth=1), None)
+
+    # the book is kept at the depth of the first snapshot
+    assert store.orderbook.depth == {"BTCUSDT": 50}
+    assert store.orderbook.update_id == {"BTCUSDT": 6}
+    assert store.orderbook.stale == set()
+    assert len(store.orderbook.find({"S": "a"})) == 4
+    assert len(store.orderbook.find({"S": "b"})) == 3
+    assert [x.getMessage() for x in caplog.records] == [
+        "orderbook orderbook.1.BTCUSDT ignored: BTCUSDT is kept at depth 50"
+    ]
+
+
+def _bitbank_depth(room_name: str, data: dict[str, Any]) -> str:
+    return "42" + json.dumps(
+        ["message", {"room_name": room_name, "message": {"data": data}}]
+    )
+
+
+def _bitbank_diff(s: int, a: list[list[str]], b: list[list[str]]) -> str:
+    return _bitbank_depth(
+        "depth_diff_btc_jpy", {"a": a, "b": b, "t": s * 100, "s": str(s)}
+    )
+
+
+def _bitbank_whole(sequence_id: int, asks: list[list[str]], bids: list[list[str]]):
+    return _bitbank_depth(
+        "depth_whole_btc_jpy",
+        {
+            "asks": asks,
+            "bids": bids,
+            "timestamp": sequence_id * 100,
+            "sequenceId": str(sequence_id),
+        },
+    )
+
+
+def test_bitbank_depth() -> None:
+    store = topgun.bitbankDataStore()
+    ws: Any = object()
+
+    # held until the first whole, out of order
+    store.onmessage(_bitbank_diff(12, [["102", "0"]], []), ws)
+    store.onmessage(_bitbank_diff(11, [["102", "2"]], []), ws)
+    store.onmessage(_bitbank_diff(9, [["103", "1"]], []), ws)
+    assert len(store.depth) == 0
+
+    store.onmessage(_bitbank_whole(10, [["101", "1"], ["102", "1"]], [["99", "1"]]), ws)
+    assert store.depth.sequence_id == {"btc_jpy": 12}
+    assert store.depth.sorted() == {
+        "asks": [{"pair": "btc_jpy", "side": "asks", "price": "101", "amount": "1"}],
+        "bids": [{"pair": "btc_jpy", "side": "bids", "price": "99", "amount": "1"}],
+    }
+
+    # stale diffs are discarded
+    store.onmessage(_bitbank_diff(12, [["101", "0"]], []), ws)
+    store.onmessage(_bitbank_diff(13, [], [["98", "1"]]), ws)
+    assert len(store.depth) == 3
+    assert store.depth.timestamp == 1300
+
+    # an older whole is re-applied with the newer diffs on top
+    store.onmessage(_bitbank_whole(12, [["101", "1"]], [["99", "1"]]), ws)
+    assert {item["price"] for item in store.depth.find()} == {"101", "99", "98"}
+    assert store.depth.sequence_id == {"btc_jpy": 13}
+
+    # the decoder configured on the connection is used
+    class WS:
+        def __init__(self) -> None:
+            self.calls = 0
+            self.__dict__["_json_loads"] = self.loads
+
+        def loads(self, s: str) -> Any:
+            self.calls += 1
+            return json.loads(s)
+
+    custom_ws = WS()
+    store.onmessage(_bitbank_diff(14, [], []), custom_ws)  # type: ignore[arg-type]
+    assert custom_ws.calls == 1
+
+    store.depth._DEPTH = 1
+    store.onmessage(_bitbank_diff(15, [["100", "1"]], []), ws)
+    assert store.depth.sorted() == {
+        "asks": [{"pair": "btc_jpy", "side": "asks", "price": "100", "amount": "1"}],
+        "bids": [{"pair": "btc_jpy", "side": "bids", "price": "99", "amount": "1"}],
+    }
+    store.onmessage(
+        _bitbank_whole(20, [["101", "1"], ["102", "1"]], [["99", "1"], ["98", "1"]]),
+        ws,
+    )
+    assert len(store.depth) == 2
+
+
+def test_phemex_orderbook() -> None:
+    store = topgun.PhemexDataStore()
+    store.onmessage(
+        {
+            "book": {
+                "asks": [[870100000, 25], [870000000, 10]],
+                "bids": [[869950000, 7]],
+            },
+            "depth": 30,
+            "sequence": 1,
+            "symbol": "BTCUSD",
+            "timestamp": 1,
+            "type": "snapshot",
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    store.onmessage(
+        {
+            "book": {"asks": [[870000000, 0]], "bids": [[869990000, 3]]},
+            "depth": 30,
+            "sequence": 2,
+            "symbol": "BTCUSD",
+            "timestamp": 2,
+            "type": "incremental",
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    assert store.orderbook.sorted({"symbol": "BTCUSD"}) == {
+        "asks": [{"symbol": "BTCUSD", "side": "asks", "priceEp": 870100000, "qty": 25}],
+        "bids": [
+            {"symbol": "BTCUSD", "side": "bids", "priceEp": 869990000, "qty": 3},
+            {"symbol": "BTCUSD", "side": "bids", "priceEp": 869950000, "qty": 7},
+        ],
+    }
+    assert store.orderbook.timestamp == 2
+
+    # Hedged contract prices are real-valued strings
+    store.onmessage(
+        {
+            "orderbook_p": {
+                "asks": [["87769.8", "0.001"], ["87770", "0.002"]],
+                "bids": [["87769.7", "0.1"]],
+            },
+            "depth": 30,
+            "sequence": 3,
+            "symbol": "BTCUSDT",
+            "timestamp": 3,
+            "type": "snapshot",
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    store.onmessage(
+        {
+            "orderbook_p": {"asks": [["87769.8", "0"]], "bids": []},
+            "depth": 30,
+            "sequence": 4,
+            "symbol": "BTCUSDT",
+            "timestamp": 4,
+            "type": "incremental",
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    assert store.orderbook.best({"symbol": "BTCUSDT"}) == {
+        "asks": {
+            "symbol": "BTCUSDT",
+            "side": "asks",
+            "priceEp": "87770",
+            "qty": "0.002",
+        },
+        "bids": {
+            "symbol": "BTCUSDT",
+            "side": "bids",
+            "priceEp": "87769.7",
+            "qty": "0.1",
+        },
+    }
+    assert len(store.orderbook) == 5
+
+    store = topgun.PhemexDataStore()
+    store.orderbook._SCHEMA = {"priceEp": float, "qty": float}
+    for sequence, asks in enumerate(([["87770", "0.002"]], [["87770", "0.0"]])):
+        store.onmessage(
+            {
+                "orderbook_p": {"asks": asks, "bids": [["87769", "1"]]},
+                "depth": 30,
+                "sequence": sequence,
+                "symbol": "BTCUSDT",
+                "timestamp": sequence,
+                "type": "incremental",
+            },
+            object(),  # type: ignore[arg-type]
+        )
+    assert store.orderbook.find({"symbol": "BTCUSDT", "side": "asks"}) == []
+    assert store.orderbook.get(
+        {"symbol": "BTCUSDT", "side": "bids", "priceEp": 87769.0}
+    ) == {"symbol": "BTCUSDT", "side": "bids", "priceEp": 87769.0, "qty": 1.0}
+
+
+def test_bitmex_orderbook() -> None:
+    store = topgun.BitMEXDataStore()
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "partial",
+            "keys": ["symbol", "id", "side"],
+            "filter": {"symbol": "XBTUSD"},
+            "data": [
+                {
+                    "symbol": "XBTUSD",
+                    "id": 8799000100,
+                    "side": "Sell",
+                    "size": 5,
+                    "price": 9999.0,
+                },
+                {
+                    "symbol": "XBTUSD",
+                    "id": 8799000150,
+                    "side": "Sell",
+                    "size": 2,
+                    "price": 9998.5,
+                },
+                {
+                    "symbol": "XBTUSD",
+                    "id": 8799000200,
+                    "side": "Buy",
+                    "size": 7,
+                    "price": 9998.0,
+                },
+            ],
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    # update and delete carry only the level id
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "update",
+            "data": [{"symbol": "XBTUSD", "id": 8799000100, "side": "Sell", "size": 9}],
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "delete",
+            "data": [{"symbol": "XBTUSD", "id": 8799000150, "side": "Sell"}],
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "insert",
+            "data": [
+                {
+                    "symbol": "XBTUSD",
+                    "id": 8799000250,
+                    "side": "Buy",
+                    "size": 1,
+                    "price": 9997.5,
+                }
+            ],
+        },
+        object(),  # type: ignore[arg-type]
+    )
+    assert store.orderbook.sorted({"symbol": "XBTUSD"}) == {
+        "Sell": [
+            {
+                "symbol": "XBTUSD",
+                "id": 8799000100,
+                "side": "Sell",
+                "size": 9,
+                "price": 9999.0,
+            }
+        ],
+        "Buy": [
+            {
+                "symbol": "XBTUSD",
+                "id": 8799000200,
+                "side": "Buy",
+                "size": 7,
+                "price": 9998.0,
+            },
+            {
+                "symbol": "XBTUSD",
+                "id": 8799000250,
+                "side": "Buy",
+                "size": 1,
+                "price": 9997.5,
+            },
+        ],
+    }
+
+
+def test_bitmex_partial_without_filter() -> None:
+    store = topgun.BitMEXDataStore()
+    for action, exec_id in (("partial", "e1"), ("insert", "e2"), ("partial", "e3")):
+        store.onmessage(
+            {
+                "table": "execution",
+                "action": action,
+                "keys": ["execID"],
+                "data": [{"execID": exec_id, "symbol": "XBTUSD"}],
+            },
+            None,
+        )
+    # A history partial after reconnect keeps earlier rows
+    assert store.execution.find() == [
+        {"execID": "e1", "symbol": "XBTUSD"},
+        {"execID": "e2", "symbol": "XBTUSD"},
+        {"execID": "e3", "symbol": "XBTUSD"},
+    ]
+
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "partial",
+            "keys": ["symbol", "id", "side"],
+            "filter": {"symbol": "XBTUSD"},
+            "data": [
+                {
+                    "symbol": "XBTUSD",
+                    "id": 1,
+                    "side": "Sell",
+                    "size": 5,
+                    "price": 9999.0,
+                }
+            ],
+        },
+        None,
+    )
+    store.onmessage(
+        {
+            "table": "orderBookL2",
+            "action": "partial",
+            "keys": ["symbol", "id", "side"],
+            "data": [
+                {
+                    "symbol": "ETHUSD",
+                    "id": 2,
+                    "side": "Buy",
+                    "size": 3,
+                    "price": 3000.0,
+                }
+            ],
+        },
+        None,
+    )
+    assert len(store.orderbook.find({"symbol": "XBTUSD"})) == 1
+    assert len(store.orderbook.find({"symbol": "ETHUSD"})) == 1
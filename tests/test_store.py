@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import asyncio
+import decimal
 import uuid
+import zlib
 from typing import TYPE_CHECKING
 
 import aiohttp
@@ -108,22 +110,117 @@ async def test_dsc_wait() -> None:
     await asyncio.wait_for(wait_task, timeout=5.0)
 
 
+@pytest.mark.asyncio
+async def test_dsc_create_task() -> None:
+    dsc = topgun.store.DataStoreCollection()
+    event = asyncio.Event()
+
+    task = dsc._create_task(event.wait())
+    assert dsc._tasks == {task}
+
+    event.set()
+    await task
+    await asyncio.sleep(0)
+    assert dsc._tasks == set()
+
+
+@pytest.mark.asyncio
+async def test_dsc_batch() -> None:
+    class DSC(topgun.store.DataStoreCollection):
+        def _init(self) -> None:
+            self._create("example", keys=["id"])
+
+        def _onmessage(
+            self, msg: object, ws: ClientWebSocketResponse | None = None
+        ) -> None:
+            self["example"]._insert([msg])  # type: ignore
+
+    dsc = DSC()
+    store = dsc._get("example", topgun.store.DataStore)
+    dsc_event = asyncio.Event()
+    store_event = asyncio.Event()
+    dsc._events.append(dsc_event)
+    store._events.append(store_event)
+
+    async with dsc.batch():
+        dsc.onmessage({"id": 1})
+        dsc.onmessage({"id": 2})
+        assert len(store) == 2
+        assert not dsc_event.is_set()
+        assert not store_event.is_set()
+
+    assert dsc_event.is_set()
+    assert store_event.is_set()
+    assert not dsc._batching
+    assert not store._batching
+
+    dsc_event = asyncio.Event()
+    dsc._events.append(dsc_event)
+    async with dsc.batch():
+        pass
+    assert not dsc_event.is_set()
+
+
+def test_dsc_route():
+    dsc = topgun.store.DataStoreCollection()
+    received: list[tuple[str, ...]] = []
+    dsc._route("books", lambda *args: received.append(("books", *args)))
+    dsc._route("books", lambda *args: received.append(("books", *args)), prefix=True)
+    dsc._route("books5", lambda *args: received.append(("books5", *args)), prefix=True)
+    dsc._route("candle", lambda *args: received.append(("candle", *args)), prefix=True)
+
+    assert dsc._dispatch("books", 1)
+    assert dsc._dispatch("books-l2-tbt", 2)
+    assert dsc._dispatch("books5", 3)
+    assert dsc._dispatch("books50-l2-tbt", 4)
+    assert dsc._dispatch("candle1m", 5, 6)
+    assert dsc._dispatch("candle1m", 7, 8)
+    assert not dsc._dispatch("bo", 9)
+    assert not dsc._dispatch("tickers", 10)
+    assert received == [
+        ("books", 1),
+        ("books", 2),
+        ("books5", 3),
+        ("books5", 4),
+        ("candle", 5, 6),
+        ("candle", 7, 8),
+    ]
+    assert dsc.route_counts == {"books": 1, "books*": 1, "books5*": 2, "candle*": 2}
+    assert dsc.unrouted == 2
+    assert list(dsc._route_cache) == [
+        "books",
+        "books-l2-tbt",
+        "books5",
+        "books50-l2-tbt",
+        "candle1m",
+        "bo",
+        "tickers",
+    ]
+
+    # registering a route clears the resolved cache
+    dsc._route("tickers", lambda *args: received.append(("tickers", *args)))
+    assert dsc._route_cache == {}
+    assert dsc._dispatch("tickers", 11)
+
+    dsc._ROUTE_CACHE_SIZE = 2
+    for channel in ("candle1m", "candle3m", "candle5m"):
+        dsc._dispatch(channel)
+    assert list(dsc._route_cache) == ["candle3m", "candle5m"]
+
+
 def test_ds_construct():
     ds1 = topgun.store.DataStore()
     assert len(ds1._data) == 0
-    assert len(ds1._index) == 0
     assert len(ds1._keys) == 0
 
     ds2 = topgun.store.DataStore(keys=["foo", "bar"])
     assert len(ds2._data) == 0
-    assert len(ds2._index) == 0
     assert len(ds2._keys) == 2
 
     ds3 = topgun.store.DataStore(
         data=[{"foo": "value1", "bar": "value1"}, {"foo": "value2", "bar": "value2"}]
     )
     assert len(ds3._data) == 2
-    assert len(ds3._index) == 0
     assert len(ds3._keys) == 0
 
     ds4 = topgun.store.DataStore(
@@ -131,7 +228,6 @@ def test_ds_construct():
         data=[{"foo": "value1", "bar": "value1"}, {"foo": "value2", "bar": "value2"}],
     )
     assert len(ds4._data) == 2
-    assert len(ds4._index) == 2
     assert len(ds4._keys) == 2
 
     class DataStoreWithKeys(topgun.store.DataStore):
@@ -139,7 +235,6 @@ def test_ds_construct():
 
     ds5 = DataStoreWithKeys()
     assert len(ds5._data) == 0
-    assert len(ds5._index) == 0
     assert len(ds5._keys) == 2
 
 
@@ -167,7 +262,6 @@ def test_ds_sweep_with_key():
     ds._MAXLEN = len(data) - 100
     ds._sweep_with_key()
     assert len(ds._data) == 900
-    assert len(ds._index) == 900
 
 
 def test_ds_sweep_without_key():
@@ -176,7 +270,6 @@ def test_ds_sweep_without_key():
     ds._MAXLEN = len(data) - 100
     ds._sweep_without_key()
     assert len(ds._data) == 900
-    assert len(ds._index) == 0
 
 
 def test_ds_insert():
@@ -185,23 +278,18 @@ def test_ds_insert():
     ds1 = topgun.store.DataStore(keys=["foo"])
     ds1._insert(data)
     assert len(ds1._data) == 1000
-    assert len(ds1._index) == 1000
-    assert isinstance(next(iter(ds1._data.keys())), uuid.UUID)
+    assert next(iter(ds1._data.keys())) == "bar0"
     assert isinstance(next(iter(ds1._data.values())), dict)
-    assert isinstance(next(iter(ds1._index.keys())), int)
-    assert isinstance(next(iter(ds1._index.values())), uuid.UUID)
 
     ds2 = topgun.store.DataStore()
     ds2._insert(data)
     assert len(ds2._data) == 1000
-    assert len(ds2._index) == 0
-    assert isinstance(next(iter(ds2._data.keys())), uuid.UUID)
+    assert list(ds2._data.keys()) == list(range(1000))
     assert isinstance(next(iter(ds2._data.values())), dict)
 
     ds3 = topgun.store.DataStore(keys=["invalid"])
     ds3._insert(data)
     assert len(ds3._data) == 0
-    assert len(ds3._index) == 0
 
     ds4 = topgun.store.DataStore(keys=["foo"], data=[{"foo": "bar1", "old": "baz"}])
     ds4._insert([{"foo": "bar1", "new": "foobar"}])
@@ -215,28 +303,22 @@ def test_ds_update():
     ds1 = topgun.store.DataStore(keys=["foo"], data=data)
     ds1._update(data)
     assert len(ds1._data) == 1000
-    assert len(ds1._index) == 1000
 
     ds2 = topgun.store.DataStore(keys=["foo"], data=data)
     ds2._update(newdata)
     assert len(ds2._data) == 2000
-    assert len(ds2._index) == 2000
-    assert isinstance(list(ds2._data.keys())[-1], uuid.UUID)
+    assert list(ds2._data.keys())[-1] == "bar1999"
     assert isinstance(list(ds2._data.values())[-1], dict)
-    assert isinstance(list(ds2._index.keys())[-1], int)
-    assert isinstance(list(ds2._index.values())[-1], uuid.UUID)
 
     ds3 = topgun.store.DataStore()
     ds3._update(data)
     assert len(ds3._data) == 1000
-    assert len(ds3._index) == 0
-    assert isinstance(next(iter(ds3._data.keys())), uuid.UUID)
+    assert isinstance(next(iter(ds3._data.keys())), int)
     assert isinstance(next(iter(ds3._data.values())), dict)
 
     ds4 = topgun.store.DataStore(keys=["invalid"])
     ds4._update(data)
     assert len(ds4._data) == 0
-    assert len(ds4._index) == 0
 
 
 def test_ds_delete():
@@ -247,17 +329,14 @@ def test_ds_delete():
     ds1 = topgun.store.DataStore(keys=["foo"], data=data)
     ds1._delete(data)
     assert len(ds1._data) == 0
-    assert len(ds1._index) == 0
 
     ds2 = topgun.store.DataStore(keys=["foo"], data=data)
     ds2._delete(nodata)
     assert len(ds2._data) == 1000
-    assert len(ds2._index) == 1000
 
     ds3 = topgun.store.DataStore(keys=["foo"], data=data)
     ds3._delete(invalid)
     assert len(ds3._data) == 1000
-    assert len(ds3._index) == 1000
 
 
 def test_ds_remove():
@@ -265,17 +344,13 @@ def test_ds_remove():
 
     ds1 = topgun.store.DataStore(keys=["id"], data=data)
     assert len(ds1._data) == 1000
-    assert len(ds1._index) == 1000
     ds1._remove(list(ds1._find_with_uuid({"id": 1})))
     assert len(ds1._data) == 999
-    assert len(ds1._index) == 999
 
     ds2 = topgun.store.DataStore(data=data)
     assert len(ds2._data) == 1000
-    assert len(ds2._index) == 0
     ds2._remove(list(ds2._find_with_uuid({"id": 1})))
     assert len(ds2._data) == 999
-    assert len(ds2._index) == 0
 
 
 def test_ds_pop():
@@ -305,7 +380,6 @@ def test_ds_find_and_delete():
     assert len(ret1) == 1000
     # data store
     assert len(ds1._data) == 0
-    assert len(ds1._index) == 0
 
     ds2 = topgun.store.DataStore(keys=["foo"], data=data)
     ret2 = ds2._find_and_delete(query)
@@ -316,7 +390,6 @@ def test_ds_find_and_delete():
     # data store
     assert len(ds2._data) == 500
     assert all(map(lambda record: 0 == record["mod"], ds2._data.values()))
-    assert len(ds2._index) == 500
 
     ds3 = topgun.store.DataStore(keys=["foo"], data=data)
     ret3 = ds3._find_and_delete(invalid)
@@ -325,7 +398,118 @@ def test_ds_find_and_delete():
     assert len(ret3) == 0
     # data store
     assert len(ds3._data) == 1000
-    assert len(ds3._index) == 1000
+
+
+def test_ds_snapshot():
+    class Book(topgun.store.BookStore):
+        _KEYS = ["symbol", "side", "price"]
+        _INDEXES = [("symbol",)]
+
+    def rows(symbol, *levels):
+        return [
+            {"symbol": symbol, "side": side, "price": price, "size": size}
+            for side, price, size in levels
+        ]
+
+    bs = Book(data=rows("ETH", ("asks", "20", "1")))
+    bs._snapshot(
+        {"symbol": "BTC"},
+        rows("BTC", ("asks", "101", "1"), ("asks", "102", "1"), ("bids", "99", "1")),
+    )
+    stream = bs.watch(batched=True)
+    bs._snapshot(
+        {"symbol": "BTC"},
+        rows("BTC", ("asks", "101", "1"), ("asks", "102", "2"), ("bids", "98", "1"))
+        + [{"symbol": "BTC"}],
+    )
+    batch = stream._queue.get_nowait()
+    assert batch.operations == ["update", "insert", "delete"]
+    assert batch.data == [
+        {"symbol": "BTC", "side": "asks", "price": "102", "size": "2"},
+        {"symbol": "BTC", "side": "bids", "price": "98", "size": "1"},
+        {"symbol": "BTC", "side": "bids", "price": "99", "size": "1"},
+    ]
+    assert bs.sorted({"symbol": "BTC"}) == {
+        "asks": rows("BTC", ("asks", "101", "1"), ("asks", "102", "2")),
+        "bids": rows("BTC", ("bids", "98", "1")),
+    }
+    assert bs.find({"symbol": "ETH"}) == rows("ETH", ("asks", "20", "1"))
+
+    bs._snapshot({}, [])
+    assert len(bs) == 0
+    assert bs._indexes == {("symbol",): {}}
+
+    class Schema(topgun.store.DataStore):
+        _KEYS = ["id"]
+        _SCHEMA = {"value": float}
+
+    ds = Schema(data=[{"id": 1, "value": "1"}])
+    stream = ds.watch(batched=True)
+    ds._snapshot({}, [{"id": 1, "value": "1.0"}])
+    assert stream.depth == 0
+
+    ds = topgun.store.DataStore(data=[{"id": 1}, {"id": 2}])
+    ds._snapshot({}, [{"id": 2}, {"id": 3}])
+    assert ds.find() == [{"id": 2}, {"id": 3}]
+
+
+def test_freeze():
+    import copy
+    import pickle
+
+    message = [{"id": 1, "nested": {"values": [1, 2]}}, {"id": 2}]
+    frozen = topgun.store._freeze(message)
+    assert frozen == ({"id": 1, "nested": {"values": (1, 2)}}, {"id": 2})
+    assert isinstance(frozen[0], topgun.store._FrozenDict)
+    assert isinstance(frozen[0]["nested"], topgun.store._FrozenDict)
+    assert topgun.store._freeze("x") == "x"
+
+    item = frozen[0]
+    with pytest.raises(TypeError):
+        item["id"] = 2
+    with pytest.raises(TypeError):
+        del item["id"]
+    with pytest.raises(TypeError):
+        item |= {"id": 2}
+    for method, args in (
+        ("update", ({"id": 2},)),
+        ("pop", ("id",)),
+        ("popitem", ()),
+        ("clear", ()),
+        ("setdefault", ("x", 1)),
+    ):
+        with pytest.raises(TypeError):
+            getattr(item, method)(*args)
+    assert item == {"id": 1, "nested": {"values": (1, 2)}}
+
+    for thawed in (dict(item), item.copy(), copy.copy(item)):
+        assert type(thawed) is dict
+        thawed["id"] = 3
+    deep = copy.deepcopy(item)
+    assert type(deep) is dict and type(deep["nested"]) is dict
+    deep["nested"]["values"] = []
+    assert type(pickle.loads(pickle.dumps(item))) is dict
+
+    class Orders(topgun.store.DataStore):
+        _KEYS = ["id"]
+
+        def _onmessage(self, message):
+            self._insert([topgun.store._thaw(item) for item in message])
+
+    ds = Orders()
+    stream = ds.watch(deepcopy=True)
+    ds._onmessage(frozen)
+    ds._update([{"id": 1, "size": 1}])
+    assert ds.get({"id": 1})["size"] == 1
+    assert "size" not in frozen[0]
+    assert type(stream._queue.get_nowait().data) is dict
+
+    thawed = topgun.store._thaw(frozen)
+    assert thawed == message
+    assert type(thawed) is list and type(thawed[0]["nested"]) is dict
+    assert type(thawed[0]["nested"]["values"]) is list
+    thawed[0]["nested"]["values"].append(3)
+    assert frozen[0]["nested"]["values"] == (1, 2)
 
 
 def test_ds_clear():
@@ -333,7 +517,6 @@ def test_ds_clear():
     ds = topgun.store.DataStore(keys=["foo"], data=data)
     ds._clear()
     assert len(ds._data) == 0
-    assert len(ds._index) == 0
 
 
 def test_ds_get():
@@ -365,16 +548,221 @@ def test_ds_find_with_uuid():
     ds = topgun.store.DataStore(data=[{"id": 1}, {"id": 2}])
 
     result = ds._find_with_uuid()
-    assert len(result.keys()) == 2
-    assert all(isinstance(x, uuid.UUID) for x in result.keys())
+    assert list(result.keys()) == [0, 1]
     assert list(result.values()) == [{"id": 1}, {"id": 2}]
 
     result = ds._find_with_uuid({"id": 1})
-    assert len(result.keys()) == 1
-    assert all(isinstance(x, uuid.UUID) for x in result.keys())
+    assert list(result.keys()) == [0]
     assert list(result.values()) == [{"id": 1}]
 
 
+@pytest.mark.parametrize(
+    "storage, id_type",
+    [
+        (topgun.store._CompactStorage, tuple),
+        (topgun.store._UUIDStorage, uuid.UUID),
+    ],
+)
+def test_ds_storage(storage, id_type):
+    class Store(topgun.store.DataStore):
+        _KEYS = ["symbol", "id"]
+        _INDEXES = [("symbol",)]
+        _STORAGE = storage
+        _MAXLEN = 3
+
+    ds = Store(data=[{"symbol": "BTC", "id": i} for i in range(3)])
+    assert all(isinstance(x, id_type) for x in ds._find_with_uuid())
+    ds._insert([{"symbol": "BTC", "id": 0, "value": 1}])
+    ds._update([{"symbol": "BTC", "id": 1, "value": 2}])
+    assert ds.find() == [
+        {"symbol": "BTC", "id": 0, "value": 1},
+        {"symbol": "BTC", "id": 1, "value": 2},
+        {"symbol": "BTC", "id": 2},
+    ]
+    # sweep
+    ds._update([{"symbol": "ETH", "id": 0}])
+    assert ds.get({"symbol": "BTC", "id": 0}) is None
+    assert len(ds) == 3
+    # delete, pop and remove
+    ds._delete([{"symbol": "BTC", "id": 1}])
+    assert ds._pop({"symbol": "BTC", "id": 2}) == {"symbol": "BTC", "id": 2}
+    ds._remove(list(ds._find_with_uuid({"symbol": "ETH"})))
+    assert len(ds) == 0
+    assert ds._indexes == {("symbol",): {}}
+    # the key of a removed row can be stored again
+    ds._insert([{"symbol": "ETH", "id": 0}])
+    assert ds.get({"symbol": "ETH", "id": 0}) == {"symbol": "ETH", "id": 0}
+    ds._clear()
+    assert len(ds._data) == 0
+    assert ds.get({"symbol": "ETH", "id": 0}) is None
+
+    ds = Store(keys=["id"])
+    ds._keys = ()
+    ds._insert([{"id": 1}, {"id": 1}])
+    ds._remove(list(ds._find_with_uuid()))
+    assert len(ds) == 0
+
+
+def test_ds_schema():
+    class Book(topgun.store.BookStore):
+        _KEYS = ["symbol", "side", "price"]
+        _SCHEMA = {
+            "price": topgun.store.FixedPoint(
+                "1", ticks={"BTC": "0.5", "ETH": "0.01"}, key="symbol"
+            ),
+            "size": float,
+        }
+        _RAW_SUFFIX = "_raw"
+
+    bs = Book(
+        data=[
+            {"symbol": "BTC", "side": "asks", "price": "100.5", "size": "1"},
+            {"symbol": "ETH", "side": "bids", "price": "10.02", "size": "2.5"},
+            {"symbol": "XRP", "side": "bids", "price": "3", "size": "0"},
+        ]
+    )
+    assert bs.find() == [
+        {
+            "symbol": "BTC",
+            "side": "asks",
+            "price": 201,
+            "size": 1.0,
+            "price_raw": "100.5",
+            "size_raw": "1",
+        },
+        {
+            "symbol": "ETH",
+            "side": "bids",
+            "price": 1002,
+            "size": 2.5,
+            "price_raw": "10.02",
+            "size_raw": "2.5",
+        },
+        {
+            "symbol": "XRP",
+            "side": "bids",
+            "price": 3,
+            "size": 0.0,
+            "price_raw": "3",
+            "size_raw": "0",
+        },
+    ]
+    schema = Book._SCHEMA["price"]
+    assert isinstance(schema, topgun.store.FixedPoint)
+    assert schema.to_decimal(201, {"symbol": "BTC"}) == decimal.Decimal("100.5")
+    assert schema.to_decimal(3, {}) == decimal.Decimal("3")
+
+    # keys are compared on converted values
+    bs._update([{"symbol": "BTC", "side": "asks", "price": "100.5", "size": "3"}])
+    assert bs.get({"symbol": "BTC", "side": "asks", "price": 201})["size"] == 3.0
+    bs._delete([{"symbol": "ETH", "side": "bids", "price": "10.02"}])
+    assert bs._pop({"symbol": "XRP", "side": "bids", "price": "3"}) is not None
+    # stored rows are not converted twice
+    assert bs._find_and_delete({"symbol": "BTC"})[0]["price"] == 201
+    assert len(bs) == 0
+
+    # the given rows, including frozen views, are left as they are
+    frozen = topgun.store._freeze(
+        {"symbol": "BTC", "side": "bids", "price": "99", "size": "0.5"}
+    )
+    bs._insert([frozen])
+    assert frozen["price"] == "99"
+    assert bs.find() == [
+        {
+            "symbol": "BTC",
+            "side": "bids",
+            "price": 198,
+            "size": 0.5,
+            "price_raw": "99",
+            "size_raw": "0.5",
+        }
+    ]
+
+    assert Book._is_zero("0.000")
+    assert not Book._is_zero("10.0")
+    assert Book._is_zero(0.0)
+    assert not Book._is_zero(decimal.Decimal("0.1"))
+
+    class Trade(topgun.store.RingStore):
+        _SCHEMA = {"price": decimal.Decimal}
+
+    rs = Trade(data=[{"price": "0.1"}, {"price": 0.2}, {}])
+    assert rs.find() == [{"price": decimal.Decimal("0.1")}, {"price": 0.2}, {}]
+
+
+def test_ds_indexes():
+    class DataStoreWithIndexes(topgun.store.DataStore):
+        _KEYS = ["id"]
+        _INDEXES = [("symbol",), ("symbol", "side")]
+        _MAXLEN = 6
+
+    data = [
+        {"id": i, "symbol": symbol, "side": side}
+        for i, (symbol, side) in enumerate(
+            [("BTC", "buy"), ("ETH", "buy"), ("BTC", "sell"), ("ETH", "sell")]
+        )
+    ]
+    ds = DataStoreWithIndexes(data=data)
+    assert ds.find({"symbol": "BTC"}) == [data[0], data[2]]
+    assert ds.find({"symbol": "BTC", "side": "sell"}) == [data[2]]
+    assert ds.find({"symbol": "XRP"}) == []
+    assert list(ds._find_with_uuid({"symbol": "ETH"}).values()) == [data[1], data[3]]
+
+    # update moves the row to another index value
+    ds._update([{"id": 0, "symbol": "ETH"}])
+    assert ds.find({"symbol": "BTC"}) == [data[2]]
+    assert ds.find({"symbol": "ETH", "side": "buy"}) == [
+        data[1],
+        {"id": 0, "symbol": "ETH", "side": "buy"},
+    ]
+
+    # insert replaces the row
+    ds._insert([{"id": 2, "symbol": "BTC", "side": "buy"}])
+    assert ds.find({"symbol": "BTC", "side": "sell"}) == []
+    assert ds.find({"symbol": "BTC"}) == [{"id": 2, "symbol": "BTC", "side": "buy"}]
+
+    # rows without the index fields fall outside the index
+    ds._insert([{"id": 4}, {"id": 5, "symbol": "BTC"}])
+    assert ds.find({"symbol": "BTC"}) == [
+        {"id": 2, "symbol": "BTC", "side": "buy"},
+        {"id": 5, "symbol": "BTC"},
+    ]
+
+    # sweep, delete and find_and_delete
+    ds._insert([{"id": 6, "symbol": "XRP", "side": "buy"}])
+    assert len(ds) == 6
+    assert ds.find({"symbol": "ETH"}) == [data[1], data[3]]
+    ds._delete([{"id": 1}])
+    assert ds.find({"symbol": "ETH"}) == [data[3]]
+    assert ds._find_and_delete({"symbol": "BTC"}) == [
+        {"id": 2, "symbol": "BTC", "side": "buy"},
+        {"id": 5, "symbol": "BTC"},
+    ]
+    assert ds.find({"symbol": "BTC"}) == []
+    assert ds._indexes[("symbol",)].keys() == {("ETH",), ("XRP",)}
+
+    # queries not covered by an index scan the store
+    ds._update([{"id": 7, "symbol": "ETH", "side": "sell"}])
+    assert ds.find({"side": "sell"}) == [
+        data[3],
+        {"id": 7, "symbol": "ETH", "side": "sell"},
+    ]
+    assert ds.find({"symbol": ["ETH"]}) == []
+
+    ds._clear()
+    assert ds._indexes == {("symbol",): {}, ("symbol", "side"): {}}
+
+    class DataStoreWithoutKeys(topgun.store.DataStore):
+        _INDEXES = [("symbol",)]
+
+    ds = DataStoreWithoutKeys(data=[{"symbol": "BTC"}])
+    ds._update([{"symbol": "ETH"}, {"symbol": "BTC"}])
+    assert ds.find({"symbol": "BTC"}) == [{"symbol": "BTC"}, {"symbol": "BTC"}]
+    ds._remove(list(ds._find_with_uuid({"symbol": "BTC"})))
+    assert ds.find() == [{"symbol": "ETH"}]
+    assert ds._indexes == {("symbol",): {("ETH",): ds._find_with_uuid()}}
+
+
 @pytest.mark.parametrize(
     "test_input,query,limit,expected",
     [
@@ -460,6 +848,307 @@ def test_ds_sorted(test_input, query, limit, expected):
     assert actual == expected
 
 
+@pytest.mark.parametrize(
+    "query, limit",
+    [
+        (None, None),
+        (None, 2),
+        ({"symbol": "BTC"}, None),
+        ({"symbol": "BTC"}, 2),
+        ({"symbol": "ETH"}, 1),
+        ({"symbol": "XRP"}, None),
+        ({"side": "asks"}, None),
+        ({"flag": True}, 3),
+    ],
+)
+def test_bs_sorted(query, limit):
+    data = [
+        {"symbol": symbol, "side": side, "price": str(price), "flag": price % 2 == 0}
+        for symbol in ("BTC", "ETH")
+        for side in ("asks", "bids")
+        for price in (3, 10, 1, 7, 2, 5)
+    ]
+    bs = topgun.store.BookStore(keys=["symbol", "side", "price"], data=data)
+    expected = bs._sorted(
+        item_key="side",
+        item_asc_key="asks",
+        item_desc_key="bids",
+        sort_key="price",
+        query=query,
+        limit=limit,
+    )
+
+    assert bs.sorted(query=query, limit=limit) == expected
+
+
+def test_bs_ladder():
+    class Book(topgun.store.BookStore):
+        _KEYS = ["s", "S", "p"]
+        _SIDE_KEY = "S"
+        _PRICE_KEY = "p"
+        _ASKS = "a"
+        _BIDS = "b"
+        _MAXLEN = 4
+
+    bs = Book(
+        data=[
+            {"s": "BTC", "S": "a", "p": "101", "q": "1"},
+            {"s": "BTC", "S": "a", "p": "100", "q": "1"},
+            {"s": "BTC", "S": "b", "p": "99", "q": "1"},
+        ]
+    )
+    # replace
+    bs._insert([{"s": "BTC", "S": "a", "p": "100", "q": "2"}])
+    # update in place
+    bs._update([{"s": "BTC", "S": "b", "p": "99", "q": "3"}])
+    assert bs.sorted() == {
+        "a": [
+            {"s": "BTC", "S": "a", "p": "100", "q": "2"},
+            {"s": "BTC", "S": "a", "p": "101", "q": "1"},
+        ],
+        "b": [{"s": "BTC", "S": "b", "p": "99", "q": "3"}],
+    }
+    # delete
+    bs._delete([{"s": "BTC", "S": "a", "p": "100"}])
+    assert bs.sorted(limit=1) == {
+        "a": [{"s": "BTC", "S": "a", "p": "101", "q": "1"}],
+        "b": [{"s": "BTC", "S": "b", "p": "99", "q": "3"}],
+    }
+    # sweep
+    bs._insert([{"s": "BTC", "S": "b", "p": str(p), "q": "1"} for p in (98, 97, 96)])
+    assert len(bs) == 4
+    assert bs.sorted() == bs._sorted("S", "a", "b", "p")
+    assert bs.sorted()["a"] == []
+    # find and delete
+    bs._insert([{"s": "BTC", "S": "a", "p": "102", "q": "1"}])
+    bs._find_and_delete({"S": "b"})
+    assert bs.sorted() == {
+        "a": [{"s": "BTC", "S": "a", "p": "102", "q": "1"}],
+        "b": [],
+    }
+    # clear
+    bs._clear()
+    assert bs.sorted() == {"a": [], "b": []}
+
+
+def test_bs_best():
+    bs = topgun.store.BookStore(keys=["symbol", "side", "price"])
+    assert bs.best({"symbol": "BTC"}) == {"asks": None, "bids": None}
+    bs._insert(
+        [
+            {"symbol": "BTC", "side": "asks", "price": "101"},
+            {"symbol": "BTC", "side": "asks", "price": "100"},
+            {"symbol": "BTC", "side": "bids", "price": "98"},
+            {"symbol": "BTC", "side": "bids", "price": "99"},
+            {"symbol": "ETH", "side": "bids", "price": "10"},
+        ]
+    )
+    assert bs.best({"symbol": "BTC"}) == {
+        "asks": {"symbol": "BTC", "side": "asks", "price": "100"},
+        "bids": {"symbol": "BTC", "side": "bids", "price": "99"},
+    }
+    assert bs.best({"symbol": "ETH"}) == {
+        "asks": None,
+        "bids": {"symbol": "ETH", "side": "bids", "price": "10"},
+    }
+    # merged books
+    assert bs.best() == {
+        "asks": {"symbol": "BTC", "side": "asks", "price": "100"},
+        "bids": {"symbol": "BTC", "side": "bids", "price": "99"},
+    }
+
+
+def test_bs_integer_ladder():
+    class IntBookStore(topgun.store.BookStore):
+        _KEYS = ["symbol", "side", "price"]
+
+        def _price(self, item):
+            return item["price"]
+
+    bs = IntBookStore()
+    bs._insert(
+        [
+            {"symbol": "BTC", "side": "asks", "price": 1001},
+            {"symbol": "BTC", "side": "asks", "price": 1000},
+            {"symbol": "BTC", "side": "bids", "price": 998},
+            {"symbol": "BTC", "side": "bids", "price": 999},
+        ]
+    )
+    assert bs._books[("BTC",)]["asks"].prices == [1000, 1001]
+    assert bs.sorted(limit=1) == {
+        "asks": [{"symbol": "BTC", "side": "asks", "price": 1000}],
+        "bids": [{"symbol": "BTC", "side": "bids", "price": 999}],
+    }
+    bs._delete([{"symbol": "BTC", "side": "asks", "price": 1000}])
+    assert bs.best({"symbol": "BTC"})["asks"] == {
+        "symbol": "BTC",
+        "side": "asks",
+        "price": 1001,
+    }
+
+
+def test_bs_level_key():
+    class LevelBookStore(topgun.store.BookStore):
+        _KEYS = ["symbol", "id", "side"]
+        _LEVEL_KEY = "id"
+
+    bs = LevelBookStore()
+    bs._insert(
+        [
+            {"symbol": "BTC", "id": 1, "side": "asks", "price": 101.0},
+            {"symbol": "BTC", "id": 2, "side": "asks", "price": 100.0},
+        ]
+    )
+    bs._update([{"symbol": "BTC", "id": 2, "side": "asks", "size": 5}])
+    assert bs.sorted({"symbol": "BTC"})["asks"] == [
+        {"symbol": "BTC", "id": 2, "side": "asks", "price": 100.0, "size": 5},
+        {"symbol": "BTC", "id": 1, "side": "asks", "price": 101.0},
+    ]
+    bs._delete([{"symbol": "BTC", "id": 2, "side": "asks"}])
+    assert bs.best({"symbol": "BTC"})["asks"] == {
+        "symbol": "BTC",
+        "id": 1,
+        "side": "asks",
+        "price": 101.0,
+    }
+
+
+def test_bs_trim():
+    bs = topgun.store.BookStore(keys=["symbol", "side", "price"])
+    bs._trim({"symbol": "BTC"}, 1)
+    bs._insert(
+        [
+            {"symbol": "BTC", "side": "asks", "price": "100"},
+            {"symbol": "BTC", "side": "asks", "price": "101"},
+            {"symbol": "BTC", "side": "asks", "price": "102"},
+            {"symbol": "BTC", "side": "bids", "price": "99"},
+            {"symbol": "BTC", "side": "bids", "price": "98"},
+            {"symbol": "ETH", "side": "bids", "price": "10"},
+            {"symbol": "ETH", "side": "bids", "price": "9"},
+        ]
+    )
+    bs._trim({"symbol": "BTC"}, 1)
+    assert bs.find() == [
+        {"symbol": "BTC", "side": "asks", "price": "100"},
+        {"symbol": "BTC", "side": "bids", "price": "99"},
+        {"symbol": "ETH", "side": "bids", "price": "10"},
+        {"symbol": "ETH", "side": "bids", "price": "9"},
+    ]
+    bs._trim({"symbol": "ETH"}, 2)
+    assert len(bs) == 4
+
+
+def test_bs_crc32():
+    bs = topgun.store.BookStore(keys=["symbol", "side", "price"])
+    # Example from the OKX API documentation
+    bs._insert(
+        [
+            {"symbol": "BTC", "side": "bids", "price": "3366.1", "size": "7"},
+            {"symbol": "BTC", "side": "bids", "price": "3366", "size": "6"},
+            {"symbol": "BTC", "side": "asks", "price": "3366.8", "size": "9"},
+            {"symbol": "BTC", "side": "asks", "price": "3368", "size": "8"},
+            {"symbol": "ETH", "side": "bids", "price": "1", "size": "1"},
+            {"symbol": "ETH", "side": "bids", "price": "2", "size": "1"},
+        ]
+    )
+    assert bs._crc32({"symbol": "BTC"}, "size") == -1881014294
+    assert bs._crc32({"symbol": "BTC"}, "size", depth=1) == zlib.crc32(
+        b"3366.1:7:3366.8:9"
+    ) - (1 << 32)
+    # one-sided book, unsigned result
+    assert bs._crc32({"symbol": "ETH"}, "size") == zlib.crc32(b"2:1:1:1")
+    assert bs._crc32({"symbol": "XRP"}, "size") == 0
+
+    # converted values use the raw strings, or str() without them
+    class Book(topgun.store.BookStore):
+        _SCHEMA = {"price": decimal.Decimal, "size": int}
+        _RAW_SUFFIX = "_raw"
+
+    rows = bs.find({"symbol": "BTC"})
+    bs = Book(keys=["symbol", "side", "price"], data=rows)
+    assert bs._crc32({"symbol": "BTC"}, "size") == -1881014294
+    bs._RAW_SUFFIX = None
+    bs._insert([{"symbol": "ETH", "side": "bids", "price": "1.0", "size": "1"}])
+    assert bs._crc32({"symbol": "ETH"}, "size") == zlib.crc32(b"1.0:1")
+
+
+def test_rs_maxlen():
+    class Trade(topgun.store.RingStore):
+        _MAXLEN = 4
+
+    rs = Trade(data=[{"id": i} for i in range(3)])
+    assert len(rs) == 3
+    rs._insert([{"id": 3}, {"id": 4}])
+    assert list(rs) == [{"id": i} for i in range(1, 5)]
+    assert list(reversed(rs)) == [{"id": i} for i in range(4, 0, -1)]
+    assert rs._head == 1
+    # compact once the evicted prefix reaches half of the buffer
+    rs._update([{"id": 5}, {"id": 6}, {"id": 7}])
+    assert list(rs) == [{"id": i} for i in range(4, 8)]
+    assert rs._head == 0
+    assert rs._rows == list(rs)
+    # row ids stay stable across compaction
+    assert rs._find_with_uuid({"id": 5}) == {5: {"id": 5}}
+    assert rs.find({"id": 7}) == [{"id": 7}]
+    with pytest.raises(ValueError):
+        rs.since(0.0)
+
+
+def test_rs_retention():
+    class Trade(topgun.store.RingStore):
+        _TIME_KEY = "T"
+        _RETENTION = 2.0
+
+    rs = Trade(data=[{"T": t * 1000} for t in range(3)])
+    assert rs.since(1.0) == [{"T": 1000}, {"T": 2000}]
+    assert rs.since(3.0) == []
+    # rows older than the newest row by more than the retention are evicted
+    rs._insert([{"T": 4000}])
+    assert list(rs) == [{"T": 2000}, {"T": 4000}]
+    assert rs.since(0.0) == [{"T": 2000}, {"T": 4000}]
+    # out-of-order rows do not move the window back
+    rs._insert([{"T": 3000}])
+    assert len(rs) == 3
+
+    with rs._batch():
+        rs._insert([{"T": 10000}])
+        assert len(rs) == 4
+    assert list(rs) == [{"T": 10000}]
+
+
+def test_rs_remove():
+    class Trade(topgun.store.RingStore):
+        _MAXLEN = 3
+        _TIME_KEY = "T"
+
+    rs = Trade(data=[{"T": t * 1000} for t in range(3)])
+    stream = rs.watch()
+    ids = list(rs._find_with_uuid({"T": 1000}))
+    rs._remove(ids)
+    rs._remove(ids)
+    rs._remove([-1, 100])
+    assert len(rs) == 2
+    assert list(rs) == [{"T": 0}, {"T": 2000}]
+    assert list(reversed(rs)) == [{"T": 2000}, {"T": 0}]
+    assert rs.since(1.0) == [{"T": 2000}]
+    assert rs._find_with_uuid() == {0: {"T": 0}, 2: {"T": 2000}}
+    # evicting a removed row releases its slot
+    rs._insert([{"T": 3000}, {"T": 4000}])
+    assert len(rs) == 3
+    assert rs._removed == 0
+    assert list(rs) == [{"T": 2000}, {"T": 3000}, {"T": 4000}]
+
+    assert rs._find_and_delete() == [{"T": 2000}, {"T": 3000}, {"T": 4000}]
+    assert len(rs) == 0
+    rs._insert([{"T": 5000}])
+    assert rs._find_with_uuid() == {5: {"T": 5000}}
+
+    operations = [
+        stream._queue.get_nowait().operation for _ in range(stream._queue.qsize())
+    ]
+    assert operations == ["delete", "insert", "insert"] + ["delete"] * 3 + ["insert"]
+
+
 def test_ds__len__():
     data = [{"foo": f"bar{i}"} for i in range(1000)]
     ds = topgun.store.DataStore(keys=["foo"], data=data)
@@ -539,21 +1228,256 @@ async def test_ds_wait_functional():
     await asyncio.wait_for(wait_task, timeout=5.0)
 
 
+@pytest.mark.asyncio
+async def test_ds_wait_for():
+    class Order(topgun.store.DataStore):
+        _KEYS = ["id"]
+        _INDEXES = [("symbol",)]
+
+    ds = Order()
+    loop = asyncio.get_running_loop()
+
+    # key
+    task = loop.create_task(ds.wait_for({"id": 1}))
+    await asyncio.sleep(0)
+    assert ds._waiters == {("id",): {(1,): [ds._waiters[("id",)][(1,)][0]]}}
+    ds._insert([{"id": 2, "symbol": "BTC", "status": "new"}])
+    await asyncio.sleep(0)
+    assert not task.done()
+    ds._insert([{"id": 1, "symbol": "BTC", "status": "new"}])
+    change = await asyncio.wait_for(task, timeout=5.0)
+    assert change.operation == "insert"
+    assert change.data == {"id": 1, "symbol": "BTC", "status": "new"}
+    assert ds._waiters == {}
+
+    # index and predicate
+    task = loop.create_task(
+        ds.wait_for(
+            {"symbol": "BTC"}, predicate=lambda change: change.operation == "delete"
+        )
+    )
+    await asyncio.sleep(0)
+    assert list(ds._waiters) == [("symbol",)]
+    ds._update([{"id": 1, "status": "filled"}])
+    ds._insert([{"id": 3, "symbol": "ETH", "status": "new"}, {"id": 4}])
+    await asyncio.sleep(0)
+    assert not task.done()
+    ds._delete([{"id": 1}])
+    change = await asyncio.wait_for(task, timeout=5.0)
+    assert change.data == {"id": 1, "symbol": "BTC", "status": "filled"}
+
+    # scan
+    task = loop.create_task(ds.wait_for({"status": "new"}))
+    other = loop.create_task(ds.wait_for())
+    await asyncio.sleep(0)
+    assert list(ds._waiters) == [()]
+    ds._update([{"id": 2, "status": "filled"}])
+    await asyncio.wait_for(other, timeout=5.0)
+    assert not task.done()
+    ds._update([{"id": 3, "status": "new"}])
+    change = await asyncio.wait_for(task, timeout=5.0)
+    assert change.source == {"id": 3, "status": "new"}
+
+    # unhashable query values fall back to a scan
+    task = loop.create_task(ds.wait_for({"id": [4]}))
+    await asyncio.sleep(0)
+    assert list(ds._waiters) == [()]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert ds._waiters == {}
+
+    # predicate errors are raised to the waiter
+    def predicate(change: topgun.store.StoreChange) -> bool:
+        raise ValueError
+
+    task = loop.create_task(ds.wait_for({"id": 2}, predicate=predicate))
+    await asyncio.sleep(0)
+    ds._update([{"id": 2, "status": "canceled"}])
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(task, timeout=5.0)
+
+    # shares the snapshot with watch streams
+    stream = ds.watch()
+    task = loop.create_task(ds.wait_for({"id": 2}))
+    await asyncio.sleep(0)
+    ds._update([{"id": 2, "status": "new"}])
+    assert await asyncio.wait_for(task, timeout=5.0) is await stream.get()
+
+
 def test_ds_put():
     ds = topgun.store.DataStore()
-    queue = asyncio.Queue()
-    ds._queues.append(queue)
+    stream = ds.watch()
 
     operation = "update"
     source = {"id": 123, "data": "updata"}
     item = {"id": 123, "data": "updata", "extra": "extra"}
 
     ds._put(operation, source, item)
-    result = queue.get_nowait()
+    result = stream._queue.get_nowait()
 
     assert result == topgun.store.StoreChange(ds, operation, source, item)
 
 
+def test_ds_put_shared():
+    ds = topgun.store.DataStore(keys=["id"])
+    streams = [ds.watch(), ds.watch()]
+    copied = ds.watch(deepcopy=True)
+
+    ds._insert([{"id": 1, "tags": ["a"]}])
+    ds._update([{"id": 1, "value": 2}])
+    ds._put("delete", None, {"id": 1})
+
+    changes = [stream._queue.get_nowait() for stream in streams]
+    assert changes[0] is changes[1]
+    assert changes[0].source is None
+    assert changes[0].data == {"id": 1, "tags": ["a"]}
+    with pytest.raises(TypeError):
+        changes[0].data["id"] = 2  # type: ignore
+
+    changes = [stream._queue.get_nowait() for stream in streams]
+    assert changes[0] is changes[1]
+    assert changes[0].source == {"id": 1, "value": 2}
+    assert changes[0].data == {"id": 1, "tags": ["a"], "value": 2}
+
+    change = copied._queue.get_nowait()
+    assert isinstance(change.data, dict)
+    assert change.data == {"id": 1, "tags": ["a"]}
+    assert change.data["tags"] is not ds.get({"id": 1})["tags"]  # type: ignore
+    change.data["id"] = 2
+    assert ds.get({"id": 1}) == {"id": 1, "tags": ["a"], "value": 2}
+
+
+def test_ds_batch():
+    ds = topgun.store.DataStore(keys=["id"])
+    ds._MAXLEN = 2
+    event = asyncio.Event()
+    ds._events.append(event)
+    queue = ds.watch()._queue
+
+    with ds._batch():
+        ds._insert([{"id": 1}, {"id": 2}])
+        with ds._batch():
+            ds._insert([{"id": 3}])
+        ds._delete([{"id": 2}])
+        ds._insert([{"id": 4}])
+        assert len(ds) == 3
+        assert not event.is_set()
+        assert queue.empty()
+
+    assert event.is_set()
+    assert ds.find() == [{"id": 3}, {"id": 4}]
+    changes = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [(x.operation, x.data) for x in changes] == [
+        ("insert", {"id": 1}),
+        ("insert", {"id": 2}),
+        ("insert", {"id": 3}),
+        ("delete", {"id": 2}),
+        ("insert", {"id": 4}),
+    ]
+
+
+def test_ds_batch_without_key():
+    ds = topgun.store.DataStore()
+    ds._MAXLEN = 2
+
+    with ds._batch():
+        ds._insert([{"id": 1}, {"id": 2}, {"id": 3}])
+        assert len(ds) == 3
+
+    assert ds.find() == [{"id": 2}, {"id": 3}]
+    assert not ds._changed
+
+
+def test_ds_watch_batched():
+    ds = topgun.store.DataStore(keys=["id"])
+    stream = ds.watch(batched=True)
+    copied = ds.watch(batched=True, deepcopy=True)
+
+    ds._insert([{"id": 1}, {"id": 2}])
+    with ds._batch():
+        ds._update([{"id": 1, "value": 1}])
+        ds._delete([{"id": 2}])
+        assert stream._queue.qsize() == 1
+    ds._set()
+
+    assert stream._queue.qsize() == 2
+    batch = stream._queue.get_nowait()
+    assert batch == topgun.store.StoreChangeBatch(
+        ds, ["insert", "insert"], [None, None], [{"id": 1}, {"id": 2}]
+    )
+    batch = stream._queue.get_nowait()
+    assert len(batch) == 2
+    assert batch.operations == ["update", "delete"]
+    assert batch.sources == [{"id": 1, "value": 1}, {"id": 2}]
+    assert batch.data == [{"id": 1, "value": 1}, {"id": 2}]
+    assert list(batch) == [
+        topgun.store.StoreChange(ds, "update", {"id": 1, "value": 1}, batch.data[0]),
+        topgun.store.StoreChange(ds, "delete", {"id": 2}, batch.data[1]),
+    ]
+
+    assert copied._queue.qsize() == 2
+    assert isinstance(copied._queue.get_nowait().data[0], dict)
+
+
+@pytest.mark.asyncio
+async def test_ds_watch_bounded():
+    ds = topgun.store.DataStore(keys=["id"])
+    oldest = ds.watch(maxsize=2)
+    newest = ds.watch(maxsize=2, overflow="drop_newest")
+    batched = ds.watch(batched=True, maxsize=1)
+
+    ds._insert([{"id": 1}, {"id": 2}, {"id": 3}])
+    ds._delete([{"id": 1}])
+
+    assert oldest.depth == 2
+    assert oldest.dropped == 2
+    assert [(await oldest.get()).data for _ in range(2)] == [{"id": 3}, {"id": 1}]
+    assert oldest.delivered == 2
+    assert oldest.depth == 0
+
+    assert newest.dropped == 2
+    assert [(await newest.get()).data for _ in range(2)] == [{"id": 1}, {"id": 2}]
+
+    assert batched.dropped == 1
+    assert (await batched.get()).operations == ["delete"]
+
+    with pytest.raises(ValueError):
+        ds.watch(overflow="invalid")  # type: ignore
+    with pytest.raises(ValueError):
+        ds.watch(batched=True, conflate=True)  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_ds_watch_conflate():
+    ds = topgun.store.DataStore(keys=["id"])
+    stream = ds.watch(conflate=True, maxsize=2)
+
+    ds._insert([{"id": 1, "value": 1}, {"id": 2, "value": 1}])
+    ds._update([{"id": 1, "value": 2}, {"id": 1, "value": 3}])
+    assert stream.depth == 2
+    assert stream.conflated == 2
+    ds._insert([{"id": 3, "value": 1}])
+    assert stream.dropped == 1
+
+    change = await stream.get()
+    assert change.operation == "insert"
+    assert change.data == {"id": 2, "value": 1}
+    change = await stream.get()
+    assert change.data == {"id": 3, "value": 1}
+    assert stream.delivered == 2
+    # rows without keys are never conflated
+    ds._put("update", None, {"value": 1})
+    ds._put("update", None, {"value": 1})
+    assert stream.depth == 2
+
+    ds = topgun.store.DataStore()
+    stream = ds.watch(conflate=True)
+    ds._insert([{"id": 1}, {"id": 1}])
+    assert stream.depth == 2
+    assert stream.conflated == 0
+
+
 def test_ds_watch():
     ds = topgun.store.DataStore()
 
@@ -7,8 +7,8 @@ import json
 import logging
 import zlib
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
-from unittest.mock import ANY, AsyncMock, MagicMock, PropertyMock, call
+from typing import TYPE_CHECKING, cast
+from unittest.mock import ANY, AsyncMock, MagicMock, Mock, PropertyMock, call
 
 import aiohttp
 import pytest
@@ -23,9 +23,14 @@ import topgun.ws
 from topgun.ws import WebSocketApp
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
     import pytest_mock
     from _typeshed import ReadableBuffer
 
+    from topgun.ws import ClientWebSocketResponse
+
 
 @pytest_asyncio.fixture
 async def client_session():
@@ -390,6 +395,189 @@ async def test_websocketapp_functional(
     ]
 
 
+@pytest_asyncio.fixture
+async def test_burst_server():
+    async def burst(request: web.Request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        await ws.receive_str()
+        await ws.send_str("pong")
+        for i in range(100):
+            await ws.send_json({"i": i})
+        await ws.send_bytes(b"spam")
+
+        await ws.receive()
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", burst)])
+
+    async with TestServer(app) as server:
+        yield server
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("drain", [False, True])
+async def test_websocketapp_inline(
+    test_burst_server: TestServer, caplog: pytest.LogCaptureFixture, drain: bool
+):
+    class Store(topgun.DataStoreCollection):
+        def _init(self) -> None:
+            self.received: list[Any] = []
+            self.batched = 0
+
+        def _onmessage(self, msg: Any, ws: ClientWebSocketResponse | None = None):
+            self.received.append(msg)
+            self.batched += bool(self._batching)
+
+    def broken(msg: Any, ws: ClientWebSocketResponse) -> None:
+        raise ValueError(msg)
+
+    store = Store()
+    received_bytes: list[bytes] = []
+
+    async with topgun.Client() as client:
+        ws = await client.ws_connect(
+            f"ws://localhost:{test_burst_server.port}/ws",
+            send_str="ping",
+            hdlr_bytes=lambda msg, ws: received_bytes.append(msg),
+            hdlr_json=[broken, store.onmessage],
+            inline=True,
+            drain=drain,
+        )
+        for _ in range(500):
+            if received_bytes:
+                break
+            await asyncio.sleep(0.01)
+        ws._task.cancel()
+
+    assert store.received == [{"i": i} for i in range(100)]
+    assert received_bytes == [b"spam"]
+    assert (store.batched > 0) is drain
+    records = [
+        x
+        for x in caplog.records
+        if x.name == "topgun.ws" and x.getMessage().startswith("Error in WebSocket")
+    ]
+    assert len(records) == 100
+
+
+@pytest.mark.asyncio
+async def test_websocketapp_inline_control(
+    mocker: pytest_mock.MockerFixture,
+    client_session: aiohttp.ClientSession,
+    caplog: pytest.LogCaptureFixture,
+):
+    mocker.patch.object(WebSocketApp, WebSocketApp._run_forever.__name__)
+
+    class FakeWebSocket:
+        def __init__(self, messages: list[aiohttp.WSMessage]) -> None:
+            self._buffer = messages
+            self._reader = self
+            self.pong = AsyncMock()
+
+        def __aiter__(self) -> FakeWebSocket:
+            return self
+
+        async def __anext__(self) -> aiohttp.WSMessage:
+            if not self._buffer:
+                raise StopAsyncIteration
+            return self._buffer.pop(0)
+
+        async def receive(self) -> aiohttp.WSMessage:
+            return self._buffer.pop(0)
+
+    def broken(msg: Any, ws: ClientWebSocketResponse) -> None:
+        raise ValueError(msg)
+
+    received: list[Any] = []
+    m_ws = FakeWebSocket(
+        [
+            aiohttp.WSMessage(aiohttp.WSMsgType.PING, b"ping", None),
+            aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, '{"i": 0}', None),
+            aiohttp.WSMessage(aiohttp.WSMsgType.CLOSE, 1000, None),
+            aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, '{"i": 1}', None),
+        ]
+    )
+
+    app = WebSocketApp(client_session, "ws://localhost/ws", inline=True, drain=True)
+    await app._ws_receive(
+        cast("ClientWebSocketResponse", m_ws),
+        [broken],
+        [],
+        [lambda msg, ws: received.append(msg)],
+    )
+    await asyncio.sleep(0)
+
+    # Answers the PING inline and stops draining at the close frame
+    assert m_ws.pong.call_args == call(b"ping")
+    assert received == [{"i": 0}, {"i": 1}]
+    assert app._received == 3
+    assert [x.getMessage() for x in caplog.records] == [
+        f"Error in WebSocket handler {broken!r}"
+    ] * 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("inline", [False, True])
+async def test_websocketapp_json_loads(test_burst_server: TestServer, inline: bool):
+    received: list[Any] = []
+
+    def loads(s: str | bytes) -> Any:
+        return {"decoded": json.loads(s)}
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj)
+
+    async with topgun.Client() as client:
+        ws = await client.ws_connect(
+            f"ws://localhost:{test_burst_server.port}/ws",
+            send_str="ping",
+            hdlr_json=lambda msg, ws: received.append(msg),
+            inline=inline,
+            json_loads=loads,
+            json_dumps=dumps,
+        )
+        for _ in range(500):
+            if len(received) == 100:
+                break
+            await asyncio.sleep(0.01)
+        assert ws.current_ws is not None
+        assert topgun.ws._ws_loads(ws.current_ws) is loads
+        assert ws.current_ws.__dict__["_json_dumps"] is dumps
+        ws._task.cancel()
+
+    assert received == [{"decoded": {"i": i}} for i in range(100)]
+
+
+@pytest.mark.asyncio
+async def test_websocketapp_reader_buffer(test_burst_server: TestServer):
+    # Draining relies on the private buffer of the installed aiohttp
+    async with topgun.Client() as client:
+        ws = await client.ws_connect(
+            f"ws://localhost:{test_burst_server.port}/ws", send_str="ping"
+        )
+        assert ws.current_ws is not None
+        assert hasattr(ws.current_ws._reader, "_buffer")
+        ws._task.cancel()
+
+
+def test_websocketapp_no_reader_buffer(
+    mocker: pytest_mock.MockerFixture, caplog: pytest.LogCaptureFixture
+):
+    mocker.patch.object(WebSocketApp, "_NO_BUFFER", False)
+    m_ws = Mock()
+    m_ws._reader = object()
+
+    for _ in range(2):
+        assert WebSocketApp._buffered(m_ws) is False
+    assert [x.levelno for x in caplog.records] == [logging.WARNING]
+
+    m_ws._reader = Mock(_buffer=[None])
+    assert WebSocketApp._buffered(m_ws) is True
+
+
 @pytest_asyncio.fixture
 async def test_ping_pong_server():
     call_count = 0
@@ -422,6 +610,646 @@ async def test_ping_pong_server():
         yield server
 
 
+@pytest_asyncio.fixture
+async def test_subscription_server():
+    received: list[list[dict]] = []
+
+    async def binance(request: web.Request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        received.append([])
+        async for msg in ws:
+            data = msg.json()
+            received[-1].append(data)
+            await ws.send_json({"result": None, "id": data["id"]})
+            if data["method"] == "UNSUBSCRIBE":
+                break
+
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", binance)])
+    app["received"] = received
+
+    async with TestServer(app) as server:
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_websocketapp_subscriptions(
+    mocker: pytest_mock.MockerFixture, test_subscription_server: TestServer
+):
+    mocker.patch.object(
+        topgun.ws.SubscriptionHosts,
+        "items",
+        {"localhost": topgun.ws.BinanceSubscription()},
+    )
+    mocker.patch.object(
+        topgun.ws.CoalesceHosts, "items", {"localhost": topgun.ws.Coalesce.binance}
+    )
+    received: list[list[dict]] = test_subscription_server.app["received"]
+
+    async def until(predicate: Callable[[], bool]) -> None:
+        for _ in range(500):
+            if predicate():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("timeout")
+
+    async with topgun.Client() as client:
+        ws = await client.ws_connect(
+            f"ws://localhost:{test_subscription_server.port}/ws",
+            send_json=[
+                {"method": "SUBSCRIBE", "params": ["a@trade"], "id": 1},
+                {"method": "SUBSCRIBE", "params": ["b@trade"], "id": 2},
+            ],
+        )
+        await until(lambda: len(ws.subscriptions.confirmed) == 2)
+
+        await ws.subscribe("c@trade", "a@trade")
+        await until(lambda: len(ws.subscriptions.confirmed) == 3)
+        assert ws.subscriptions.pending == []
+
+        await ws.unsubscribe("a@trade")
+        assert ws.subscriptions.active == ["b@trade", "c@trade"]
+
+        # only the active set is replayed on reconnection
+        await until(lambda: len(received) == 2 and len(ws.subscriptions.confirmed) == 2)
+        assert ws.subscriptions.confirmed == ["b@trade", "c@trade"]
+        ws._task.cancel()
+
+    assert received == [
+        [
+            {"method": "SUBSCRIBE", "params": ["a@trade", "b@trade"], "id": 1},
+            {"method": "SUBSCRIBE", "params": ["c@trade"], "id": 2},
+            {"method": "UNSUBSCRIBE", "params": ["a@trade"], "id": 3},
+        ],
+        # send_json is replayed with its own IDs, without the unsubscribed channels
+        [
+            {"method": "SUBSCRIBE", "params": ["b@trade"], "id": 2},
+            {"method": "SUBSCRIBE", "params": ["c@trade"], "id": 4},
+        ],
+    ]
+
+
+@pytest.mark.parametrize(
+    ("test_input", "expected"),
+    [
+        (
+            {
+                "host": "stream.bybit.com",
+                "send_json": [
+                    {"op": "subscribe", "args": [f"publicTrade.S{i}"]}
+                    for i in range(12)
+                ],
+                "acks": [
+                    {"success": True, "op": "subscribe", "req_id": "1"},
+                    {"success": False, "op": "subscribe", "req_id": "2"},
+                ],
+            },
+            {
+                "messages": [
+                    {
+                        "op": "subscribe",
+                        "args": [f"publicTrade.S{i}" for i in range(10)],
+                        "req_id": "1",
+                    },
+                    {
+                        "op": "subscribe",
+                        "args": ["publicTrade.S10", "publicTrade.S11"],
+                        "req_id": "2",
+                    },
+                ],
+                "active": [f"publicTrade.S{i}" for i in range(10)],
+                "confirmed": [f"publicTrade.S{i}" for i in range(10)],
+                "pending": [],
+            },
+        ),
+        (
+            {
+                "host": "ws.okx.com",
+                "send_json": [
+                    {"op": "login", "args": [{"apiKey": "key"}]},
+                    {"op": "subscribe", "args": [{"channel": "books", "instId": "A"}]},
+                    {"op": "subscribe", "args": [{"channel": "trades", "instId": "A"}]},
+                ],
+                "acks": [
+                    {
+                        "id": "1",
+                        "event": "subscribe",
+                        "arg": {"instId": "A", "channel": "books"},
+                    },
+                ],
+            },
+            {
+                "messages": [
+                    {"op": "login", "args": [{"apiKey": "key"}]},
+                    {
+                        "op": "subscribe",
+                        "args": [
+                            {"channel": "books", "instId": "A"},
+                            {"channel": "trades", "instId": "A"},
+                        ],
+                        "id": "1",
+                    },
+                ],
+                "active": [
+                    {"channel": "books", "instId": "A"},
+                    {"channel": "trades", "instId": "A"},
+                ],
+                "confirmed": [{"channel": "books", "instId": "A"}],
+                "pending": [{"channel": "trades", "instId": "A"}],
+            },
+        ),
+        (
+            {
+                "host": "ws.lightstream.bitflyer.com",
+                "send_json": [
+                    {
+                        "method": "subscribe",
+                        "params": {"channel": "lightning_ticker_BTC_JPY"},
+                        "id": 1,
+                    },
+                    {
+                        "method": "subscribe",
+                        "params": {"channel": "child_order_events"},
+                        "id": 2,
+                    },
+                ],
+                "acks": [
+                    {"jsonrpc": "2.0", "id": 1, "result": True},
+                    {"jsonrpc": "2.0", "id": 2, "error": {"code": -32600}},
+                ],
+            },
+            {
+                "messages": [
+                    {
+                        "method": "subscribe",
+                        "params": {"channel": "lightning_ticker_BTC_JPY"},
+                        "id": 1,
+                    },
+                    {
+                        "method": "subscribe",
+                        "params": {"channel": "child_order_events"},
+                        "id": 2,
+                    },
+                ],
+                "active": ["lightning_ticker_BTC_JPY"],
+                "confirmed": ["lightning_ticker_BTC_JPY"],
+                "pending": [],
+            },
+        ),
+        # OKX error events fail the request with the echoed id
+        (
+            {
+                "host": "ws.okx.com",
+                "send_json": [
+                    {"id": "1", "op": "subscribe", "args": [{"channel": "tickers"}]},
+                    {"op": "login", "args": [{"apiKey": "key"}]},
+                    {"id": "2", "op": "subscribe", "args": [{"channel": "books"}]},
+                ],
+                "acks": [
+                    {"event": "error", "code": "60009", "msg": "", "connId": "a"},
+                    {
+                        "event": "error",
+                        "code": "60018",
+                        "msg": "",
+                        "connId": "a",
+                        "id": "2",
+                    },
+                ],
+            },
+            {
+                "messages": [
+                    {"id": "1", "op": "subscribe", "args": [{"channel": "tickers"}]},
+                    {"op": "login", "args": [{"apiKey": "key"}]},
+                    {"id": "2", "op": "subscribe", "args": [{"channel": "books"}]},
+                ],
+                "active": [{"channel": "tickers"}],
+                "confirmed": [],
+                "pending": [{"channel": "tickers"}],
+            },
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_subscriptions(test_input, expected):
+    subscriptions = topgun.ws.Subscriptions(test_input["host"])
+    subscriptions._absorb(test_input["send_json"])
+
+    m_ws = AsyncMock()
+    m_ws.closed = False
+    messages = await subscriptions._onconnect(m_ws, test_input["send_json"])
+    for ack in test_input["acks"]:
+        subscriptions._onmessage(ack)
+
+    assert messages == expected["messages"]
+    assert subscriptions.active == expected["active"]
+    assert subscriptions.confirmed == expected["confirmed"]
+    assert subscriptions.pending == expected["pending"]
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_send_json():
+    subscriptions = topgun.ws.Subscriptions("stream.bybit.com")
+    send_json = [
+        {"op": "auth", "args": ["key", 0, "signature"]},
+        {"req_id": "spot", "op": "subscribe", "args": ["orderbook.1.A", "trade.A"]},
+        {"op": "subscribe", "args": ["orderbook.1.B"]},
+    ]
+    subscriptions._absorb(send_json)
+
+    await subscriptions._update(False, ("trade.A",))
+    await subscriptions._update(True, ("orderbook.1.C",))
+
+    m_ws = AsyncMock()
+    m_ws.closed = False
+    messages = await subscriptions._onconnect(m_ws, send_json)
+    subscriptions._onmessage({"success": True, "op": "subscribe", "req_id": "spot"})
+
+    # Extra fields and the order of send_json are kept
+    assert messages == [
+        {"op": "auth", "args": ["key", 0, "signature"]},
+        {"req_id": "spot", "op": "subscribe", "args": ["orderbook.1.A"]},
+        {"op": "subscribe", "args": ["orderbook.1.B", "orderbook.1.C"], "req_id": "1"},
+    ]
+    assert send_json[1] == {
+        "req_id": "spot",
+        "op": "subscribe",
+        "args": ["orderbook.1.A", "trade.A"],
+    }
+    assert subscriptions.confirmed == ["orderbook.1.A"]
+    assert subscriptions.pending == ["orderbook.1.B", "orderbook.1.C"]
+
+
+def test_subscription_protocol():
+    protocol = topgun.ws.SubscriptionProtocol()
+    msg = {"op": "subscribe", "args": ["a"]}
+    assert protocol.identify(msg, 1) is msg
+    assert protocol.response({"event": "subscribe"}) is None
+
+    assert topgun.ws.BinanceSubscription().response({"stream": "a"}) is None
+    assert topgun.ws.BybitSubscription().response({"topic": "a"}) is None
+
+    okx = topgun.ws.OKXSubscription()
+    assert okx.response([]) is None
+    assert okx.response({"event": "login", "code": "0"}) is None
+
+    bitflyer = topgun.ws.bitFlyerSubscription()
+    assert bitflyer.parse({"method": "auth", "params": {}}) is None
+    assert bitflyer.parse({"method": "subscribe", "params": {}}) is None
+    assert bitflyer.build(False, "a") == {
+        "method": "unsubscribe",
+        "params": {"channel": "a"},
+    }
+    assert bitflyer.response({"method": "channelMessage"}) is None
+
+    subscriptions = topgun.ws.Subscriptions("stream.binance.com")
+    subscriptions._absorb(
+        [
+            {"method": "SUBSCRIBE", "params": ["a@trade", "b@trade"], "id": 1},
+            {"method": "UNSUBSCRIBE", "params": ["a@trade"], "id": 2},
+        ]
+    )
+    subscriptions._onmessage({"stream": "b@trade", "data": {}})
+    assert subscriptions.active == ["b@trade"]
+
+    assert topgun.ws.BitgetSubscription().identify(msg, 1) is msg
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_okx_acks():
+    subscriptions = topgun.ws.Subscriptions("ws.okx.com")
+    send_json = [{"op": "subscribe", "args": [{"channel": "a"}, {"channel": "b"}]}]
+    subscriptions._absorb(send_json)
+    messages = await subscriptions._onconnect(AsyncMock(), send_json)
+    assert messages == [{**send_json[0], "id": "1"}]
+
+    # unrelated errors leave the pending channels as they are
+    subscriptions._onmessage({"event": "error", "code": "60009", "msg": ""})
+    assert subscriptions.pending == [{"channel": "a"}, {"channel": "b"}]
+
+    for channel in ("a", "b"):
+        subscriptions._onmessage(
+            {"id": "1", "event": "subscribe", "arg": {"channel": channel}}
+        )
+    assert subscriptions.confirmed == [{"channel": "a"}, {"channel": "b"}]
+    assert subscriptions._requests == {}
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_resubscribe():
+    subscriptions = topgun.ws.Subscriptions("ws.okx.com")
+    send_json = [{"op": "subscribe", "args": [{"channel": "a"}, {"channel": "b"}]}]
+    subscriptions._absorb(send_json)
+    await subscriptions._onconnect(AsyncMock(), send_json)
+    for channel in ("a", "b"):
+        subscriptions._onmessage(
+            {"id": "1", "event": "subscribe", "arg": {"channel": channel}}
+        )
+
+    m_ws = AsyncMock()
+    await subscriptions._resubscribe(m_ws, [{"channel": "a"}, {"channel": "c"}])
+    assert m_ws.send_json.await_args_list == [
+        call(
+            {
+                "op": "unsubscribe",
+                "args": [{"channel": "a"}, {"channel": "c"}],
+                "id": "2",
+            }
+        ),
+        call({"op": "subscribe", "args": [{"channel": "a"}], "id": "3"}),
+        # Not subscribed by the WebSocketApp, so not tracked
+        call({"op": "subscribe", "args": [{"channel": "c"}], "id": "4"}),
+    ]
+    assert subscriptions.confirmed == [{"channel": "b"}]
+    assert subscriptions.pending == [{"channel": "a"}]
+
+    # The acks of the untracked requests are ignored
+    for request_id, event, channel in (
+        ("2", "unsubscribe", "a"),
+        ("2", "unsubscribe", "c"),
+        ("4", "subscribe", "c"),
+    ):
+        subscriptions._onmessage(
+            {"id": request_id, "event": event, "arg": {"channel": channel}}
+        )
+    assert subscriptions.pending == [{"channel": "a"}]
+    subscriptions._onmessage({"id": "3", "event": "subscribe", "arg": {"channel": "a"}})
+    assert subscriptions.confirmed == [{"channel": "a"}, {"channel": "b"}]
+    assert subscriptions.active == [{"channel": "a"}, {"channel": "b"}]
+
+    # Bitget does not echo request IDs
+    subscriptions = topgun.ws.Subscriptions("ws.bitget.com")
+    send_json = [{"op": "subscribe", "args": [{"channel": "a"}]}]
+    subscriptions._absorb(send_json)
+    await subscriptions._onconnect(AsyncMock(), send_json)
+    subscriptions._onmessage({"event": "subscribe", "arg": {"channel": "a"}})
+    m_ws = AsyncMock()
+    await subscriptions._resubscribe(m_ws, [{"channel": "a"}])
+    assert m_ws.send_json.await_args_list == [
+        call({"op": "unsubscribe", "args": [{"channel": "a"}]}),
+        call({"op": "subscribe", "args": [{"channel": "a"}]}),
+    ]
+    assert subscriptions.confirmed == [{"channel": "a"}]
+    assert subscriptions.pending == []
+
+
+@pytest.mark.asyncio
+async def test_client_ws_resubscribe():
+    m_ws = AsyncMock()
+    await topgun.ws.ClientWebSocketResponse._resubscribe(m_ws, ["orderbook.50.BTCUSDT"])
+    assert m_ws.send_json.await_args_list == [
+        call({"op": "unsubscribe", "args": ["orderbook.50.BTCUSDT"]}),
+        call({"op": "subscribe", "args": ["orderbook.50.BTCUSDT"]}),
+    ]
+
+    subscriptions = topgun.ws.Subscriptions("stream.bybit.com")
+    send_json = [{"op": "subscribe", "args": ["orderbook.50.BTCUSDT"]}]
+    subscriptions._absorb(send_json)
+    m_ws = AsyncMock()
+    await subscriptions._onconnect(m_ws, send_json)
+    await topgun.ws.ClientWebSocketResponse._resubscribe(m_ws, ["orderbook.50.BTCUSDT"])
+    assert m_ws.send_json.await_args_list == [
+        call({"op": "unsubscribe", "args": ["orderbook.50.BTCUSDT"], "req_id": "2"}),
+        call({"op": "subscribe", "args": ["orderbook.50.BTCUSDT"], "req_id": "3"}),
+    ]
+    subscriptions._onmessage({"op": "unsubscribe", "success": True, "req_id": "2"})
+    assert subscriptions.pending == ["orderbook.50.BTCUSDT"]
+
+    # A stale connection is not managed by the subscriptions any longer
+    await subscriptions._onconnect(AsyncMock(), send_json)
+    m_ws.send_json.reset_mock()
+    await topgun.ws.ClientWebSocketResponse._resubscribe(m_ws, ["orderbook.50.BTCUSDT"])
+    assert m_ws.send_json.await_args_list == [
+        call({"op": "unsubscribe", "args": ["orderbook.50.BTCUSDT"]}),
+        call({"op": "subscribe", "args": ["orderbook.50.BTCUSDT"]}),
+    ]
+
+
+def test_websocketapp_subscriptions_error(caplog: pytest.LogCaptureFixture):
+    m_self = Mock()
+    m_self._subscriptions._pending = {'"a@trade"': True}
+    m_self._subscriptions._onmessage.side_effect = RuntimeError
+    m_ws = Mock()
+    received: list[Any] = []
+
+    def hdlr(data: Any, ws: ClientWebSocketResponse) -> None:
+        received.append(data)
+
+    msg = aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, '{"id": 1}', None)
+    WebSocketApp._dispatch(m_self, msg, m_ws, [], [], [hdlr], json.loads)
+    WebSocketApp._onmessage(m_self, msg, m_ws, [], [], [hdlr], json.loads)
+
+    # The handlers still receive the message
+    assert received == [{"id": 1}]
+    assert m_self._loop.call_soon.call_args == call(hdlr, {"id": 1}, m_ws)
+    assert [x.message for x in caplog.records] == [
+        "Error in WebSocket subscriptions"
+    ] * 2
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_unsupported():
+    subscriptions = topgun.ws.Subscriptions("example.com")
+    send_json = [{"op": "subscribe", "args": ["spam"]}]
+    subscriptions._absorb(send_json)
+
+    assert subscriptions.active == []
+    assert await subscriptions._onconnect(AsyncMock(), send_json) is send_json
+    with pytest.raises(ValueError):
+        await subscriptions._update(True, ("spam",))
+
+
+@pytest.mark.asyncio
+async def test_websocketgroup_hash(
+    mocker: pytest_mock.MockerFixture, client_session: aiohttp.ClientSession
+):
+    m_run_forever = mocker.patch.object(
+        WebSocketApp, WebSocketApp._run_forever.__name__
+    )
+    channels = [f"s{i}@trade" for i in range(20)]
+
+    group = topgun.WebSocketGroup(
+        functools.partial(WebSocketApp, client_session),
+        "wss://stream.binance.com/ws",
+        channels,
+        shards=3,
+        send_json={"method": "LIST_SUBSCRIPTIONS", "id": 0},
+    )
+
+    def shard(channel: str) -> int:
+        return zlib.crc32(json.dumps(channel).encode()) % 3
+
+    assert len(group.shards) == 3
+    for i, app in enumerate(group.shards):
+        assert app.subscriptions.active == [x for x in channels if shard(x) == i]
+    assert [x.kwargs["send_json"] for x in m_run_forever.call_args_list] == [
+        [
+            {"method": "LIST_SUBSCRIPTIONS", "id": 0},
+            *(
+                {"method": "SUBSCRIBE", "params": [x]}
+                for x in channels
+                if shard(x) == i
+            ),
+        ]
+        for i in range(3)
+    ]
+
+    await group.subscribe("spam@trade", "s0@trade")
+    await group.unsubscribe("s1@trade")
+
+    assert group.shards[shard("spam@trade")].subscriptions.active[-1] == "spam@trade"
+    assert sum(len(x.subscriptions.active) for x in group.shards) == 20
+    assert all("s1@trade" not in x.subscriptions.active for x in group.shards)
+
+    # Channels are not moved between shards without weights
+    rebalance = group.shards[0].subscriptions._rebalance
+    assert rebalance is not None
+    await rebalance()
+    assert sum(len(x.subscriptions.active) for x in group.shards) == 20
+
+    for app in group.shards:
+        app._event.set()
+    assert await group is group
+    await group.wait()
+
+
+@pytest.mark.asyncio
+async def test_websocketgroup_rebalance(
+    mocker: pytest_mock.MockerFixture, client_session: aiohttp.ClientSession
+):
+    mocker.patch.object(WebSocketApp, WebSocketApp._run_forever.__name__)
+
+    group = topgun.WebSocketGroup(
+        functools.partial(WebSocketApp, client_session),
+        "wss://stream.binance.com/ws",
+        ["a@trade", "b@trade", "c@trade", "d@trade"],
+        shards=2,
+        weights=[5.0, 3.0, 2.0, 2.0],
+    )
+    shard0, shard1 = group.shards
+
+    assert shard0.subscriptions.active == ["a@trade", "d@trade"]
+    assert shard1.subscriptions.active == ["b@trade", "c@trade"]
+
+    sent: list[tuple[int, dict]] = []
+    m_ws0 = AsyncMock()
+    m_ws0.closed = False
+    m_ws0.send_json.side_effect = lambda x: sent.append((0, x))
+    m_ws1 = AsyncMock()
+    m_ws1.closed = False
+    m_ws1.send_json.side_effect = lambda x: sent.append((1, x))
+    await shard0.subscriptions._onconnect(m_ws0, [])
+    await shard1.subscriptions._onconnect(m_ws1, [])
+    m_ws0.closed = True
+
+    await group.unsubscribe("a@trade")
+    # shard 0 reconnects and takes over "c@trade" from shard 1
+    messages = await shard0.subscriptions._onconnect(m_ws0, [])
+
+    assert shard0.subscriptions.active == ["d@trade", "c@trade"]
+    assert shard1.subscriptions.active == ["b@trade"]
+    assert sent == [(1, {"method": "UNSUBSCRIBE", "params": ["c@trade"], "id": 2})]
+    assert messages == [
+        {"method": "SUBSCRIBE", "params": ["d@trade", "c@trade"], "id": 2}
+    ]
+
+    # placed on the least loaded shard
+    await group.subscribe("e@trade", weight=4.0)
+
+    assert shard1.subscriptions.active == ["b@trade", "e@trade"]
+
+
+@pytest.mark.asyncio
+async def test_websocketgroup_rebalance_reconnecting(
+    mocker: pytest_mock.MockerFixture, client_session: aiohttp.ClientSession
+):
+    mocker.patch.object(WebSocketApp, WebSocketApp._run_forever.__name__)
+
+    group = topgun.WebSocketGroup(
+        functools.partial(WebSocketApp, client_session),
+        "wss://stream.binance.com/ws",
+        ["a@trade", "b@trade", "c@trade", "d@trade"],
+        shards=2,
+        weights=[5.0, 3.0, 2.0, 2.0],
+    )
+    shard0, shard1 = group.shards
+
+    def overlap() -> set[Any]:
+        return set(shard0.subscriptions.active) & set(shard1.subscriptions.active)
+
+    sent: list[tuple[dict, set[Any]]] = []
+    m_ws0 = AsyncMock()
+    m_ws0.closed = False
+    m_ws1 = AsyncMock()
+    m_ws1.closed = False
+    m_ws1.send_json.side_effect = lambda x: sent.append((x, overlap()))
+
+    # Not rebalanced on the first connection
+    assert await shard0.subscriptions._onconnect(m_ws0, []) == [
+        {"method": "SUBSCRIBE", "params": ["a@trade", "d@trade"], "id": 1}
+    ]
+    await shard1.subscriptions._onconnect(m_ws1, [])
+    m_ws0.closed = True
+
+    await group.unsubscribe("b@trade")
+    sent.clear()
+    # shard 0 reconnects and hands "d@trade" over to shard 1
+    messages = await shard0.subscriptions._onconnect(m_ws0, [])
+
+    assert shard0.subscriptions.active == ["a@trade"]
+    assert shard1.subscriptions.active == ["c@trade", "d@trade"]
+    assert sent == [({"method": "SUBSCRIBE", "params": ["d@trade"], "id": 3}, set())]
+    assert messages == [{"method": "SUBSCRIBE", "params": ["a@trade"], "id": 2}]
+
+
+@pytest.mark.asyncio
+async def test_websocketgroup_rates(
+    mocker: pytest_mock.MockerFixture, client_session: aiohttp.ClientSession
+):
+    mocker.patch.object(WebSocketApp, WebSocketApp._run_forever.__name__)
+    m_monotonic = mocker.patch("time.monotonic", return_value=100.0)
+
+    group = topgun.WebSocketGroup(
+        functools.partial(WebSocketApp, client_session),
+        "wss://ws.okx.com:8443/ws/v5/public",
+        [{"channel": "books", "instId": "BTC-USDT"}],
+        shards=2,
+    )
+    group.shards[0]._received = 30
+    group.shards[1]._received = 10
+    m_monotonic.return_value = 102.0
+
+    assert group.rates() == [15.0, 5.0]
+
+    group.shards[0]._received = 40
+    m_monotonic.return_value = 104.0
+
+    assert group.rates() == [5.0, 0.0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        {"url": "wss://example.com/ws", "shards": 2},
+        {"url": "wss://stream.binance.com/ws", "shards": 0},
+        {"url": "wss://stream.binance.com/ws", "shards": 2, "weights": [1.0]},
+    ],
+)
+async def test_websocketgroup_invalid(test_input):
+    connect = Mock()
+    url = test_input.pop("url")
+
+    with pytest.raises(ValueError):
+        topgun.WebSocketGroup(connect, url, ["a@trade", "b@trade"], **test_input)
+
+    assert not connect.called
+
+
 @pytest.mark.asyncio
 async def test_websocketapp_ensure_open_hdlr(
     test_ping_pong_server: TestServer, caplog: pytest.LogCaptureFixture
@@ -648,6 +1476,41 @@ async def test_wsresponse_send_json():
     )
 
 
+@pytest.mark.asyncio
+async def test_wsresponse_json_codec():
+    m_resp = MagicMock()
+    m_resp._auth = None
+    m_resp._session.__dict__["_json_loads"] = lambda s: {"decoded": json.loads(s)}
+    m_resp._session.__dict__["_json_dumps"] = lambda obj: json.dumps(
+        obj, separators=(",", ":")
+    )
+    m_reader = AsyncMock()
+    m_reader.read.return_value = aiohttp.WSMessage(
+        aiohttp.WSMsgType.TEXT, '{"foo": "bar"}', None
+    )
+    m_writer = AsyncMock()
+
+    wsresp = topgun.ws.ClientWebSocketResponse(
+        reader=m_reader,
+        writer=m_writer,
+        protocol=None,
+        response=m_resp,
+        timeout=10.0,
+        autoclose=True,
+        autoping=True,
+        loop=asyncio.get_running_loop(),
+    )
+    await asyncio.wait_for(wsresp.send_json({"foo": "bar"}), timeout=5.0)
+    received = await asyncio.wait_for(wsresp.receive_json(timeout=5.0), timeout=5.0)
+
+    assert m_writer.send_frame.call_args == call(
+        b'{"foo":"bar"}', aiohttp.WSMsgType.TEXT, compress=None
+    )
+    assert received == {"decoded": {"foo": "bar"}}
+    assert topgun.ws._ws_loads(wsresp) is wsresp.__dict__["_json_loads"]
+    assert topgun.ws._ws_loads(object()) is json.loads
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     (
@@ -1740,66 +2603,166 @@ async def test_auth_coincheck_ws(test_input, expected, caplog) -> None:
     ]
 
 
+@pytest.mark.asyncio
+async def test_tokenbucket(mocker: pytest_mock.MockerFixture):
+    m_monotonic = mocker.patch("time.monotonic", return_value=100.0)
+    m_sleep = mocker.patch("asyncio.sleep")
+
+    bucket = topgun.ws.TokenBucket(4.0, burst=2.0)
+
+    # burst
+    await bucket.acquire()
+    await bucket.acquire()
+    assert m_sleep.call_count == 0
+
+    # reservations queue up behind each other
+    await bucket.acquire()
+    await bucket.acquire()
+    assert m_sleep.call_args_list == [call(0.25), call(0.5)]
+
+    # refill is capped at burst
+    m_monotonic.return_value = 110.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.25
+
+
 @pytest.mark.asyncio
 async def test_ratelimit_gmocoin(mocker: pytest_mock.MockerFixture):
+    mocker.patch("time.monotonic", return_value=100.0)
     m_sleep = mocker.patch("asyncio.sleep")
+    mocker.patch.object(topgun.ws.RequestLimit.gmocoin, "_buckets", {})
 
-    m_resp = AsyncMock()
-    m_resp.json.side_effect = [
-        {
-            "status": 0,
-            "data": {"status": "OPEN"},
-            "responsetime": "2024-01-18T02:28:40.000Z",
-        },
-        {
-            "status": 0,
-            "data": {"status": "OPEN"},
-            "responsetime": "2024-01-18T02:28:40.800Z",
-        },
-        {
-            "status": 0,
-            "data": {"status": "OPEN"},
-            "responsetime": "2024-01-18T02:28:41.600Z",
-        },
-        AssertionError(),
-    ]
-    m_wsresp = AsyncMock()
-    m_wsresp._lock = AsyncMock()
-    m_wsresp._response._session.get.return_value = m_resp
-    m_send_str = AsyncMock().send_str()
+    m_wsresp1 = AsyncMock()
+    m_wsresp1._response.url = URL("wss://api.coin.z.com/ws/public/v1")
+    m_wsresp2 = AsyncMock()
+    m_wsresp2._response.url = URL("wss://api.coin.z.com/ws/public/v1")
 
-    await asyncio.wait_for(
-        topgun.ws.RequestLimit.gmocoin(m_wsresp, m_send_str), timeout=5.0
-    )
+    for ws in (m_wsresp1, m_wsresp2, m_wsresp1):
+        m_send_str = AsyncMock()
+        await asyncio.wait_for(
+            topgun.ws.RequestLimit.gmocoin(ws, m_send_str()), timeout=5.0
+        )
+        assert m_send_str.await_count == 1
 
-    assert m_wsresp._response._session.get.call_count == 3
-    assert m_resp.json.call_count == 3
-    assert m_sleep.call_count == 2
+    # shared by all connections to the host
+    assert m_sleep.call_args_list == [call(1.0), call(2.0)]
 
 
 @pytest.mark.asyncio
 async def test_ratelimit_binance(mocker: pytest_mock.MockerFixture):
+    mocker.patch("time.monotonic", return_value=100.0)
     m_sleep = mocker.patch("asyncio.sleep")
 
-    m_resp = AsyncMock()
-    m_resp.json.side_effect = [
-        {"serverTime": 1705545344000},
-        {"serverTime": 1705545344200},
-        {"serverTime": 1705545344400},
-        AssertionError(),
+    m_wsresp1 = AsyncMock()
+    m_wsresp2 = AsyncMock()
+
+    for ws in (m_wsresp1, m_wsresp1, m_wsresp2, m_wsresp1):
+        m_send_str = AsyncMock()
+        await asyncio.wait_for(
+            topgun.ws.RequestLimit.binance(ws, m_send_str()), timeout=5.0
+        )
+        assert m_send_str.await_count == 1
+
+    # one bucket per connection
+    assert m_sleep.call_args_list == [call(0.25), call(0.5)]
+
+
+@pytest.mark.parametrize(
+    ("test_input", "expected"),
+    [
+        (
+            {
+                "coalesce": topgun.ws.Coalesce.binance,
+                "messages": [
+                    {"method": "SUBSCRIBE", "params": ["a@trade"], "id": 1},
+                    {"method": "SUBSCRIBE", "params": ["b@trade", "c@trade"], "id": 2},
+                    {"method": "UNSUBSCRIBE", "params": ["a@trade"], "id": 3},
+                    {"method": "UNSUBSCRIBE", "params": ["b@trade"], "id": 4},
+                    {"method": "LIST_SUBSCRIPTIONS", "id": 5},
+                    {"method": "SUBSCRIBE", "params": ["d@trade"], "id": 6},
+                ],
+            },
+            [
+                {
+                    "method": "SUBSCRIBE",
+                    "params": ["a@trade", "b@trade", "c@trade"],
+                    "id": 1,
+                },
+                {"method": "UNSUBSCRIBE", "params": ["a@trade", "b@trade"], "id": 3},
+                {"method": "LIST_SUBSCRIPTIONS", "id": 5},
+                {"method": "SUBSCRIBE", "params": ["d@trade"], "id": 6},
+            ],
+        ),
+        (
+            {
+                "coalesce": topgun.ws.Coalesce.bybit,
+                "messages": [
+                    {
+                        "op": "subscribe",
+                        "args": [f"publicTrade.S{i}" for i in range(6)],
+                    },
+                    {"op": "subscribe", "args": ["orderbook.50.BTCUSDT"]},
+                    {"op": "subscribe", "args": [f"tickers.S{i}" for i in range(6)]},
+                    {"op": "subscribe", "args": ["kline.1.BTCUSDT"], "req_id": "x"},
+                ],
+            },
+            [
+                {
+                    "op": "subscribe",
+                    "args": [
+                        *[f"publicTrade.S{i}" for i in range(6)],
+                        "orderbook.50.BTCUSDT",
+                    ],
+                },
+                {"op": "subscribe", "args": [f"tickers.S{i}" for i in range(6)]},
+                {"op": "subscribe", "args": ["kline.1.BTCUSDT"], "req_id": "x"},
+            ],
+        ),
+        (
+            {
+                "coalesce": topgun.ws.Coalesce.okx,
+                "messages": [
+                    {"op": "login", "args": [{"apiKey": "key"}]},
+                    {"op": "subscribe", "args": [{"channel": "orders"}]},
+                    {"op": "subscribe", "args": [{"channel": "positions"}]},
+                ],
+            },
+            [
+                {"op": "login", "args": [{"apiKey": "key"}]},
+                {
+                    "op": "subscribe",
+                    "args": [{"channel": "orders"}, {"channel": "positions"}],
+                },
+            ],
+        ),
+    ],
+)
+def test_coalesce(test_input, expected):
+    messages = copy.deepcopy(test_input["messages"])
+
+    assert test_input["coalesce"](messages) == expected
+    # messages are resent on reconnection
+    assert messages == test_input["messages"]
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_coalesce(mocker: pytest_mock.MockerFixture):
+    m_coalesce = Mock(return_value=[{"op": "subscribe", "args": ["a", "b"]}])
+    mocker.patch.object(topgun.ws.CoalesceHosts, "items", {"example.com": m_coalesce})
+    send_json = [
+        {"op": "subscribe", "args": ["a"]},
+        {"op": "subscribe", "args": ["b"]},
     ]
-    m_wsresp = AsyncMock()
-    m_wsresp._lock = AsyncMock()
-    m_wsresp._response._session.get.return_value = m_resp
-    m_send_str = AsyncMock().send_str()
 
-    await asyncio.wait_for(
-        topgun.ws.RequestLimit.binance(m_wsresp, m_send_str), timeout=5.0
-    )
+    subscriptions = topgun.ws.Subscriptions("example.com")
+    assert await subscriptions._onconnect(AsyncMock(), send_json) == [
+        {"op": "subscribe", "args": ["a", "b"]}
+    ]
+    assert m_coalesce.call_args == call(send_json)
 
-    assert m_wsresp._response._session.get.call_count == 3
-    assert m_resp.json.call_count == 3
-    assert m_sleep.call_count == 2
+    subscriptions = topgun.ws.Subscriptions("example.org")
+    assert await subscriptions._onconnect(AsyncMock(), send_json) is send_json
 
 
 @pytest.mark.parametrize(
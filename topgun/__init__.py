@@ -20,8 +20,17 @@ from .models.hyperliquid import HyperliquidDataStore
 from .models.kucoin import KuCoinDataStore
 from .models.okx import OKXDataStore
 from .models.phemex import PhemexDataStore
-from .store import DataStore, DataStoreCollection, StoreChange, StoreStream
-from .ws import ClientWebSocketResponse, WebSocketApp, WebSocketQueue
+from .store import (
+    BookStore,
+    DataStore,
+    DataStoreCollection,
+    FixedPoint,
+    RingStore,
+    StoreChange,
+    StoreChangeBatch,
+    StoreStream,
+)
+from .ws import ClientWebSocketResponse, WebSocketApp, WebSocketGroup, WebSocketQueue
 
 __all__: tuple[str, ...] = (
     # version
@@ -33,11 +42,16 @@ __all__: tuple[str, ...] = (
     # ws
     "ClientWebSocketResponse",
     "WebSocketApp",
+    "WebSocketGroup",
     "WebSocketQueue",
     # store
+    "BookStore",
     "DataStore",
     "DataStoreCollection",
+    "FixedPoint",
+    "RingStore",
     "StoreChange",
+    "StoreChangeBatch",
     "StoreStream",
     # models
     "BinanceCOINMDataStore",
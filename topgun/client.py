@@ -13,12 +13,14 @@ from aiohttp import hdrs
 
 from .__version__ import __version__
 from .auth import Auth, PassphraseRequiredExchanges
-from .request import ClientRequest
-from .ws import ClientWebSocketResponse, WebSocketApp
+from .request import ClientRequest, ClientResponse
+from .ws import ClientWebSocketResponse, WebSocketApp, WebSocketGroup
 
 if TYPE_CHECKING:
     from collections.abc import Mapping
 
+    from aiohttp.typedefs import JSONDecoder, JSONEncoder
+
     from .typedefs import (
         APICredentialsDict,
         EncodedAPICredentialsDict,
@@ -37,6 +39,9 @@ class Client:
         self,
         apis: APICredentialsDict | StrOrBytesPath | None = None,
         base_url: str = "",
+        *,
+        json_loads: JSONDecoder = json.loads,
+        json_dumps: JSONEncoder = json.dumps,
         **kwargs: Any,
     ) -> None:
         """HTTP / WebSocket API Client.
@@ -46,13 +51,19 @@ class Client:
         Args:
             apis: API 認証情報
             base_url: ベース URL
+            json_loads: JSON デコーダ (デフォルト :func:`json.loads`)
+            json_dumps: JSON エンコーダ (デフォルト :func:`json.dumps`)
             **kwargs: :class:`aiohttp.ClientSession` にバイパスされる引数
         """
         self._session = aiohttp.ClientSession(
             request_class=ClientRequest,
+            response_class=ClientResponse,
             ws_response_class=ClientWebSocketResponse,
+            json_serialize=json_dumps,
             **kwargs,
         )
+        self._session.__dict__["_json_loads"] = json_loads
+        self._session.__dict__["_json_dumps"] = json_dumps
         if hdrs.USER_AGENT not in self._session.headers:
             self._session.headers[hdrs.USER_AGENT] = f"topgun/{__version__}"
         loaded_apis = self._load_apis(apis)
@@ -148,7 +159,7 @@ class Client:
             text = await resp.text()
             try:
                 data = await resp.json(content_type=None)
-            except json.JSONDecodeError as e:
+            except ValueError as e:
                 data = NotJSONContent(error=e)
 
         return FetchResult(response=resp, text=text, data=data)
@@ -257,6 +268,10 @@ class Client:
         autoping: bool = True,
         heartbeat: float = 10.0,
         auth: type[Auth] | None = Auth,
+        inline: bool = False,
+        drain: bool = False,
+        json_loads: JSONDecoder | None = None,
+        json_dumps: JSONEncoder | None = None,
         **kwargs: Any,
     ) -> WebSocketApp:
         """WebSocket request.
@@ -273,6 +288,10 @@ class Client:
             autoping: Ping に対する自動 Pong 応答 (デフォルト True)
             heartbeat: WebSocket ハートビート (デフォルト 10.0 秒)
             auth: 認証オプション (デフォルトで有効、None で無効)
+            inline: 受信タスク内でハンドラを直接呼び出す (デフォルト False)
+            drain: 受信済みのフレームをまとめて処理する (デフォルト False、有効にすると inline も有効)
+            json_loads: このコネクションの JSON デコーダ (デフォルトは Client の設定)
+            json_dumps: このコネクションの JSON エンコーダ (デフォルトは Client の設定)
             **kwargs: :meth:`aiohttp.ClientSession.ws_connect` にバイパスされる引数
 
         Returns:
@@ -290,12 +309,48 @@ class Client:
             hdlr_bytes=hdlr_bytes,
             hdlr_json=hdlr_json,
             backoff=backoff,
+            inline=inline,
+            drain=drain,
+            json_loads=json_loads,
+            json_dumps=json_dumps,
             autoping=autoping,
             heartbeat=heartbeat,
             auth=auth,
             **kwargs,
         )
 
+    def ws_connect_group(
+        self,
+        url: str,
+        channels: list[Any],
+        *,
+        shards: int,
+        weights: list[float] | None = None,
+        **kwargs: Any,
+    ) -> WebSocketGroup:
+        """Sharded WebSocket request.
+
+        Args:
+            url: リクエスト WebSocket URL
+            channels: 購読するチャンネル (取引所の購読メッセージの形式)
+            shards: WebSocket コネクションの数
+            weights: チャンネルごとの重み (デフォルトはハッシュで分散)
+            **kwargs: 各シャードの :meth:`ws_connect` に渡される引数
+
+        Returns:
+            WebSocketGroup
+
+        Usage example: :ref:`websocket-sharding`
+        """
+        return WebSocketGroup(
+            self.ws_connect,
+            url,
+            channels,
+            shards=shards,
+            weights=weights,
+            **kwargs,
+        )
+
     @staticmethod
     def _load_apis(
         apis: APICredentialsDict | StrOrBytesPath | None,
@@ -361,10 +416,10 @@ class NotJSONContent:
     """Result of JSON decoding failure.
 
     Attributes:
-        error: `JSONDecodeError`
+        error: `JSONDecodeError` (JSON デコーダが送出した :class:`ValueError`)
     """
 
-    error: json.JSONDecodeError
+    error: ValueError
 
     def __bool__(self) -> Literal[False]:
         return False
@@ -8,11 +8,12 @@ from typing import TYPE_CHECKING, Any, Awaitable
 import aiohttp
 
 from ..auth import Auth
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection, RingStore
 
 if TYPE_CHECKING:
     from yarl import URL
 
+    from ..client import Client
     from ..typedefs import Item
     from ..ws import ClientWebSocketResponse
 
@@ -22,10 +23,12 @@ logger = logging.getLogger(__name__)
 class BinanceDataStoreBase(DataStoreCollection):
     """Binance の DataStoreCollection ベースクラス"""
 
+    _BASE_URL: str
     _ORDERBOOK_INIT_ENDPOINT: str
     _ORDER_INIT_ENDPOINT: str
     _LISTENKEY_INIT_ENDPOINT: str
     _KLINE_INIT_ENDPOINT: str | tuple[str, ...]
+    _RESNAPSHOT_INTERVAL = 1.0
 
     def _init(self) -> None:
         self._create("trade", datastore_class=Trade)
@@ -35,6 +38,10 @@ class BinanceDataStoreBase(DataStoreCollection):
         self._create("orderbook", datastore_class=OrderBook)
         self._create("order", datastore_class=Order)
         self.listenkey: str | None = None
+        self._resnapshot_client: Client | None = None
+        self._resnapshot_url = ""
+        self._resnapshot_limit = 1000
+        self._resnapshots: set[str] = set()
 
     async def initialize(self, *aws: Awaitable[aiohttp.ClientResponse]) -> None:
         """Initialize DataStore from HTTP response data.
@@ -47,6 +54,7 @@ class BinanceDataStoreBase(DataStoreCollection):
 
             - Binance APIドキュメントに従ってWebSocket接続後にinitializeすること。
             - orderbook データストアの initialized がTrueになる。
+            - シーケンスの欠落を検知すると initialized がFalseに戻り stale に追加される。 :meth:`enable_resnapshot` で自動的に再取得できる。
 
         - GET /api/v3/openOrders, /fapi/v1/openOrders, /dapi/v1/openOrders (:attr:`.BinanceDataStoreBase.order`)
         - POST /api/v3/userDataStream, /fapi/v1/listenKey, /dapi/v1/listenKey (:attr:`.BinanceDataStoreBase.listenkey`)
@@ -83,6 +91,50 @@ class BinanceDataStoreBase(DataStoreCollection):
 
             self._initialize_hook(resp, data, endpoint)
 
+    def enable_resnapshot(
+        self,
+        client: Client | None,
+        *,
+        base_url: str | None = None,
+        limit: int = 1000,
+    ) -> None:
+        """板のシーケンス欠落を検知したときに REST スナップショットを自動で再取得する。
+
+        欠落したシンボル (:attr:`.OrderBook.stale`) について ``client`` で
+        /api/v3/depth, /fapi/v1/depth, /dapi/v1/depth を取得し、バッファしたイベントを再適用する。
+        取得に失敗した場合は同期するまで一定間隔で再試行する。 ``None`` を渡すと無効になる。
+
+        Args:
+            client: スナップショットの取得に使う :class:`.Client`
+            base_url: REST API のベース URL (デフォルトは本番環境、テストネットなどで変更する)
+            limit: 取得する板の深さ
+        """
+        self._resnapshot_client = client
+        self._resnapshot_url = (
+            base_url or self._BASE_URL
+        ) + self._ORDERBOOK_INIT_ENDPOINT
+        self._resnapshot_limit = limit
+
+    async def _resnapshot(self, symbol: str) -> None:
+        try:
+            while self._resnapshot_client and symbol in self.orderbook.stale:
+                try:
+                    await self.initialize(
+                        self._resnapshot_client.get(
+                            self._resnapshot_url,
+                            params={
+                                "symbol": symbol,
+                                "limit": str(self._resnapshot_limit),
+                            },
+                        )
+                    )
+                except Exception:
+                    logger.exception(f"failed to resnapshot orderbook: {symbol}")
+                if symbol in self.orderbook.stale:
+                    await asyncio.sleep(self._RESNAPSHOT_INTERVAL)
+        finally:
+            self._resnapshots.discard(symbol)
+
     def _initialize_hook(self, resp: aiohttp.ClientResponse, data: Any, endpoint: str):
         """子クラス用initialize hook"""
         ...
@@ -132,6 +184,13 @@ class BinanceDataStoreBase(DataStoreCollection):
                 self.bookticker._onmessage(data)
             elif self._is_orderbook_msg(msg, event):
                 self.orderbook._onmessage(data)
+                if (
+                    self._resnapshot_client
+                    and data["s"] in self.orderbook.stale
+                    and data["s"] not in self._resnapshots
+                ):
+                    self._resnapshots.add(data["s"])
+                    self._create_task(self._resnapshot(data["s"]))
             elif self._is_order_msg(msg, event):
                 self.order._onmessage(data)
 
@@ -377,6 +436,7 @@ class BinanceFuturesDataStoreBase(BinanceDataStoreBase):
 class BinanceSpotDataStore(BinanceDataStoreBase):
     """Binance Spot の DataStoreCollection クラス"""
 
+    _BASE_URL = "https://api.binance.com"
     _ORDERBOOK_INIT_ENDPOINT = "/api/v3/depth"
     _ORDER_INIT_ENDPOINT = "/api/v3/openOrders"
     _LISTENKEY_INIT_ENDPOINT = "/api/v3/userDataStream"
@@ -432,6 +492,7 @@ class BinanceSpotDataStore(BinanceDataStoreBase):
 class BinanceUSDSMDataStore(BinanceFuturesDataStoreBase):
     """Binance USDⓈ-M の DataStoreCollection クラス"""
 
+    _BASE_URL = "https://fapi.binance.com"
     _ORDERBOOK_INIT_ENDPOINT = "/fapi/v1/depth"
     _BALANCE_INIT_ENDPOINT = "/fapi/v2/balance"
     _ORDER_INIT_ENDPOINT = "/fapi/v1/openOrders"
@@ -469,6 +530,7 @@ class BinanceUSDSMDataStore(BinanceFuturesDataStoreBase):
 class BinanceCOINMDataStore(BinanceFuturesDataStoreBase):
     """Binance COIN-M の DataStoreCollection クラス"""
 
+    _BASE_URL = "https://dapi.binance.com"
     _ORDERBOOK_INIT_ENDPOINT = "/dapi/v1/depth"
     _BALANCE_INIT_ENDPOINT = "/dapi/v1/balance"
     _ORDER_INIT_ENDPOINT = "/dapi/v1/openOrders"
@@ -546,8 +608,9 @@ class BinanceCOINMDataStore(BinanceFuturesDataStoreBase):
         return self._get("markpricekline", Kline)
 
 
-class Trade(DataStore):
+class Trade(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "T"
 
     def _onmessage(self, item: Item) -> None:
         self._insert([item])
@@ -660,49 +723,80 @@ class Liquidation(DataStore):
         self._insert([item["o"]])
 
 
-class OrderBook(DataStore):
+class OrderBook(BookStore):
+    """depthUpdate の差分を REST スナップショットに積み上げる板情報。
+
+    シンボルごとに最後に適用した最終更新 ID (``u``) を保持し、次のイベントが連続しているか
+    (現物は ``U == u + 1`` 、先物は ``pu == u`` ) を検査する。
+    欠落を検知したシンボルは :attr:`initialized` が ``False`` になり :attr:`stale` に追加され、
+    次の :meth:`_onresponse` までイベントをバッファする (差分の適用は継続する) 。
+    """
+
     _KEYS = ["s", "S", "p"]
+    _INDEXES = [("s",)]
+    _SIDE_KEY = "S"
+    _PRICE_KEY = "p"
+    _ASKS = "a"
+    _BIDS = "b"
 
     def _init(self) -> None:
         self.initialized: defaultdict[str, bool] = defaultdict(lambda: False)
+        self.stale: set[str] = set()
+        self._last_update_id: dict[str, int] = {}
         self._buff: defaultdict[str, deque[Item]] = defaultdict(
             lambda: deque(maxlen=8000)
         )
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="S",
-            item_asc_key="a",
-            item_desc_key="b",
-            sort_key="p",
-            query=query,
-            limit=limit,
-        )
-
     def _onmessage(self, item: Item) -> None:
-        if not self.initialized[item["s"]]:
-            self._buff[item["s"]].append(item)
-        for side in ("a", "b"):
-            for row in item[side]:
-                if float(row[1]) != 0.0:
-                    self._update(
-                        [{"s": item["s"], "S": side, "p": row[0], "q": row[1]}]
-                    )
-                else:
-                    self._delete([{"s": item["s"], "S": side, "p": row[0]}])
+        symbol = item["s"]
+        if self.initialized[symbol]:
+            last = self._last_update_id[symbol]
+            if item["u"] <= last:
+                return
+            if item["U"] > last + 1 and item.get("pu") != last:
+                logger.warning(
+                    f"orderbook gap detected: {symbol} "
+                    f"(last update id {last}, next U={item['U']})"
+                )
+                self.initialized[symbol] = False
+                self.stale.add(symbol)
+            else:
+                self._last_update_id[symbol] = item["u"]
+        if not self.initialized[symbol]:
+            self._buff[symbol].append(item)
+        self._apply(item)
+
+    def _apply(self, item: Item) -> None:
+        rows = [
+            {"s": item["s"], "S": side, "p": row[0], "q": row[1]}
+            for side in ("a", "b")
+            for row in item[side]
+        ]
+        if self._SCHEMA:
+            rows = self._normalize(rows)
+        update: list[Item] = []
+        delete: list[Item] = []
+        for row in rows:
+            (delete if self._is_zero(row["q"]) else update).append(row)
+        with self._batch():
+            self._update(update)
+            self._delete(delete)
 
     def _onresponse(self, symbol: str, item: Item) -> None:
-        self._delete(self._find_and_delete({"s": symbol}))
-        for side_ws, side_http in (("a", "asks"), ("b", "bids")):
-            for row in item[side_http]:
-                self._insert([{"s": symbol, "S": side_ws, "p": row[0], "q": row[1]}])
-        for msg in self._buff[symbol]:
-            if msg["U"] <= item["lastUpdateId"] and msg["u"] >= item["lastUpdateId"]:
-                self._onmessage(msg)
+        rows = [
+            {"s": symbol, "S": side_ws, "p": row[0], "q": row[1]}
+            for side_ws, side_http in (("a", "asks"), ("b", "bids"))
+            for row in item[side_http]
+        ]
+        buff = list(self._buff[symbol])
         self._buff[symbol].clear()
-        self.initialized[symbol] = True
+        with self._batch():
+            self._snapshot({"s": symbol}, rows)
+            self._last_update_id[symbol] = item["lastUpdateId"]
+            self.initialized[symbol] = True
+            self.stale.discard(symbol)
+            for msg in buff:
+                self._onmessage(msg)
 
 
 class Account(DataStore):
@@ -768,6 +862,7 @@ class Position(DataStore):
 
 class Order(DataStore):
     _KEYS = ["s", "i"]
+    _INDEXES = [("s",)]
 
     def _onmessage(self, item: Item) -> None:
         if item["e"] == "ORDER_TRADE_UPDATE":
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
+import operator
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, cast
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, Any, cast
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection, RingStore
+from ..ws import _ws_loads
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable
+    from collections.abc import Awaitable, Callable
 
     import aiohttp
 
@@ -27,17 +29,21 @@ class bitbankDataStore(DataStoreCollection):
         self._create("depth", datastore_class=Depth)
         self._create("ticker", datastore_class=Ticker)
 
+        # transactions_{pair}, depth_whole_{pair}, depth_diff_{pair}, ticker_{pair}
+        routes: list[tuple[str, Callable[..., Any]]] = [
+            ("transactions_", self.transactions._onmessage),
+            ("depth_", self.depth._onmessage),
+            ("ticker_", self.ticker._onmessage),
+        ]
+        for channel, handler in routes:
+            self._route(channel, handler, prefix=True)
+
     def _onmessage(self, msg: str, ws: ClientWebSocketResponse | None = None) -> None:
         if msg.startswith("42"):
-            data_json = json.loads(msg[2:])
+            data_json = _ws_loads(ws)(msg[2:])
             room_name = data_json[1]["room_name"]
             data = data_json[1]["message"]["data"]
-            if "transactions" in room_name:
-                self.transactions._onmessage(room_name, data)
-            elif "depth" in room_name:
-                self.depth._onmessage(room_name, data)
-            elif "ticker" in room_name:
-                self.ticker._onmessage(room_name, data)
+            self._dispatch(room_name, room_name, data)
 
     @property
     def transactions(self) -> "Transactions":
@@ -65,8 +71,9 @@ class bitbankDataStore(DataStoreCollection):
         return self._get("ticker", Ticker)
 
 
-class Transactions(DataStore):
+class Transactions(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "executed_at"
 
     def _onmessage(self, room_name: str, data: dict[str, list[Item]]) -> None:
         for item in data["transactions"]:
@@ -74,51 +81,87 @@ class Transactions(DataStore):
             self._insert([{"pair": pair, **item}])
 
 
-class Depth(DataStore):
+class Depth(BookStore):
+    """depth_whole / depth_diff の板情報。
+
+    depth_diff はシーケンス ID (``s``) とともにペアごとのバッファに保持し、
+    depth_whole を受信すると板を置き換えたうえで、その ``sequenceId`` より新しい差分を
+    シーケンス順に再適用する。 それ以前の差分は破棄する。 最初の depth_whole を受信するまでは
+    差分を適用せずにバッファする。 適用済みのシーケンス ID 以下の差分は破棄する。
+    :attr:`_DEPTH` を設定すると各サイドで最良気配から遠いレベルを削除して件数を制限する。
+    """
+
     _KEYS = ["pair", "side", "price"]
+    _INDEXES = [("pair",)]
+    _DEPTH: int | None = None
 
     def _init(self) -> None:
         self.timestamp: int | None = None
-
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="price",
-            query=query,
-            limit=limit,
+        self.sequence_id: dict[str, int] = {}
+        self._buff: defaultdict[str, deque[tuple[int, dict[str, object]]]] = (
+            defaultdict(lambda: deque(maxlen=8000))
         )
 
     def _onmessage(self, room_name: str, data: dict[str, object]) -> None:
         if "whole" in room_name:
             pair = room_name.replace("depth_whole_", "")
-            result = self.find({"pair": pair})
-            self._delete(result)
-            tuples = (("bids", "bids"), ("asks", "asks"))
-            self.timestamp = cast("int", data["timestamp"])
+            self._onwhole(pair, data)
         else:
             pair = room_name.replace("depth_diff_", "")
-            tuples = (("b", "bids"), ("a", "asks"))
-            self.timestamp = cast("int", data["t"])
-
-        for side_item, side in tuples:
+            self._ondiff(pair, data)
+
+    def _onwhole(self, pair: str, data: dict[str, object]) -> None:
+        self.timestamp = cast("int", data["timestamp"])
+        sequence_id = int(cast("str", data["sequenceId"]))
+        buff = self._buff[pair]
+        diffs = sorted(
+            (item for item in buff if item[0] > sequence_id),
+            key=operator.itemgetter(0),
+        )
+        buff.clear()
+        buff.extend(diffs)
+
+        with self._batch():
+            self._snapshot(
+                {"pair": pair},
+                [
+                    {"pair": pair, "side": side, "price": item[0], "amount": item[1]}
+                    for side in ("bids", "asks")
+                    for item in cast("list[list[str]]", data[side])
+                    if item[1] != "0"
+                ],
+            )
+            self.sequence_id[pair] = sequence_id
+            for diff_sequence_id, diff in diffs:
+                self._apply(pair, diff)
+                self.sequence_id[pair] = diff_sequence_id
+            if self._DEPTH is not None:
+                self._trim({"pair": pair}, self._DEPTH)
+
+    def _ondiff(self, pair: str, data: dict[str, object]) -> None:
+        sequence_id = int(cast("str", data["s"]))
+        last = self.sequence_id.get(pair)
+        if last is not None and sequence_id <= last:
+            return
+        self._buff[pair].append((sequence_id, data))
+        if last is None:
+            return
+
+        self.timestamp = cast("int", data["t"])
+        with self._batch():
+            self._apply(pair, data)
+            self.sequence_id[pair] = sequence_id
+            if self._DEPTH is not None:
+                self._trim({"pair": pair}, self._DEPTH)
+
+    def _apply(self, pair: str, data: dict[str, object]) -> None:
+        for side_item, side in (("b", "bids"), ("a", "asks")):
             for item in cast("list[list[str]]", data[side_item]):
+                row = {"pair": pair, "side": side, "price": item[0]}
                 if item[1] != "0":
-                    self._update(
-                        [
-                            {
-                                "pair": pair,
-                                "side": side,
-                                "price": item[0],
-                                "amount": item[1],
-                            }
-                        ]
-                    )
+                    self._update([{**row, "amount": item[1]}])
                 else:
-                    self._delete([{"pair": pair, "side": side, "price": item[0]}])
+                    self._delete([row])
 
 
 class Ticker(DataStore):
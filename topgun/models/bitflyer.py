@@ -1,14 +1,22 @@
 from __future__ import annotations
 
 import asyncio
-import copy
+import itertools
 import logging
 import math
 import operator
+from datetime import datetime
 from decimal import Decimal
 from typing import TYPE_CHECKING, Awaitable
 
-from ..store import DataStore, DataStoreCollection
+from ..store import (
+    BookStore,
+    DataStore,
+    DataStoreCollection,
+    RingStore,
+    _freeze,
+    _thaw,
+)
 from ..ws import ClientWebSocketResponse
 
 if TYPE_CHECKING:
@@ -79,25 +87,27 @@ class bitFlyerDataStore(DataStoreCollection):
                         )
                     )
                     product_code = channel.replace("lightning_board_snapshot_", "")
-                    self.board._delete(self.board.find({"product_code": product_code}))
+                    self.board._onsnapshot(product_code, message)
                     self._snapshots.add(product_code)
                 else:
                     product_code = channel.replace("lightning_board_", "")
-                if product_code in self._snapshots:
-                    self.board._onmessage(product_code, message)
+                    if product_code in self._snapshots:
+                        self.board._onmessage(product_code, message)
             elif channel.startswith("lightning_ticker_"):
                 self.ticker._onmessage(message)
             elif channel.startswith("lightning_executions_"):
                 product_code = channel.replace("lightning_executions_", "")
                 self.executions._onmessage(product_code, message)
             elif channel == "child_order_events":
-                self.childorderevents._onmessage(copy.deepcopy(message))
-                self.childorders._onmessage(copy.deepcopy(message))
-                self.positions._onmessage(copy.deepcopy(message), self.collateral)
-                self.balance._onmessage(copy.deepcopy(message))
+                message = _freeze(message)
+                self.childorderevents._onmessage(message)
+                self.childorders._onmessage(message)
+                self.positions._onmessage(message, self.collateral)
+                self.balance._onmessage(message)
             elif channel == "parent_order_events":
-                self.parentorderevents._onmessage(copy.deepcopy(message))
-                self.parentorders._onmessage(copy.deepcopy(message))
+                message = _freeze(message)
+                self.parentorderevents._onmessage(message)
+                self.parentorders._onmessage(message)
 
     @property
     def board(self) -> "Board":
@@ -181,41 +191,73 @@ class bitFlyerDataStore(DataStoreCollection):
         return self._get("balance", Balance)
 
 
-class Board(DataStore):
+class Board(BookStore):
+    """板情報。
+
+    差分の適用後に ``mid_price`` をまたいだレベルを価格ラダーの先頭から削除する。
+    :attr:`_DEPTH` を設定すると各サイドで ``mid_price`` から遠いレベルを削除して件数を制限する。
+    最良気配は :meth:`.BookStore.best` で取得できる。
+    """
+
     _KEYS = ["product_code", "side", "price"]
+    _INDEXES = [("product_code",)]
+    _DEPTH: int | None = None
 
     def _init(self) -> None:
         self.mid_price: dict[str, float] = {}
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="price",
-            query=query,
-            limit=limit,
-        )
+    def _onsnapshot(self, product_code: str, message: Item) -> None:
+        self.mid_price[product_code] = message["mid_price"]
+        with self._batch():
+            self._snapshot(
+                {"product_code": product_code},
+                [
+                    {"product_code": product_code, "side": side, **item}
+                    for side in ("asks", "bids")
+                    for item in message[side]
+                    if item["size"]
+                ],
+            )
+            self._prune(product_code, message["mid_price"])
 
     def _onmessage(self, product_code: str, message: Item) -> None:
         self.mid_price[product_code] = message["mid_price"]
-        for side in ("asks", "bids"):
-            for item in message[side]:
-                if item["size"]:
-                    self._insert([{"product_code": product_code, "side": side, **item}])
-                else:
-                    self._delete([{"product_code": product_code, "side": side, **item}])
-        board = self.sorted({"product_code": product_code})
-        targets = []
-        for side, ope in (("bids", operator.le), ("asks", operator.gt)):
-            for item in board[side]:
-                if ope(item["price"], message["mid_price"]):
-                    break
-                else:
-                    targets.append(item)
+        with self._batch():
+            for side in ("asks", "bids"):
+                for item in message[side]:
+                    if item["size"]:
+                        self._insert(
+                            [{"product_code": product_code, "side": side, **item}]
+                        )
+                    else:
+                        self._delete(
+                            [{"product_code": product_code, "side": side, **item}]
+                        )
+            self._prune(product_code, message["mid_price"])
+
+    def _prune(self, product_code: str, mid_price: float) -> None:
+        sides = self._books.get((product_code,))
+        if not sides:
+            return
+
+        targets: list[Item] = []
+        if bids := sides.get("bids"):
+            targets.extend(
+                item
+                for _, item in itertools.takewhile(
+                    lambda level: -level[0] > mid_price, bids.iter_descending()
+                )
+            )
+        if asks := sides.get("asks"):
+            targets.extend(
+                item
+                for _, item in itertools.takewhile(
+                    lambda level: level[0] <= mid_price, asks.iter_ascending()
+                )
+            )
         self._delete(targets)
+        if self._DEPTH is not None:
+            self._trim({"product_code": product_code}, self._DEPTH)
 
 
 class Ticker(DataStore):
@@ -229,8 +271,12 @@ class Ticker(DataStore):
         self._update([message])
 
 
-class Executions(DataStore):
+class Executions(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "exec_date"
+
+    def _time(self, item: Item) -> float:
+        return datetime.fromisoformat(item["exec_date"]).timestamp()
 
     def _onmessage(self, product_code: str, message: list[Item]) -> None:
         for item in message:
@@ -239,16 +285,17 @@ class Executions(DataStore):
 
 class ChildOrderEvents(DataStore):
     def _onmessage(self, message: list[Item]) -> None:
-        self._insert(message)
+        self._insert([_thaw(item) for item in message])
 
 
 class ParentOrderEvents(DataStore):
     def _onmessage(self, message: list[Item]) -> None:
-        self._insert(message)
+        self._insert([_thaw(item) for item in message])
 
 
 class ChildOrders(DataStore):
     _KEYS = ["child_order_acceptance_id"]
+    _INDEXES = [("product_code",)]
 
     def _onresponse(self, data: list[Item]) -> None:
         if data:
@@ -260,7 +307,7 @@ class ChildOrders(DataStore):
     def _onmessage(self, message: list[Item]) -> None:
         for item in message:
             if item["event_type"] == "ORDER":
-                self._insert([item])
+                self._insert([_thaw(item)])
             elif item["event_type"] in ("CANCEL", "EXPIRE"):
                 self._delete([item])
             elif item["event_type"] == "EXECUTION":
@@ -292,6 +339,7 @@ class ChildOrders(DataStore):
 
 class ParentOrders(DataStore):
     _KEYS = ["parent_order_acceptance_id"]
+    _INDEXES = [("product_code",)]
 
     def _onresponse(self, data: list[Item]) -> None:
         if data:
@@ -303,7 +351,7 @@ class ParentOrders(DataStore):
     def _onmessage(self, message: list[Item]) -> None:
         for item in message:
             if item["event_type"] == "ORDER":
-                self._insert([item])
+                self._insert([_thaw(item)])
             elif item["event_type"] in ("CANCEL", "EXPIRE"):
                 self._delete([item])
             elif item["event_type"] == "COMPLETE":
@@ -317,6 +365,7 @@ class ParentOrders(DataStore):
 
 
 class Positions(DataStore):
+    _INDEXES = [("product_code",)]
     _COMMON_KEYS = [
         "product_code",
         "side",
@@ -376,6 +425,7 @@ class Positions(DataStore):
                                     source=item,
                                     item=pos,
                                 )  # !NOTE! This is manual call to `_put` method.
+                                self._set()
                                 break
                             else:
                                 collateral._onexecution(
@@ -399,7 +449,7 @@ class Positions(DataStore):
                             self._insert([item])
                 else:
                     try:
-                        self._insert([item])
+                        self._insert([_thaw(item)])
                     except KeyError:
                         pass
 
@@ -414,6 +464,7 @@ class Collateral(DataStore):
             self._put(
                 operation="update", source=data, item=data
             )  # !NOTE! This is manual call to `_put` method.
+            self._set()
 
     def _onexecution(
         self,
@@ -443,6 +494,7 @@ class Collateral(DataStore):
         )
 
         self._put(operation="update", source=source_item, item=item)
+        self._set()
 
 
 class Balance(DataStore):
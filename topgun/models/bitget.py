@@ -4,7 +4,7 @@ import asyncio
 import logging
 from typing import TYPE_CHECKING, Awaitable
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection
 
 if TYPE_CHECKING:
     import aiohttp
@@ -153,24 +153,13 @@ class Trade(DataStore):
         )
 
 
-class OrderBook(DataStore):
+class OrderBook(BookStore):
     _KEYS = ["instId", "side", "px"]
+    _PRICE_KEY = "px"
 
     def _init(self) -> None:
         self.timestamp: int | None = None
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="px",
-            query=query,
-            limit=limit,
-        )
-
     def _onmessage(self, message: Item) -> None:
         instId = message["arg"]["instId"]
         books = message["data"]
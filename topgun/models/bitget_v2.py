@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import logging
+from collections import defaultdict
 from typing import TYPE_CHECKING
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection
+from ..ws import ClientWebSocketResponse
 
 if TYPE_CHECKING:
     from ..typedefs import Item
-    from ..ws import ClientWebSocketResponse
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,10 @@ class BitgetV2DataStore(DataStoreCollection):
                 self.candle._onmessage(msg)
             elif channel.startswith("books"):
                 self.book._onmessage(msg)
+                if self.book._resubscribe:
+                    args, self.book._resubscribe = self.book._resubscribe, []
+                    if isinstance(ws, ClientWebSocketResponse):
+                        self._create_task(ws._resubscribe(args))
             elif channel == "trade":
                 self.trade._onmessage(msg)
             elif channel == "account":
@@ -251,8 +256,21 @@ class Candle(DataStore):
             self._update(data)
 
 
-class Book(DataStore):
+class Book(BookStore):
+    """books チャンネルの板情報。
+
+    ``checksum`` を含むメッセージは適用後の板の上位 25 件から CRC32 を計算して検証する。
+    不一致の板は ``(instType, instId)`` を :attr:`invalid` に追加し、
+    :attr:`mismatches` で回数を確認できる。 次のスナップショットで :attr:`invalid` から外れる。
+    """
+
     _KEYS = ["instType", "instId", "side", "price"]
+    _INDEXES = [("instType", "instId")]
+
+    def _init(self) -> None:
+        self.invalid: set[tuple[str, str]] = set()
+        self.mismatches: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self._resubscribe: list[Item] = []
 
     def _onmessage(self, msg: Item) -> None:
         action = msg["action"]
@@ -282,22 +300,26 @@ class Book(DataStore):
         # Cleanup on reconnect
         if action == "snapshot":
             self._find_and_delete({"instType": inst_type, "instId": inst_id})
+            self.invalid.discard((inst_type, inst_id))
 
         self._insert(data_to_insert)
         self._update(data_to_update)
         self._delete(data_to_delete)
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="price",
-            query=query,
-            limit=limit,
-        )
+        # books1/books5/books15 carry no meaningful checksum
+        checksum = msg["data"][-1].get("checksum") if msg["data"] else None
+        book_id = (inst_type, inst_id)
+        if (
+            msg["arg"]["channel"] == "books"
+            and checksum is not None
+            and book_id not in self.invalid
+        ):
+            query = {"instType": inst_type, "instId": inst_id}
+            if self._crc32(query, "amount") != checksum:
+                logger.warning(f"book checksum mismatch: {msg['arg']}")
+                self.invalid.add(book_id)
+                self.mismatches[book_id] += 1
+                self._resubscribe.append(msg["arg"])
 
 
 class Trade(DataStore):
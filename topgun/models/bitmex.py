@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 from typing import TYPE_CHECKING
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection
 
 if TYPE_CHECKING:
     from ..typedefs import Item
@@ -57,8 +57,13 @@ class BitMEXDataStore(DataStoreCollection):
                         else OrderBook,
                     )
                 else:
-                    target_store._keys = tuple(msg["keys"] if "keys" in msg else [])
-                    target_store._insert(data)
+                    if not isinstance(target_store, OrderBook):
+                        target_store._keys = tuple(msg["keys"] if "keys" in msg else [])
+                    if isinstance(target_store, OrderBook) and "filter" in msg:
+                        # A book partial is the full image of the book for the filter
+                        target_store._snapshot(msg["filter"], data)
+                    else:
+                        target_store._insert(data)
                 if table == "trade":
                     self.trade._MAXLEN = 99999
             elif action == "insert":
@@ -184,15 +189,17 @@ class BitMEXDataStore(DataStoreCollection):
         return self._get("wallet", DataStore)
 
 
-class OrderBook(DataStore):
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="Sell",
-            item_desc_key="Buy",
-            sort_key="price",
-            query=query,
-            limit=limit,
-        )
+class OrderBook(BookStore):
+    """BitMEX の板情報 DataStore 。
+
+    ``orderBookL2`` のレベルは価格ではなく ``id`` で識別されるので、行は ``id`` をキーに格納し、
+    ``id`` から行に残した価格で価格ラダーに並べる。 ``update`` と ``delete`` に価格が
+    含まれなくても格納済みの行の価格で板を更新する。 キーは partial の ``keys`` によらず固定。
+    """
+
+    _KEYS = ["symbol", "id", "side"]
+    _SIDE_KEY = "side"
+    _PRICE_KEY = "price"
+    _LEVEL_KEY = "id"
+    _ASKS = "Sell"
+    _BIDS = "Buy"
@@ -2,16 +2,17 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from collections import defaultdict
 from typing import TYPE_CHECKING, Awaitable
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection, RingStore
+from ..ws import ClientWebSocketResponse
 
 if TYPE_CHECKING:
     import aiohttp
     from yarl import URL
 
     from ..typedefs import Item
-    from ..ws import ClientWebSocketResponse
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +79,11 @@ class BybitDataStore(DataStoreCollection):
             if target_onmessage := getattr(self[topic], "_onmessage", None):
                 target_onmessage(msg, topic_ext)
 
+            if self.orderbook._resubscribe:
+                args, self.orderbook._resubscribe = self.orderbook._resubscribe, []
+                if isinstance(ws, ClientWebSocketResponse):
+                    self._create_task(ws._resubscribe(args))
+
     @property
     def orderbook(self) -> "OrderBook":
         """orderbook topic.
@@ -193,50 +199,103 @@ class BybitDataStore(DataStoreCollection):
         return self._get("greeks", Greek)
 
 
-class OrderBook(DataStore):
+class OrderBook(BookStore):
+    """orderbook トピックの板情報。
+
+    シンボルごとに最後に適用した更新 ID ``u`` とクロスシーケンス ``seq`` を
+    :attr:`update_id` と :attr:`seq` に保持する。 ``u`` または ``seq`` が適用済みの値より古い差分は
+    破棄し、 ``u`` が連続しない差分は適用したうえでシンボルを :attr:`stale` に追加して
+    :attr:`gaps` を数える。 スナップショットと ``u == 1`` (サービス再起動) の差分は板を置き換える。
+    板は購読した深さ (1/50/200/500) を超えたレベルを最良気配から遠い順に削除する。
+
+    深さごとに ``u`` の系列は独立しているので、シンボルの板は最初にスナップショットを受信した
+    深さ (:attr:`depth`) のトピックだけから作る。 同じシンボルのほかの深さのメッセージは
+    警告して無視する。
+    """
+
     _KEYS = ["s", "S", "p"]
+    _INDEXES = [("s",)]
+    _SIDE_KEY = "S"
+    _PRICE_KEY = "p"
+    _ASKS = "a"
+    _BIDS = "b"
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="S",
-            item_asc_key="a",
-            item_desc_key="b",
-            sort_key="p",
-            query=query,
-            limit=limit,
-        )
+    def _init(self) -> None:
+        self.update_id: dict[str, int] = {}
+        self.seq: dict[str, int] = {}
+        self.depth: dict[str, int] = {}
+        self._ignored: set[str] = set()
+        self.stale: set[str] = set()
+        self.gaps: defaultdict[str, int] = defaultdict(int)
+        self._resubscribe: list[str] = []
 
     def _onmessage(self, msg: Item, topic_ext: list[str]) -> None:
-        operation: dict[str, list[Item]] = {"delete": [], "update": [], "insert": []}
-
-        is_snapshot = msg["type"] == "snapshot"
-        if is_snapshot:
-            operation["delete"].extend(self.find({"s": msg["data"]["s"]}))
-
-        for side in ("a", "b"):
-            for item in msg["data"][side]:
-                dsitem = {
-                    "s": msg["data"]["s"],
-                    "S": side,
-                    "p": item[0],
-                    "v": item[1],
-                }
-                if is_snapshot:
-                    operation["insert"].append(dsitem)
-                elif dsitem["v"] == "0":
-                    operation["delete"].append(dsitem)
-                else:
-                    operation["update"].append(dsitem)
-
-        self._delete(operation["delete"])
-        self._update(operation["update"])
-        self._insert(operation["insert"])
-
-
-class Trade(DataStore):
+        data = msg["data"]
+        symbol = data["s"]
+        update_id = data["u"]
+        depth = int(topic_ext[0])
+
+        if msg["type"] == "snapshot":
+            self.depth.setdefault(symbol, depth)
+        if self.depth.get(symbol, depth) != depth:
+            if msg["topic"] not in self._ignored:
+                self._ignored.add(msg["topic"])
+                logger.warning(
+                    f"orderbook {msg['topic']} ignored: "
+                    f"{symbol} is kept at depth {self.depth[symbol]}"
+                )
+            return
+
+        with self._batch():
+            if msg["type"] == "snapshot" or update_id == 1:
+                self._snapshot(
+                    {"s": symbol},
+                    [
+                        {"s": symbol, "S": side, "p": item[0], "v": item[1]}
+                        for side in ("a", "b")
+                        for item in data[side]
+                    ],
+                )
+                self.stale.discard(symbol)
+            else:
+                last = self.update_id.get(symbol)
+                if (
+                    last is None
+                    or update_id <= last
+                    or data.get("seq", 0) < self.seq.get(symbol, 0)
+                ):
+                    # before the first snapshot, or a duplicate / out-of-order delta
+                    return
+                if update_id != last + 1 and symbol not in self.stale:
+                    logger.warning(
+                        f"orderbook gap detected: {msg['topic']} "
+                        f"(last update id {last}, next u={update_id})"
+                    )
+                    self.stale.add(symbol)
+                    self.gaps[symbol] += 1
+                    self._resubscribe.append(msg["topic"])
+                delete: list[Item] = []
+                update: list[Item] = []
+                for side in ("a", "b"):
+                    for item in data[side]:
+                        if item[1] == "0":
+                            delete.append({"s": symbol, "S": side, "p": item[0]})
+                        else:
+                            update.append(
+                                {"s": symbol, "S": side, "p": item[0], "v": item[1]}
+                            )
+                self._delete(delete)
+                self._update(update)
+
+            self.update_id[symbol] = update_id
+            if "seq" in data:
+                self.seq[symbol] = data["seq"]
+            self._trim({"s": symbol}, depth)
+
+
+class Trade(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "T"
 
     def _onmessage(self, msg: Item, topic_ext: list[str]) -> None:
         self._insert(msg["data"])
@@ -257,8 +316,9 @@ class Kline(DataStore):
         self._update(msg["data"])
 
 
-class AllLiquidation(DataStore):
+class AllLiquidation(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "T"
 
     def _onmessage(self, msg: Item, topic_ext: list[str]) -> None:
         self._insert(msg["data"])
@@ -290,8 +350,9 @@ class Position(DataStore):
         self._update(msg["data"])
 
 
-class Execution(DataStore):
+class Execution(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "execTime"
 
     def _onmessage(self, msg: Item, topic_ext: list[str]) -> None:
         self._insert(msg["data"])
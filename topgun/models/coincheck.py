@@ -3,12 +3,11 @@ from __future__ import annotations
 import asyncio
 from typing import TYPE_CHECKING, Any, Awaitable, cast
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStoreCollection, RingStore
 
 if TYPE_CHECKING:
     import aiohttp
 
-    from ..typedefs import Item
     from ..ws import ClientWebSocketResponse
 
 
@@ -57,8 +56,10 @@ class CoincheckDataStore(DataStoreCollection):
         return self._get("orderbook", Orderbook)
 
 
-class Trades(DataStore):
+class Trades(RingStore):
     _MAXLEN = 99999
+    _TIME_KEY = "timestamp"
+    _TIME_SCALE = 1.0
 
     def _onmessage(self, msg: list[list[str]]) -> None:
         for item in msg:
@@ -78,41 +79,40 @@ class Trades(DataStore):
             )
 
 
-class Orderbook(DataStore):
+class Orderbook(BookStore):
     _KEYS = ["pair", "side", "rate"]
+    _INDEXES = [("pair",)]
+    _PRICE_KEY = "rate"
 
     def _init(self) -> None:
         self.last_update_at: str | None = None
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="rate",
-            query=query,
-            limit=limit,
-        )
-
     def _onresponse(self, pair: str | None, data: dict[str, list[list[str]]]) -> None:
         if pair is None:
             pair = "btc_jpy"
-        self._find_and_delete({"pair": pair})
-        for side in data:
-            for rate, amount in data[side]:
-                self._insert(
-                    [{"pair": pair, "side": side, "rate": rate, "amount": amount}]
-                )
+        with self._batch():
+            self._find_and_delete({"pair": pair})
+            for side in data:
+                for rate, amount in data[side]:
+                    self._insert(
+                        [{"pair": pair, "side": side, "rate": rate, "amount": amount}]
+                    )
 
     def _onmessage(self, pair: str, data: dict[str, list[list[str]] | str]) -> None:
         self.last_update_at = cast("dict[str, str]", data).pop("last_update_at")
-        for side in cast("dict[str, list[list[str]]]", data):
-            for rate, amount in cast("list[list[str]]", data[side]):
-                if amount == "0":
-                    self._delete([{"pair": pair, "side": side, "rate": rate}])
-                else:
-                    self._update(
-                        [{"pair": pair, "side": side, "rate": rate, "amount": amount}]
-                    )
+        with self._batch():
+            for side in cast("dict[str, list[list[str]]]", data):
+                for rate, amount in cast("list[list[str]]", data[side]):
+                    if amount == "0":
+                        self._delete([{"pair": pair, "side": side, "rate": rate}])
+                    else:
+                        self._update(
+                            [
+                                {
+                                    "pair": pair,
+                                    "side": side,
+                                    "rate": rate,
+                                    "amount": amount,
+                                }
+                            ]
+                        )
@@ -5,7 +5,7 @@ import logging
 import warnings
 from typing import TYPE_CHECKING, Awaitable
 
-from topgun.store import DataStore, DataStoreCollection
+from topgun.store import BookStore, DataStore, DataStoreCollection
 
 from ..auth import Auth
 
@@ -26,24 +26,13 @@ class TickerStore(DataStore):
         self._update([mes])
 
 
-class OrderBookStore(DataStore):
+class OrderBookStore(BookStore):
     _KEYS = ["symbol", "side", "price"]
+    _INDEXES = [("symbol",)]
 
     def _init(self) -> None:
         self.timestamp: str | None = None
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="price",
-            query=query,
-            limit=limit,
-        )
-
     def _onmessage(self, mes: Item) -> None:
         data = []
         for side in ("asks", "bids"):
@@ -55,8 +44,7 @@ class OrderBookStore(DataStore):
                     "size": row["size"],
                 }
                 data.append(store_row)
-        self._find_and_delete({"symbol": mes["symbol"]})
-        self._insert(data)
+        self._snapshot({"symbol": mes["symbol"]}, data)
         self.timestamp = mes["timestamp"]
 
 
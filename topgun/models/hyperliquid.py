@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from topgun.store import DataStore, DataStoreCollection
+from topgun.store import BookStore, DataStore, DataStoreCollection
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from topgun.typedefs import Item
     from topgun.ws import ClientWebSocketResponse
 
@@ -40,42 +42,36 @@ class HyperliquidDataStore(DataStoreCollection):
         self._create("bbo", datastore_class=Bbo)
         # TODO: Add other data streams
 
+        routes: list[tuple[str, Callable[..., Any]]] = [
+            ("allMids", self.all_mids._onmessage),
+            ("notification", self.notification._onmessage),
+            ("webData2", self.web_data2._onmessage),
+            ("candle", self.candle._onmessage),
+            ("l2Book", self.l2_book._onmessage),
+            ("trades", self.trades._onmessage),
+            ("orderUpdates", self.order_updates._onmessage),
+            ("userEvents", self.user_events._onmessage),
+            ("userFills", self.user_fills._onmessage),
+            ("userFundings", self.user_fundings._onmessage),
+            (
+                "userNonFundingLedgerUpdates",
+                self.user_non_funding_ledger_updates._onmessage,
+            ),
+            ("activeAssetCtx", self.active_asset_ctx._onmessage),
+            ("activeAssetData", self.active_asset_data._onmessage),
+            ("userTwapSliceFills", self.user_twap_slice_fills._onmessage),
+            ("userTwapHistory", self.user_twap_history._onmessage),
+            ("bbo", self.bbo._onmessage),
+            # The channel of userEvents is "user"
+            ("user", self.user_events._onmessage),
+        ]
+        for channel, handler in routes:
+            self._route(channel, handler)
+
     def _onmessage(self, msg: Item, ws: ClientWebSocketResponse | None = None) -> None:
-        channel = msg.get("channel")
-
-        if channel == "allMids":
-            self.all_mids._onmessage(msg)
-        elif channel == "notification":
-            self.notification._onmessage(msg)
-        elif channel == "webData2":
-            self.web_data2._onmessage(msg)
-        elif channel == "candle":
-            self.candle._onmessage(msg)
-        elif channel == "l2Book":
-            self.l2_book._onmessage(msg)
-        elif channel == "trades":
-            self.trades._onmessage(msg)
-        elif channel == "orderUpdates":
-            self.order_updates._onmessage(msg)
-        elif channel == "user":
-            self.user_events._onmessage(msg)
-        elif channel == "userFills":
-            self.user_fills._onmessage(msg)
-        elif channel == "userFundings":
-            self.user_fundings._onmessage(msg)
-        elif channel == "userNonFundingLedgerUpdates":
-            self.user_non_funding_ledger_updates._onmessage(msg)
-        elif channel == "activeAssetCtx":
-            self.active_asset_ctx._onmessage(msg)
-        elif channel == "activeAssetData":
-            self.active_asset_data._onmessage(msg)
-        elif channel == "userTwapSliceFills":
-            self.user_twap_slice_fills._onmessage(msg)
-        elif channel == "userTwapHistory":
-            self.user_twap_history._onmessage(msg)
-        elif channel == "bbo":
-            self.bbo._onmessage(msg)
-        elif channel == "error":
+        channel = msg.get("channel", "")
+
+        if not self._dispatch(channel, msg) and channel == "error":
             logger.warning(msg)
 
     @property
@@ -629,8 +625,12 @@ class Candle(DataStore):
         self._insert([msg["data"]])
 
 
-class L2Book(DataStore):
+class L2Book(BookStore):
     _KEYS = ["coin", "side", "px"]
+    _INDEXES = [("coin",)]
+    _PRICE_KEY = "px"
+    _ASKS = "A"
+    _BIDS = "B"
 
     def _init(self) -> None:
         self._time: int | None = None
@@ -652,25 +652,10 @@ class L2Book(DataStore):
                 }
                 data_to_insert.append(item)
 
-        self._find_and_delete({"coin": coin})
-        self._insert(data_to_insert)
+        self._snapshot({"coin": coin}, data_to_insert)
 
         self._time = time
 
-    def sorted(
-        self,
-        query: Item | None = None,
-        limit: int | None = None,
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="A",
-            item_desc_key="B",
-            sort_key="px",
-            query=query,
-            limit=limit,
-        )
-
     @property
     def time(self) -> int | None:
         """Timestamp of the last update."""
@@ -1,18 +1,20 @@
 from __future__ import annotations
 
 import asyncio
-import copy
 import logging
 import time
 import uuid
+from collections import defaultdict, deque
 from typing import TYPE_CHECKING, Any, Awaitable
 
 import aiohttp
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection, _freeze, _thaw
 
 if TYPE_CHECKING:
-    from ..typedefs import Item
+    from collections.abc import Callable
+
+    from ..client import Client
     from ..ws import ClientWebSocketResponse
 
 logger = logging.getLogger(__name__)
@@ -25,10 +27,23 @@ def _symbol_from_msg(msg):
 class KuCoinDataStore(DataStoreCollection):
     """KuCoin の DataStoreCollection クラス"""
 
+    _LEVEL2_SNAPSHOT_PATHS = (
+        "/api/v1/market/orderbook/level2_20",
+        "/api/v1/market/orderbook/level2_100",
+        "/api/v3/market/orderbook/level2",
+        "/api/v1/level2/snapshot",
+    )
+    _LEVEL2_SNAPSHOT_URLS = {
+        False: "https://api.kucoin.com/api/v1/market/orderbook/level2_100",
+        True: "https://api-futures.kucoin.com/api/v1/level2/snapshot",
+    }
+    _RESNAPSHOT_INTERVAL = 1.0
+
     def _init(self) -> None:
         self._create("ticker", datastore_class=Ticker)
         self._create("kline", datastore_class=Kline)
         self._create("symbolsnapshot", datastore_class=SymbolSnapshot)
+        self._create("orderbook", datastore_class=Orderbook)
         self._create("orderbook5", datastore_class=TopKOrderBook)
         self._create("orderbook50", datastore_class=TopKOrderBook)
         self._create("execution", datastore_class=Execution)
@@ -48,6 +63,44 @@ class KuCoinDataStore(DataStoreCollection):
         self._create("balanceevents", datastore_class=BalanceEvents)
         self._create("positions", datastore_class=Positions)
         self._endpoint = None
+        self._resnapshot_client: Client | None = None
+        self._resnapshots: set[str] = set()
+
+        routes: list[tuple[str, Callable[..., Any]]] = [
+            ("/market/ticker", self.ticker._onmessage),
+            ("/contractMarket/tickerV2", self.ticker._onmessage),
+            ("/contractMarket/ticker", self.ticker._onmessage),
+            ("/market/candles", self.kline._onmessage),
+            ("/market/snapshot", self.symbolsnapshot._onmessage),
+            ("/spotMarket/level2Depth50", self.orderbook50._onmessage),
+            ("/contractMarket/level2Depth50", self.orderbook50._onmessage),
+            ("/spotMarket/level2Depth5", self.orderbook5._onmessage),
+            ("/contractMarket/level2Depth5", self.orderbook5._onmessage),
+            ("/market/match", self.execution._onmessage),
+            ("/contractMarket/execution", self.execution._onmessage),
+            ("/indicator/index", self.indexprice._onmessage),
+            ("/indicator/markPrice", self.markprice._onmessage),
+            ("/contract/instrument", self.instrument._onmessage),
+            ("/contract/announcement", self.announcements._onmessage),
+            ("/contractMarket/snapshot", self.transactionstats._onmessage),
+            ("/account/balance", self.balance._onmessage),
+            ("/margin/fundingBook", self.marginfundingbook._onmessage),
+            ("/contractAccount/wallet", self.balanceevents._onmessage),
+            ("/contract/position", self.positions._onmessage),
+        ]
+        for topic, handler in routes:
+            self._route(topic, handler, prefix=True)
+        for topic in (
+            "/spotMarket/tradeOrders",
+            "/spotMarket/advancedOrders",
+            "/contractMarket/tradeOrders",
+            "/contractMarket/advancedOrders",
+        ):
+            self._route(topic, self._onorders)
+        self._route("/margin/position", self._onmarginposition, prefix=True)
+        self._route("/margin/loan", self._onmarginloan, prefix=True)
+        for topic in ("/market/level2", "/spotMarket/level2", "/contractMarket/level2"):
+            self._route(topic, self._onlevel2, prefix=True)
 
     async def initialize(self, *aws: Awaitable[aiohttp.ClientResponse]) -> None:
         """Initialize DataStore from HTTP response data.
@@ -56,11 +109,17 @@ class KuCoinDataStore(DataStoreCollection):
 
         - GET /api/v1/market/candles (:attr:`.KuCoinDataStore.kline`)
         - GET /api/v1/positions (:attr:`.KuCoinDataStore.positions`)
+        - GET /api/v1/market/orderbook/level2_20, /api/v1/market/orderbook/level2_100,
+          /api/v3/market/orderbook/level2, /api/v1/level2/snapshot (:attr:`.KuCoinDataStore.orderbook`)
+
+            - WebSocket で level2 トピックを購読してから initialize すること。
         """
         for f in asyncio.as_completed(aws):
             resp = await f
             data = await resp.json()
-            if resp.url.path == "/api/v1/positions":
+            if resp.url.path in self._LEVEL2_SNAPSHOT_PATHS:
+                self.orderbook._onresponse(resp.url.query["symbol"], data["data"])
+            elif resp.url.path == "/api/v1/positions":
                 self.positions._onresponse(data["data"])
             elif resp.url.path == "/api/v1/market/candles":
                 self.kline._onresponse(
@@ -76,77 +135,60 @@ class KuCoinDataStore(DataStoreCollection):
     def _onmessage(self, msg: Any, ws: ClientWebSocketResponse | None = None) -> None:
         if "topic" in msg:
             topic = msg["topic"]
-            if (
-                topic.startswith("/market/ticker")
-                or topic.startswith("/contractMarket/tickerV2")
-                or topic.startswith("/contractMarket/ticker")
-            ):
-                self.ticker._onmessage(msg)
-
-            elif topic.startswith("/market/candles"):
-                self.kline._onmessage(msg)
-
-            elif topic.startswith("/market/snapshot"):
-                self.symbolsnapshot._onmessage(msg)
-
-            elif topic.startswith("/spotMarket/level2Depth50") or topic.startswith(
-                "/contractMarket/level2Depth50"
-            ):
-                self.orderbook50._onmessage(msg)
-
-            elif topic.startswith("/spotMarket/level2Depth5") or topic.startswith(
-                "/contractMarket/level2Depth5"
+            if not self._dispatch(topic, msg) and (
+                topic.endswith("tradeOrders") or topic.endswith("advancedOrders")
             ):
-                self.orderbook5._onmessage(msg)
-
-            elif topic.startswith("/market/match") or topic.startswith(
-                "/contractMarket/execution"
-            ):
-                self.execution._onmessage(msg)
-
-            elif topic.startswith("/indicator/index"):
-                self.indexprice._onmessage(msg)
+                self._onorders(msg)
 
-            elif topic.startswith("/indicator/markPrice"):
-                self.markprice._onmessage(msg)
+    def _onorders(self, msg: Any) -> None:
+        msg = _freeze(msg)
+        self.orderevents._onmessage(msg)
+        self.orders._onmessage(msg)
 
-            elif topic.endswith("tradeOrders") or topic.endswith("advancedOrders"):
-                self.orderevents._onmessage(copy.deepcopy(msg))
-                self.orders._onmessage(copy.deepcopy(msg))
+    def _onmarginposition(self, msg: Any) -> None:
+        msg = _freeze(msg)
+        self.marginpositions._onmessage(msg)
+        self.marginpositionevents._onmessage(msg)
 
-            elif topic.startswith("/contract/instrument"):
-                self.instrument._onmessage(msg)
+    def _onmarginloan(self, msg: Any) -> None:
+        msg = _freeze(msg)
+        self.marginorders._onmessage(msg)
+        self.marginorderevents._onmessage(msg)
 
-            elif topic.startswith("/contract/announcement"):
-                self.announcements._onmessage(msg)
-
-            elif topic.startswith("/contractMarket/snapshot"):
-                self.transactionstats._onmessage(msg)
-
-            elif topic.startswith("/account/balance"):
-                self.balance._onmessage(msg)
-
-            elif topic.startswith("/margin/fundingBook"):
-                self.marginfundingbook._onmessage(msg)
-
-            elif topic.startswith("/margin/position"):
-                self.marginpositions._onmessage(copy.deepcopy(msg))
-                self.marginpositionevents._onmessage(copy.deepcopy(msg))
-
-            elif topic.startswith("/margin/loan"):
-                self.marginorders._onmessage(copy.deepcopy(msg))
-                self.marginorderevents._onmessage(copy.deepcopy(msg))
-
-            elif topic.startswith("/contractAccount/wallet"):
-                self.balanceevents._onmessage(msg)
-
-            elif topic.startswith("/contract/position"):
-                self.positions._onmessage(msg)
+    def _onlevel2(self, msg: Any) -> None:
+        self.orderbook._onmessage(msg)
+        symbol = _symbol_from_msg(msg)
+        if (
+            self._resnapshot_client
+            and symbol in self.orderbook.stale
+            and symbol not in self._resnapshots
+        ):
+            self._resnapshots.add(symbol)
+            self._create_task(self._resnapshot(symbol))
+
+    def enable_resnapshot(self, client: Client | None) -> None:
+        """level2 板のシーケンス欠落を検知したときに REST スナップショットを自動で再取得する。
+
+        欠落したシンボル (:attr:`.Orderbook.stale`) について ``client`` で
+        現物は /api/v1/market/orderbook/level2_100 、先物は /api/v1/level2/snapshot を取得し、
+        バッファした差分を再適用する。 ``None`` を渡すと無効になる。
+        """
+        self._resnapshot_client = client
 
-            elif topic.startswith("/spotMarket/level2"):
-                raise NotImplementedError
-            elif topic.startswith("/margin/fundingBook"):
-                raise NotImplementedError
+    async def _resnapshot(self, symbol: str) -> None:
+        try:
+            while self._resnapshot_client and symbol in self.orderbook.stale:
+                url = self._LEVEL2_SNAPSHOT_URLS[self.orderbook._contracts[symbol]]
+                try:
+                    await self.initialize(
+                        self._resnapshot_client.get(url, params={"symbol": symbol})
+                    )
+                except Exception:
+                    logger.exception(f"failed to resnapshot level2 orderbook: {symbol}")
+                if symbol in self.orderbook.stale:
+                    await asyncio.sleep(self._RESNAPSHOT_INTERVAL)
+        finally:
+            self._resnapshots.discard(symbol)
 
     @property
     def ticker(self) -> "Ticker":
@@ -174,6 +216,17 @@ class KuCoinDataStore(DataStoreCollection):
         """
         return self._get("symbolsnapshot", SymbolSnapshot)
 
+    @property
+    def orderbook(self) -> "Orderbook":
+        """/market/level2, /contractMarket/level2 topic.
+
+        REST スナップショット (:meth:`initialize`) に差分を積み上げた全板。
+
+        * https://www.kucoin.com/docs/websocket/spot-trading/public-channels/level2-market-data
+        * https://www.kucoin.com/docs/websocket/futures-trading/public-channels/level2-market-data
+        """
+        return self._get("orderbook", Orderbook)
+
     @property
     def orderbook5(self) -> "TopKOrderBook":
         """/spotMarket/level2Depth50, /contractMarket/level2Depth5 topic.
@@ -369,7 +422,7 @@ class KuCoinDataStore(DataStoreCollection):
 
 class _InsertStore(DataStore):
     def _onmessage(self, msg: dict[str, Any]) -> None:
-        self._insert([msg["data"]])
+        self._insert([_thaw(msg["data"])])
 
 
 class _UpdateStore(DataStore):
@@ -411,22 +464,112 @@ class SymbolSnapshot(DataStore):
         self._update([msg["data"]["data"]])
 
 
-class Orderbook(DataStore):
+class Orderbook(BookStore):
     """
     # Spot
     - https://docs.kucoin.com/#level-2-market-data
 
     # Future
     - https://docs.kucoin.com/futures/#level-2-market-data
-    """
 
-    _KEYS = ["symbol"]
+    REST スナップショットの ``sequence`` に WebSocket の差分を積み上げる。
+    スナップショットを受信するまで差分はバッファされる。
+    現物は ``sequenceStart`` が直前の ``sequenceEnd + 1`` 、先物は ``sequence`` が直前の値 + 1
+    であることを検査し、欠落を検知したシンボルは :attr:`initialized` が ``False`` に戻り
+    :attr:`stale` に追加され、次のスナップショットまで差分をバッファする。
+    先物の価格と数量は REST と WebSocket で型を揃えるため float に変換する。
+    """
 
-    def _onmessage(self, msg: dict[str, Any]) -> None:
-        raise NotImplementedError
+    _KEYS = ["symbol", "side", "price"]
+    _INDEXES = [("symbol",)]
 
+    def _init(self) -> None:
+        self.initialized: defaultdict[str, bool] = defaultdict(lambda: False)
+        self.stale: set[str] = set()
+        self._sequence: dict[str, int] = {}
+        self._contracts: dict[str, bool] = {}
+        self._buff: defaultdict[str, deque[dict[str, Any]]] = defaultdict(
+            lambda: deque(maxlen=8000)
+        )
 
-class TopKOrderBook(DataStore):
+    def _onmessage(self, msg: dict[str, Any]) -> None:
+        symbol = _symbol_from_msg(msg)
+        self._contracts[symbol] = msg["topic"].startswith("/contractMarket/")
+        if self.initialized[symbol]:
+            self._apply(symbol, msg["data"])
+        else:
+            self._buff[symbol].append(msg["data"])
+
+    def _apply(self, symbol: str, data: dict[str, Any]) -> None:
+        last = self._sequence[symbol]
+        if "changes" in data:
+            start, end = data["sequenceStart"], data["sequenceEnd"]
+            changes = [
+                (side, price, size, int(sequence))
+                for side in ("asks", "bids")
+                for price, size, sequence in data["changes"][side]
+            ]
+        else:
+            start = end = data["sequence"]
+            price, side, size = data["change"].split(",")
+            changes = [
+                (
+                    "asks" if side == "sell" else "bids",
+                    float(price),
+                    float(size),
+                    end,
+                )
+            ]
+        if end <= last:
+            return
+        if start > last + 1:
+            logger.warning(
+                f"level2 gap detected: {symbol} "
+                f"(last sequence {last}, next sequence {start})"
+            )
+            self.initialized[symbol] = False
+            self.stale.add(symbol)
+            self._buff[symbol].append(data)
+            return
+
+        with self._batch():
+            for side, price, size, sequence in changes:
+                if sequence <= last:
+                    continue
+                item = {"symbol": symbol, "side": side, "price": price}
+                if float(size) != 0.0:
+                    self._update([{**item, "size": size}])
+                else:
+                    self._delete([item])
+        self._sequence[symbol] = end
+
+    def _onresponse(self, symbol: str, data: dict[str, Any]) -> None:
+        contract = self._contracts.setdefault(symbol, "symbol" in data)
+        rows = [
+            {
+                "symbol": symbol,
+                "side": side,
+                "price": float(price) if contract else price,
+                "size": float(size) if contract else size,
+            }
+            for side in ("asks", "bids")
+            for price, size in data[side]
+        ]
+        buff = list(self._buff[symbol])
+        self._buff[symbol].clear()
+        with self._batch():
+            self._snapshot({"symbol": symbol}, rows)
+            self._sequence[symbol] = int(data["sequence"])
+            self.initialized[symbol] = True
+            self.stale.discard(symbol)
+            for item in buff:
+                if self.initialized[symbol]:
+                    self._apply(symbol, item)
+                else:
+                    self._buff[symbol].append(item)
+
+
+class TopKOrderBook(BookStore):
     """
 
     # Spot
@@ -439,26 +582,14 @@ class TopKOrderBook(DataStore):
     """
 
     _KEYS = ["symbol", "side", "price"]
+    _INDEXES = [("symbol",)]
 
     def __init__(self, *args, **kwargs):
         super(TopKOrderBook, self).__init__(*args, **kwargs)
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="price",
-            query=query,
-            limit=limit,
-        )
-
     def _onmessage(self, msg: dict[str, Any]) -> None:
         symbol = _symbol_from_msg(msg)
 
-        self._find_and_delete({"symbol": symbol})
         data = []
         for side in ("asks", "bids"):
             for item in msg["data"][side]:
@@ -472,7 +603,7 @@ class TopKOrderBook(DataStore):
                     }
                 )
 
-        self._update(data)
+        self._snapshot({"symbol": symbol}, data)
 
 
 class Kline(DataStore):
@@ -604,7 +735,7 @@ class Orders(DataStore):
         if item is None:
             # new order
             if tp == "open":
-                self._insert([d])
+                self._insert([_thaw(d)])
         else:
             if tp in ("match", "triggered"):
                 # Market order
@@ -642,7 +773,7 @@ class MarginOrderEvents(DataStore):
     """
 
     def _onmessage(self, msg: dict[str, Any]) -> None:
-        self._insert([{"subject": msg["subject"], **msg}])
+        self._insert([{"subject": msg["subject"], **_thaw(msg)}])
 
 
 class MarginOrders(DataStore):
@@ -657,9 +788,9 @@ class MarginOrders(DataStore):
 
     def _onmessage(self, msg: dict[str, Any]) -> None:
         if msg["subject"] == "order.open":
-            self._insert([msg["data"]])
+            self._insert([_thaw(msg["data"])])
         elif msg["subject"] == "order.update":
-            self._update([msg["data"]])
+            self._update([_thaw(msg["data"])])
         elif msg["subject"] == "order.done":
             self._delete([msg["data"]])
 
@@ -672,7 +803,7 @@ class MarginPositions(DataStore):
 
     def _onmessage(self, msg: dict[str, Any]) -> None:
         self._clear()
-        self._insert([msg["data"]])
+        self._insert([_thaw(msg["data"])])
 
 
 class MarginPositionEvents(_InsertStore):
@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from collections import defaultdict
 from typing import TYPE_CHECKING, Any, Awaitable
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection
+from ..ws import ClientWebSocketResponse
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     import aiohttp
 
     from ..typedefs import Item
-    from ..ws import ClientWebSocketResponse
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +46,43 @@ class OKXDataStore(DataStoreCollection):
         self._create("liquidation-warning", datastore_class=LiquidationWarning)
         self._create("account-greeks", datastore_class=AccountGreeks)
 
+        routes: list[tuple[str, Callable[..., Any]]] = [
+            ("instruments", self.instruments._onmessage),
+            ("tickers", self.tickers._onmessage),
+            ("open-interest", self.openinterest._onmessage),
+            ("candle", self.candle._onmessage),
+            ("trades", self.trades._onmessage),
+            ("estimated-price", self.estimatedprice._onmessage),
+            ("mark-price", self.markprice._onmessage),
+            ("mark-price-candle", self.markpricecandle._onmessage),
+            ("price-limit", self.pricelimit._onmessage),
+            ("books", self.books._onmessage),
+            ("opt-summary", self.optsummary._onmessage),
+            ("funding-rate", self.fundingrate._onmessage),
+            ("index-candle", self.indexcandle._onmessage),
+            ("index-tickers", self.indextickers._onmessage),
+            ("status", self._get("status", Status)._onmessage),
+            ("account", self.account._onmessage),
+            ("positions", self.positions._onmessage),
+            ("balance_and_position", self.balance_and_position._onmessage),
+            ("orders", self.orders._onmessage),
+            ("orders-algo", self.ordersalgo._onmessage),
+            ("algo-advance", self.algoadvance._onmessage),
+            ("liquidation-warning", self.liquidationwarning._onmessage),
+            ("account-greeks", self.accountgreeks._onmessage),
+        ]
+        for channel, handler in routes:
+            self._route(channel, handler)
+        # candle1m, mark-price-candle1m, index-candle1m, books5, books-l2-tbt, ...
+        prefixes: list[tuple[str, Callable[..., Any]]] = [
+            ("candle", self.candle._onmessage),
+            ("mark-price-candle", self.markpricecandle._onmessage),
+            ("index-candle", self.indexcandle._onmessage),
+            ("books", self.books._onmessage),
+        ]
+        for channel, handler in prefixes:
+            self._route(channel, handler, prefix=True)
+
     async def initialize(self, *aws: Awaitable[aiohttp.ClientResponse]) -> None:
         """Initialize DataStore from HTTP response data.
 
@@ -67,19 +107,11 @@ class OKXDataStore(DataStoreCollection):
             if msg["event"] == "error":
                 logger.warning(msg)
         if all(k in msg for k in ("arg", "data")):
-            channel: str = msg["arg"]["channel"]
-            if "candle" in channel:
-                if channel.startswith("candle"):
-                    channel = "candle"
-                elif channel.startswith("mark-price-candle"):
-                    channel = "mark-price-candle"
-                elif channel.startswith("index-candle"):
-                    channel = "index-candle"
-            if "books" in channel:
-                if channel.startswith("books"):
-                    channel = "books"
-            if target_onmessage := getattr(self[channel], "_onmessage", None):
-                target_onmessage(msg)
+            self._dispatch(msg["arg"]["channel"], msg)
+            if self.books._resubscribe:
+                args, self.books._resubscribe = self.books._resubscribe, []
+                if isinstance(ws, ClientWebSocketResponse):
+                    self._create_task(ws._resubscribe(args))
 
     @property
     def instruments(self) -> "Instruments":
@@ -311,31 +343,32 @@ class MarkPriceCandle(_CandleStore): ...
 class PriceLimit(_UpdateStore): ...
 
 
-class Books(DataStore):
+class Books(BookStore):
+    """books チャンネルの板情報。
+
+    ``checksum`` を含むメッセージは適用後の板の上位 25 件から CRC32 を計算して検証する。
+    不一致の銘柄は :attr:`invalid` に追加され、 :attr:`mismatches` で回数を確認できる。
+    :attr:`invalid` の銘柄は次のスナップショットを受信するまで差分の適用を続ける。
+    """
+
     _KEYS = ["instId", "side", "px"]
+    _INDEXES = [("instId",)]
+    _PRICE_KEY = "px"
     _LIST_KEYS = ["px", "sz", "liqSz", "ordSz"]
 
     def _init(self) -> None:
         self.checksum: dict[str, int] = {}
+        self.invalid: set[str] = set()
+        self.mismatches: defaultdict[str, int] = defaultdict(int)
         self.ts: str | None = None
-
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="px",
-            query=query,
-            limit=limit,
-        )
+        self._resubscribe: list[Item] = []
 
     def _onmessage(self, msg: dict[str, Any]) -> None:
         inst_id = msg["arg"]["instId"]
         action = msg.get("action", "snapshot")
         if action == "snapshot":
             self._delete(self.find({"instId": inst_id}))
+            self.invalid.discard(inst_id)
         for book in msg["data"]:
             for side in ("asks", "bids"):
                 for item in book[side]:
@@ -349,7 +382,15 @@ class Books(DataStore):
                     else:
                         self._delete([item])
             if "checksum" in book:
-                self.checksum[msg["arg"]["instId"]] = book["checksum"]
+                self.checksum[inst_id] = book["checksum"]
+                if (
+                    inst_id not in self.invalid
+                    and self._crc32({"instId": inst_id}, "sz") != book["checksum"]
+                ):
+                    logger.warning(f"books checksum mismatch: {msg['arg']}")
+                    self.invalid.add(inst_id)
+                    self.mismatches[inst_id] += 1
+                    self._resubscribe.append(msg["arg"])
             self.ts = book["ts"]
 
 
@@ -4,7 +4,7 @@ import asyncio
 import logging
 from typing import TYPE_CHECKING, Awaitable
 
-from ..store import DataStore, DataStoreCollection
+from ..store import BookStore, DataStore, DataStoreCollection
 
 if TYPE_CHECKING:
     import aiohttp
@@ -192,54 +192,53 @@ class Trade(DataStore):
             )
 
 
-class OrderBook(DataStore):
+class OrderBook(BookStore):
+    """Phemex の板情報 DataStore 。
+
+    ``book`` チャンネル (Contract / Spot) の価格 ``priceEp`` と数量 ``qty`` はスケール済みの
+    整数を ``int`` のまま格納し、板は整数の価格ラダーで保持する。 ``orderbook_p``
+    チャンネル (Hedged Contract) の価格と数量は実数の文字列のまま格納する。
+    """
+
     _KEYS = ["symbol", "side", "priceEp"]
+    _INDEXES = [("symbol",)]
+    _PRICE_KEY = "priceEp"
 
     def _init(self) -> None:
         self.timestamp: int | None = None
 
-    def sorted(
-        self, query: Item | None = None, limit: int | None = None
-    ) -> dict[str, list[Item]]:
-        return self._sorted(
-            item_key="side",
-            item_asc_key="asks",
-            item_desc_key="bids",
-            sort_key="priceEp",
-            query=query,
-            limit=limit,
-        )
+    def _price(self, item: Item) -> float | int:
+        price = item["priceEp"]
+        return price if type(price) is int else float(price)
 
     def _onmessage(self, message: Item) -> None:
         symbol = message["symbol"]
-        if message.get("type") == "snapshot":
-            self._find_and_delete({"symbol": symbol})
-        for book in (message.get("book"), message.get("orderbook_p")):
-            if book is None:
-                continue
+        inserts: list[Item] = []
+        deletes: list[Item] = []
+        if (book := message.get("book")) is not None:
             for side in ("asks", "bids"):
-                for item in book[side]:
-                    if float(item[1]) != 0.0:
-                        self._insert(
-                            [
-                                {
-                                    "symbol": symbol,
-                                    "side": side,
-                                    "priceEp": item[0],
-                                    "qty": item[1],
-                                }
-                            ]
-                        )
+                for price, qty in book[side]:
+                    row = {"symbol": symbol, "side": side, "priceEp": int(price)}
+                    if qty := int(qty):
+                        inserts.append({**row, "qty": qty})
                     else:
-                        self._delete(
-                            [
-                                {
-                                    "symbol": symbol,
-                                    "side": side,
-                                    "priceEp": item[0],
-                                }
-                            ]
-                        )
+                        deletes.append(row)
+        if (book := message.get("orderbook_p")) is not None:
+            rows = [
+                {"symbol": symbol, "side": side, "priceEp": price, "qty": qty}
+                for side in ("asks", "bids")
+                for price, qty in book[side]
+            ]
+            if self._SCHEMA:
+                rows = self._normalize(rows)
+            for row in rows:
+                (deletes if self._is_zero(row["qty"]) else inserts).append(row)
+
+        with self._batch():
+            if message.get("type") == "snapshot":
+                self._find_and_delete({"symbol": symbol})
+            self._insert(inserts)
+            self._delete(deletes)
 
         self.timestamp = message["timestamp"]
 
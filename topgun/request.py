@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from typing import TYPE_CHECKING, Any
 
 import aiohttp
@@ -11,6 +12,7 @@ from .auth import Auth, Hosts
 if TYPE_CHECKING:
     from collections.abc import Callable
 
+    from aiohttp.typedefs import JSONDecoder
     from yarl import URL
 
 
@@ -50,9 +52,23 @@ class ClientRequest(aiohttp.ClientRequest):
         resp = await super().send(*args, **kwargs)
         resp.__dict__["_auth"] = self.__dict__["_auth"]
         resp.__dict__["_raw_session"] = self._session
+        resp.__dict__["_json_loads"] = self._session.__dict__.get(
+            "_json_loads", json.loads
+        )
         return resp
 
 
+class ClientResponse(aiohttp.ClientResponse):
+    async def json(self, *, loads: JSONDecoder | None = None, **kwargs: Any) -> Any:
+        """Read and decodes JSON response.
+
+        ``loads`` を省略した場合は :class:`.Client` に設定した JSON デコーダを使う。
+        """
+        if loads is None:
+            loads = self.__dict__.get("_json_loads", json.loads)
+        return await super().json(loads=loads, **kwargs)
+
+
 class ContentType:
     """Content-Type specific request modifications.
 
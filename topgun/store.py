@@ -1,23 +1,224 @@
 from __future__ import annotations
 
 import asyncio
+import bisect
+import contextlib
 import copy
+import heapq
+import itertools
+import operator
 import uuid
+import zlib
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Literal, TypeVar, overload
+from decimal import Decimal
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar, cast, overload
 
 if TYPE_CHECKING:
-    from collections.abc import Hashable, Iterator
+    from collections.abc import (
+        AsyncIterator,
+        Callable,
+        Coroutine,
+        Hashable,
+        Iterator,
+        Mapping,
+    )
 
     from .typedefs import Item
     from .ws import ClientWebSocketResponse
 
+    _Waiter = tuple[
+        Item,
+        Callable[["StoreChange"], bool] | None,
+        asyncio.Future["StoreChange"],
+    ]
+
+_MISSING: Any = object()
+
+
+class _FrozenDict(dict):  # type: ignore[type-arg]
+    """読み取り専用のメッセージビュー 。
+
+    1 つのデコード済みメッセージを複数のストアへ配信するための ``dict`` サブクラス 。
+    参照は通常の ``dict`` と同じ速度で行え、変更操作は :class:`TypeError` を送出する 。
+    行として保持するストアは :func:`_thaw` で変更可能なコピーを取る (コピーオンライト) 。
+    :meth:`copy` / :func:`copy.copy` / :func:`copy.deepcopy` は変更可能な ``dict`` を返す 。
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> Any:
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    update = pop = popitem = clear = setdefault = _readonly  # type: ignore[assignment]
+
+    def __copy__(self) -> dict[Any, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> dict[Any, Any]:
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (dict, (dict(self),))
+
+
+def _freeze(obj: Any) -> Any:
+    """メッセージを再帰的に読み取り専用ビュー (:class:`_FrozenDict` と ``tuple``) に変換する 。
+
+    デコード直後に 1 度だけ呼び、同じビューを複数のストアの ``_onmessage`` に渡す 。
+    ストア側でビューを変更しようとすると :class:`TypeError` になるため、
+    保持する行は :func:`_thaw` でコピーしてから挿入する 。
+    """
+    if isinstance(obj, dict):
+        return _FrozenDict({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+def _thaw(obj: Any) -> Any:
+    """:func:`_freeze` の逆変換 。 読み取り専用ビューを再帰的に ``dict`` と ``list`` に戻す。
+
+    ストアが行として保持するのは元のメッセージと同じ型の変更可能なコピーになる 。
+    """
+    if isinstance(obj, dict):
+        return {key: _thaw(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(value) for value in obj]
+    return obj
+
+
+class _Storage(ABC):
+    """DataStore の行の格納方式 (ストレージバックエンド) の基底クラス 。
+
+    :attr:`rows` に行 ID から行へのマップを挿入順に保持し、キーから行 ID を引く。
+    行 ID は :meth:`.DataStore._find_with_uuid` が返し、 :meth:`.DataStore._remove` が受け取る。
+    キーのない行は ``key`` に ``_MISSING`` を渡す。
+    """
+
+    __slots__ = ("rows",)
+
+    def __init__(self) -> None:
+        self.rows: dict[Any, Item] = {}
+
+    @abstractmethod
+    def get(self, key: Any) -> Any:
+        """キーに一致する行の ID を返す。 なければ ``_MISSING`` を返す。"""
+
+    @abstractmethod
+    def add(self, key: Any, item: Item) -> Any:
+        """行を追加して行 ID を返す。"""
+
+    @abstractmethod
+    def pop(self, _id: Any, key: Any) -> Item:
+        """行 ID の行を取り除いて返す。"""
+
+    def clear(self) -> None:
+        self.rows.clear()
+
+
+class _CompactStorage(_Storage):
+    """キーを行 ID として 1 つの辞書に行を格納する既定のバックエンド 。
+
+    キーのない行には単調増加する整数の行 ID を払い出す。
+    """
+
+    __slots__ = ("_ids",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._ids = itertools.count()
+
+    def get(self, key: Any) -> Any:
+        return key if key in self.rows else _MISSING
+
+    def add(self, key: Any, item: Item) -> Any:
+        if key is _MISSING:
+            key = next(self._ids)
+        self.rows[key] = item
+        return key
+
+    def pop(self, _id: Any, key: Any) -> Item:
+        return self.rows.pop(_id)
+
+
+class _UUIDStorage(_Storage):
+    """行ごとに UUID を払い出し、キーから UUID へのマップを別に持つバックエンド 。"""
+
+    __slots__ = ("index",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.index: dict[Any, uuid.UUID] = {}
+
+    def get(self, key: Any) -> Any:
+        return self.index.get(key, _MISSING)
+
+    def add(self, key: Any, item: Item) -> Any:
+        _id = uuid.uuid4()
+        self.rows[_id] = item
+        if key is not _MISSING:
+            self.index[key] = _id
+        return _id
+
+    def pop(self, _id: Any, key: Any) -> Item:
+        if key is not _MISSING:
+            del self.index[key]
+        return self.rows.pop(_id)
+
+    def clear(self) -> None:
+        self.rows.clear()
+        self.index.clear()
+
+
+class FixedPoint:
+    """数値を刻み幅 (tick size) 単位の整数に変換する :attr:`.DataStore._SCHEMA` の変換器 。
+
+    ``"123.45"`` を刻み幅 ``"0.01"`` で ``12345`` に変換する。 刻み幅で割り切れない値は
+    最も近い整数に丸める。
+
+    Args:
+        tick: 既定の刻み幅
+        ticks: シンボルごとの刻み幅
+        key: シンボルのフィールド名。 ``ticks`` を指定する場合に必要
+    """
+
+    __slots__ = ("tick", "ticks", "key")
+
+    def __init__(
+        self,
+        tick: str | Decimal = "1",
+        ticks: Mapping[str, str | Decimal] | None = None,
+        key: str | None = None,
+    ) -> None:
+        self.tick = Decimal(tick)
+        self.ticks = {k: Decimal(v) for k, v in (ticks or {}).items()}
+        self.key = key
+
+    def _tick(self, item: Item) -> Decimal:
+        if self.key is not None and self.key in item:
+            return self.ticks.get(item[self.key], self.tick)
+        return self.tick
+
+    def __call__(self, value: str, item: Item) -> int:
+        return int((Decimal(value) / self._tick(item)).to_integral_value())
+
+    def to_decimal(self, value: int, item: Item) -> Decimal:
+        """整数に変換した値を :class:`~decimal.Decimal` に戻す。"""
+        return value * self._tick(item)
+
 
 class DataStore:
     """Abstract DataStore class."""
 
     _KEYS: list[str] = []
+    _INDEXES: list[tuple[str, ...]] = []
     _MAXLEN = 9999
+    _STORAGE: type[_Storage] = _CompactStorage
+    _SCHEMA: dict[str, Callable[[str], Any] | FixedPoint] = {}
+    _RAW_SUFFIX: str | None = None
 
     def __init__(
         self,
@@ -26,11 +227,18 @@ class DataStore:
         data: list[Item] | None = None,
     ) -> None:
         self.name: str | None = name
-        self._data: dict[uuid.UUID, Item] = {}
-        self._index: dict[int, uuid.UUID] = {}
-        self._keys: tuple[str, ...] = tuple(keys if keys else self._KEYS)
+        self._storage = self._STORAGE()
+        self._data = self._storage.rows
+        self._keys = tuple(keys if keys else self._KEYS)
+        self._indexes: dict[tuple[str, ...], dict[tuple[Any, ...], dict[Any, Item]]] = {
+            tuple(fields): {} for fields in self._INDEXES
+        }
         self._events: list[asyncio.Event] = []
-        self._queues: list[asyncio.Queue] = []
+        self._waiters: dict[tuple[str, ...], dict[tuple[Any, ...], list[_Waiter]]] = {}
+        self._streams: list[StoreStream[Any]] = []
+        self._batching = 0
+        self._changed = False
+        self._pending: list[tuple[StoreStream[Any], StoreChange]] = []
         if data is None:
             data = []
         self._insert(data)
@@ -46,116 +254,248 @@ class DataStore:
     def __reversed__(self) -> Iterator[Item]:
         return reversed(self._data.values())
 
+    @property
+    def _keys(self) -> tuple[str, ...]:
+        return self._key_fields
+
+    @_keys.setter
+    def _keys(self, keys: tuple[str, ...]) -> None:
+        # キーの取り出しは operator.itemgetter に前もってコンパイルしておく
+        self._key_fields = keys
+        self._keyof: Callable[[Mapping[str, Any]], Any] = (
+            operator.itemgetter(*keys) if keys else lambda item: ()
+        )
+
     @staticmethod
     def _hash(item: dict[str, Hashable]) -> int:
         return hash(tuple(item.items()))
 
+    def _normalize(self, data: list[Item]) -> list[Item]:
+        """:const:`_SCHEMA` のフィールドの文字列の値を変換した行のリストを返す。
+
+        変換する行はコピーするので、渡した行 (:func:`_freeze` したビューを含む) は変更しない。
+        変換済みの値 (文字列以外) はそのままなので、格納済みの行を :meth:`_delete` などに
+        渡しても二重に変換されない。 :const:`_RAW_SUFFIX` を設定した場合は、変換前の文字列を
+        フィールド名に接尾辞を付けたフィールドに残す。
+        """
+        suffix = self._RAW_SUFFIX
+        normalized: list[Item] = []
+        for item in data:
+            converted: Item | None = None
+            for field, convert in self._SCHEMA.items():
+                value = item.get(field)
+                if isinstance(value, str):
+                    if converted is None:
+                        converted = dict(item)
+                    if suffix is not None:
+                        converted[field + suffix] = value
+                    if isinstance(convert, FixedPoint):
+                        converted[field] = convert(value, item)
+                    else:
+                        converted[field] = convert(value)
+            normalized.append(item if converted is None else converted)
+        return normalized
+
+    @staticmethod
+    def _is_zero(value: Any) -> bool:
+        """数量が 0 かどうかを返す。 文字列は数値に変換せずに判定する。"""
+        if isinstance(value, str):
+            return not value.strip("0.")
+        return value == 0
+
     def _insert(self, data: list[Item]) -> None:
+        if self._SCHEMA:
+            data = self._normalize(data)
         if self._keys:
+            keyof = self._keyof
+            storage = self._storage
             for item in data:
                 try:
-                    keyitem = {k: item[k] for k in self._keys}
+                    key = keyof(item)
                 except KeyError:
                     pass
                 else:
-                    keyhash = self._hash(keyitem)
-                    if keyhash not in self._index:
-                        _id = uuid.uuid4()
-                        self._data[_id] = item
-                        self._index[keyhash] = _id
+                    _id = storage.get(key)
+                    if _id is _MISSING:
+                        _id = storage.add(key, item)
+                        if self._indexes:
+                            self._index_add(_id, item)
+                        self._onadd(item)
                         self._put("insert", None, item)
                     else:
-                        self._data[self._index[keyhash]] = item
+                        if self._indexes:
+                            self._index_replace(_id, self._data[_id], item)
+                        self._onreplace(self._data[_id], item)
+                        self._data[_id] = item
                         self._put("insert", None, item)
             self._sweep_with_key()
         else:
             for item in data:
-                _id = uuid.uuid4()
-                self._data[_id] = item
+                _id = self._storage.add(_MISSING, item)
+                if self._indexes:
+                    self._index_add(_id, item)
+                self._onadd(item)
                 self._put("insert", None, item)
             self._sweep_without_key()
         self._set()
 
     def _update(self, data: list[Item]) -> None:
+        if self._SCHEMA:
+            data = self._normalize(data)
         if self._keys:
+            keyof = self._keyof
+            storage = self._storage
             for item in data:
                 try:
-                    keyitem = {k: item[k] for k in self._keys}
+                    key = keyof(item)
                 except KeyError:
                     pass
                 else:
-                    keyhash = self._hash(keyitem)
-                    if keyhash in self._index:
-                        self._data[self._index[keyhash]].update(item)
-                        self._put("update", item, self._data[self._index[keyhash]])
+                    _id = storage.get(key)
+                    if _id is not _MISSING:
+                        if self._indexes:
+                            old = self._data[_id].copy()
+                            self._data[_id].update(item)
+                            self._index_replace(_id, old, self._data[_id])
+                        else:
+                            self._data[_id].update(item)
+                        self._put("update", item, self._data[_id])
                     else:
-                        _id = uuid.uuid4()
-                        self._data[_id] = item
-                        self._index[keyhash] = _id
+                        _id = storage.add(key, item)
+                        if self._indexes:
+                            self._index_add(_id, item)
+                        self._onadd(item)
                         self._put("update", None, item)
             self._sweep_with_key()
         else:
             for item in data:
-                _id = uuid.uuid4()
-                self._data[_id] = item
+                _id = self._storage.add(_MISSING, item)
+                if self._indexes:
+                    self._index_add(_id, item)
+                self._onadd(item)
                 self._put("update", None, item)
             self._sweep_without_key()
         self._set()
 
     def _delete(self, data: list[Item]) -> None:
+        if self._SCHEMA:
+            data = self._normalize(data)
         if self._keys:
+            keyof = self._keyof
             for item in data:
                 try:
-                    keyitem = {k: item[k] for k in self._keys}
+                    key = keyof(item)
                 except KeyError:
                     pass
                 else:
-                    keyhash = self._hash(keyitem)
-                    if keyhash in self._index:
-                        self._put("delete", item, self._data[self._index[keyhash]])
-                        del self._data[self._index[keyhash]]
-                        del self._index[keyhash]
+                    _id = self._storage.get(key)
+                    if _id is not _MISSING:
+                        self._put("delete", item, self._data[_id])
+                        self._detach(_id, key)
         self._set()
 
-    def _remove(self, uuids: list[uuid.UUID]) -> None:
-        if self._keys:
-            for _id in uuids:
-                if _id in self._data:
-                    item = self._data[_id]
-                    keyhash = self._hash({k: item[k] for k in self._keys})
-                    self._put("delete", None, self._data[_id])
-                    del self._data[_id]
-                    del self._index[keyhash]
-        else:
-            for _id in uuids:
-                if _id in self._data:
-                    self._put("delete", None, self._data[_id])
-                    del self._data[_id]
+    def _remove(self, uuids: list[Any]) -> None:
+        for _id in uuids:
+            if _id in self._data:
+                item = self._data[_id]
+                self._put("delete", None, item)
+                self._detach(_id, self._keyof(item) if self._keys else _MISSING)
         self._set()
 
     def _clear(self) -> None:
         for item in self:
             self._put("delete", None, item)
-        self._data.clear()
-        self._index.clear()
+            self._onremove(item)
+        self._storage.clear()
+        for index in self._indexes.values():
+            index.clear()
         self._set()
 
     def _sweep_with_key(self) -> None:
-        if len(self._data) > self._MAXLEN:
+        if not self._batching and len(self._data) > self._MAXLEN:
             over = len(self._data) - self._MAXLEN
-            _iter = iter(self._index)
-            keys = [next(_iter) for _ in range(over)]
-            for k in keys:
-                del self._data[self._index[k]]
-                del self._index[k]
+            for _id in list(itertools.islice(self._data, over)):
+                self._detach(_id, self._keyof(self._data[_id]))
 
     def _sweep_without_key(self) -> None:
-        if len(self._data) > self._MAXLEN:
+        if not self._batching and len(self._data) > self._MAXLEN:
             over = len(self._data) - self._MAXLEN
-            _iter = iter(self._data)
-            keys = [next(_iter) for _ in range(over)]
-            for k in keys:
-                del self._data[k]
+            for _id in list(itertools.islice(self._data, over)):
+                self._detach(_id, _MISSING)
+
+    def _detach(self, _id: Any, key: Any) -> Item:
+        item = self._storage.pop(_id, key)
+        if self._indexes:
+            self._index_remove(_id, item)
+        self._onremove(item)
+        return item
+
+    def _index_add(self, _id: Any, item: Item) -> None:
+        for fields, index in self._indexes.items():
+            try:
+                value = tuple(item[k] for k in fields)
+            except KeyError:
+                continue
+            if value not in index:
+                index[value] = {}
+            index[value][_id] = item
+
+    def _index_remove(self, _id: Any, item: Item) -> None:
+        for fields, index in self._indexes.items():
+            try:
+                value = tuple(item[k] for k in fields)
+            except KeyError:
+                continue
+            rows = index.get(value)
+            if rows is not None:
+                rows.pop(_id, None)
+                if not rows:
+                    del index[value]
+
+    def _index_replace(self, _id: Any, old: Item, item: Item) -> None:
+        for fields, index in self._indexes.items():
+            old_value = tuple(old.get(k, _MISSING) for k in fields)
+            value = tuple(item.get(k, _MISSING) for k in fields)
+            if old_value == value:
+                if value in index:
+                    index[value][_id] = item
+                continue
+            if old_value in index:
+                index[old_value].pop(_id, None)
+                if not index[old_value]:
+                    del index[old_value]
+            if _MISSING not in value:
+                if value not in index:
+                    index[value] = {}
+                index[value][_id] = item
+
+    def _index_lookup(self, query: Item) -> dict[Any, Item] | None:
+        """クエリを満たす最長の宣言済みインデックスから候補の行を取得する。
+
+        候補はインデックスに登録された順に並ぶ。 インデックスの値が更新で変わった行は
+        新しい値の候補の末尾に移る。 使えるインデックスがなければ None を返す。
+        """
+        fields: tuple[str, ...] = ()
+        for candidate in self._indexes:
+            if len(candidate) > len(fields) and all(k in query for k in candidate):
+                fields = candidate
+        if not fields:
+            return None
+        try:
+            return self._indexes[fields].get(tuple(query[k] for k in fields), {})
+        except TypeError:
+            return None
+
+    def _onadd(self, item: Item) -> None:
+        """Hook called when a new row is stored."""
+
+    def _onreplace(self, old: Item, item: Item) -> None:
+        """Hook called when a stored row is replaced by a row with the same keys."""
+        self._onremove(old)
+        self._onadd(item)
+
+    def _onremove(self, item: Item) -> None:
+        """Hook called when a row is removed from the store."""
 
     def get(self, item: Item) -> Item | None:
         """DataStore から Item を取得する。
@@ -169,28 +509,27 @@ class DataStore:
         """
         if self._keys:
             try:
-                keyitem = {k: item[k] for k in self._keys}
+                key = self._keyof(item)
             except KeyError:
                 pass
             else:
-                keyhash = self._hash(keyitem)
-                if keyhash in self._index:
-                    return self._data[self._index[keyhash]]
+                _id = self._storage.get(key)
+                if _id is not _MISSING:
+                    return self._data[_id]
         return None
 
     def _pop(self, item: Item) -> Item | None:
+        if self._SCHEMA:
+            item = self._normalize([item])[0]
         if self._keys:
             try:
-                keyitem = {k: item[k] for k in self._keys}
+                key = self._keyof(item)
             except KeyError:
                 pass
             else:
-                keyhash = self._hash(keyitem)
-                if keyhash in self._index:
-                    ret = self._data[self._index[keyhash]]
-                    del self._data[self._index[keyhash]]
-                    del self._index[keyhash]
-                    return ret
+                _id = self._storage.get(key)
+                if _id is not _MISSING:
+                    return self._detach(_id, key)
         return None
 
     def find(self, query: Item | None = None) -> list[Item]:
@@ -204,21 +543,23 @@ class DataStore:
             クエリの指定があれば、それに一致するデータを返する
         """
         if query:
+            rows = self._index_lookup(query) if self._indexes else None
             return [
                 item
-                for item in self
+                for item in (self if rows is None else rows.values())
                 if all(k in item and query[k] == item[k] for k in query)
             ]
         else:
             return list(self)
 
-    def _find_with_uuid(self, query: Item | None = None) -> dict[uuid.UUID, Item]:
+    def _find_with_uuid(self, query: Item | None = None) -> dict[Any, Item]:
         if query is None:
             query = {}
         if query:
+            rows = self._index_lookup(query) if self._indexes else None
             return {
                 _id: item
-                for _id, item in self._data.items()
+                for _id, item in (self._data if rows is None else rows).items()
                 if all(k in item and query[k] == item[k] for k in query)
             }
         else:
@@ -228,11 +569,7 @@ class DataStore:
         if query is None:
             query = {}
         if query:
-            ret = [
-                item
-                for item in self
-                if all(k in item and query[k] == item[k] for k in query)
-            ]
+            ret = self.find(query)
             self._delete(ret)
             return ret
         else:
@@ -240,6 +577,46 @@ class DataStore:
             self._clear()
             return ret
 
+    def _snapshot(self, query: Item, data: list[Item]) -> None:
+        """クエリに一致する行を全量のスナップショットで置き換える。
+
+        現在の行とスナップショットを比較して、実際に変わった行だけを変更する。
+        新しい行は ``"insert"`` 、内容が変わった行は ``"update"`` 、スナップショットに
+        ない行は ``"delete"`` として配信し、変わらない行は配信しない。
+        キー (:const:`_KEYS`) がない場合は比較できないので、すべて削除して挿入する。
+        """
+        with self._batch():
+            if not self._keys:
+                self._find_and_delete(query)
+                self._insert(data)
+                return
+            if self._SCHEMA:
+                data = self._normalize(data)
+            current = self._find_with_uuid(query)
+            keyof = self._keyof
+            storage = self._storage
+            seen = set()
+            for item in data:
+                try:
+                    key = keyof(item)
+                except KeyError:
+                    continue
+                _id = storage.get(key)
+                if _id is _MISSING:
+                    _id = storage.add(key, item)
+                    if self._indexes:
+                        self._index_add(_id, item)
+                    self._onadd(item)
+                    self._put("insert", None, item)
+                elif self._data[_id] != item:
+                    if self._indexes:
+                        self._index_replace(_id, self._data[_id], item)
+                    self._onreplace(self._data[_id], item)
+                    self._data[_id] = item
+                    self._put("update", item, item)
+                seen.add(_id)
+            self._remove([_id for _id in current if _id not in seen])
+
     def _sorted(
         self,
         item_key: str,
@@ -268,10 +645,46 @@ class DataStore:
         return result
 
     def _set(self) -> None:
+        if self._batching:
+            self._changed = True
+            return
+        for stream in self._streams:
+            if stream._operations:
+                stream._flush()
         for event in self._events:
             event.set()
         self._events.clear()
 
+    @contextlib.contextmanager
+    def _batch(self) -> Iterator[None]:
+        """複数の変更を 1 つのトランザクションとしてまとめる。
+
+        ブロック内では :const:`_MAXLEN` による削除、 :meth:`wait` の待機者の起床、
+        :meth:`watch` への変更の配信を保留し、ブロックを抜けるときに一度だけ実行する。
+        ネストした場合は最も外側のブロックを抜けるときに実行する。
+        """
+        self._batching += 1
+        try:
+            yield
+        finally:
+            self._batching -= 1
+            if not self._batching:
+                self._commit()
+
+    def _commit(self) -> None:
+        if self._keys:
+            self._sweep_with_key()
+        else:
+            self._sweep_without_key()
+        if self._pending:
+            pending = self._pending
+            self._pending = []
+            for stream, change in pending:
+                stream._put(change)
+        if self._changed:
+            self._changed = False
+            self._set()
+
     async def wait(self) -> None:
         """DataStore にデータの変更があるまで待機する。
 
@@ -281,23 +694,578 @@ class DataStore:
         self._events.append(event)
         await event.wait()
 
+    async def wait_for(
+        self,
+        query: Item | None = None,
+        predicate: Callable[[StoreChange], bool] | None = None,
+    ) -> StoreChange:
+        """クエリに一致する行に変更があるまで待機する。
+
+        待機者はクエリに含まれるキー (:const:`_KEYS`) またはインデックス (:const:`_INDEXES`)
+        の値ごとに登録され、その値の行が挿入・更新・削除されたときだけ判定される。
+        :meth:`wait` と異なり、関係のない行の変更では起床しない。
+
+        Args:
+            query: 待機する行をフィルタするクエリ辞書。 指定しなければすべての行に一致する
+            predicate: 変更データを受け取り、待機を終了する場合に True を返す関数
+
+        Returns:
+            待機を終了した変更データ 。 :meth:`watch` と同じく読み取り専用のスナップショット
+
+        Usage example: :ref:`wait`
+        """
+        if query is None:
+            query = {}
+        fields = self._waiter_fields(query)
+        values = tuple(query[k] for k in fields)
+        try:
+            hash(values)
+        except TypeError:
+            fields, values = (), ()
+
+        future: asyncio.Future[StoreChange] = asyncio.get_running_loop().create_future()
+        waiter = (query, predicate, future)
+        buckets = self._waiters.setdefault(fields, {})
+        buckets.setdefault(values, []).append(waiter)
+        try:
+            return await future
+        finally:
+            waiters = buckets[values]
+            waiters.remove(waiter)
+            if not waiters:
+                del buckets[values]
+                if not buckets:
+                    del self._waiters[fields]
+
+    def _waiter_fields(self, query: Item) -> tuple[str, ...]:
+        if self._keys and all(k in query for k in self._keys):
+            return self._keys
+        fields: tuple[str, ...] = ()
+        for candidate in self._indexes:
+            if len(candidate) > len(fields) and all(k in query for k in candidate):
+                fields = candidate
+        return fields
+
+    def _wake(
+        self,
+        operation: Literal["insert", "update", "delete"],
+        source: Item | None,
+        item: Item,
+        change: StoreChange | None,
+    ) -> None:
+        for fields, buckets in self._waiters.items():
+            try:
+                waiters = buckets.get(tuple(item[k] for k in fields))
+            except (KeyError, TypeError):
+                continue
+            if not waiters:
+                continue
+            for query, predicate, future in waiters:
+                if future.done() or not all(
+                    k in item and item[k] == v for k, v in query.items()
+                ):
+                    continue
+                if change is None:
+                    change = self._change(operation, source, item)
+                try:
+                    if predicate is not None and not predicate(change):
+                        continue
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(change)
+
+    def _change(
+        self,
+        operation: Literal["insert", "update", "delete"],
+        source: Item | None,
+        item: Item,
+    ) -> StoreChange:
+        return StoreChange(
+            self,
+            operation,
+            None if source is None else MappingProxyType(source.copy()),
+            MappingProxyType(item.copy()),
+        )
+
     def _put(
         self,
         operation: Literal["insert", "update", "delete"],
         source: Item | None,
         item: Item,
     ) -> None:
-        for queue in self._queues:
-            queue.put_nowait(
-                StoreChange(self, operation, copy.deepcopy(source), copy.deepcopy(item))
-            )
+        shared: StoreChange | None = None
+        for stream in self._streams:
+            if stream._deepcopy:
+                change = StoreChange(
+                    self, operation, copy.deepcopy(source), copy.deepcopy(item)
+                )
+            else:
+                if shared is None:
+                    shared = self._change(operation, source, item)
+                change = shared
+            if stream._batched:
+                stream._operations.append(change.operation)
+                stream._sources.append(change.source)
+                stream._data.append(change.data)
+            elif self._batching:
+                self._pending.append((stream, change))
+            else:
+                stream._put(change)
+        if self._waiters:
+            self._wake(operation, source, item, shared)
+
+    @overload
+    def watch(
+        self,
+        *,
+        deepcopy: bool = ...,
+        batched: Literal[False] = ...,
+        maxsize: int = ...,
+        overflow: Literal["drop_oldest", "drop_newest"] = ...,
+        conflate: bool = ...,
+    ) -> StoreStream[StoreChange]: ...
+
+    @overload
+    def watch(
+        self,
+        *,
+        deepcopy: bool = ...,
+        batched: Literal[True],
+        maxsize: int = ...,
+        overflow: Literal["drop_oldest", "drop_newest"] = ...,
+    ) -> StoreStream[StoreChangeBatch]: ...
 
-    def watch(self) -> "StoreStream":
+    def watch(
+        self,
+        *,
+        deepcopy: bool = False,
+        batched: bool = False,
+        maxsize: int = 0,
+        overflow: Literal["drop_oldest", "drop_newest"] = "drop_oldest",
+        conflate: bool = False,
+    ) -> StoreStream[Any]:
         """DataStore の更新データをストリームする。
 
+        既定では 1 つの変更データをすべてのストリームで共有する。 変更データの
+        :attr:`.StoreChange.source` と :attr:`.StoreChange.data` は変更時点の行の読み取り専用の
+        スナップショットで、書き換えることはできない (ネストした値は行と共有される) 。
+
+        Args:
+            deepcopy: True の場合、ストリームごとに行を deepcopy した変更データを受け取る。
+                受け取ったデータを書き換える場合に指定する
+            batched: True の場合、 1 回の更新 (1 つの CURD メソッドの呼び出し、または
+                :meth:`_batch` ブロック) で発生した変更を :class:`.StoreChangeBatch` にまとめて受け取る
+            maxsize: ストリームに溜める変更データの最大数。 0 の場合は上限なし
+            overflow: 上限に達したときの動作。 ``"drop_oldest"`` は最も古い変更データを、
+                ``"drop_newest"`` は新しい変更データを破棄する
+            conflate: True の場合、未取得の変更データをキー (:attr:`_KEYS`) ごとに最新の 1 件に
+                まとめる
+
         Usage example: :ref:`watch`
         """
-        return StoreStream(self)
+        return StoreStream(
+            self,
+            deepcopy=deepcopy,
+            batched=batched,
+            maxsize=maxsize,
+            overflow=overflow,
+            conflate=conflate,
+        )
+
+
+class _Ladder:
+    """板の片側 (売りまたは買い) の価格ラダー 。
+
+    価格の昇順に並んだ float (または int) のリストと、価格から行へのマップを保持する。
+    """
+
+    __slots__ = ("prices", "levels")
+
+    def __init__(self) -> None:
+        self.prices: list[float] = []
+        self.levels: dict[float, Item] = {}
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def add(self, price: float, item: Item) -> None:
+        if price not in self.levels:
+            bisect.insort(self.prices, price)
+        self.levels[price] = item
+
+    def remove(self, price: float) -> None:
+        if self.levels.pop(price, None) is not None:
+            del self.prices[bisect.bisect_left(self.prices, price)]
+
+    def ascending(self, limit: int | None = None) -> list[Item]:
+        prices = self.prices[:limit] if limit else self.prices
+        return [self.levels[p] for p in prices]
+
+    def descending(self, limit: int | None = None) -> list[Item]:
+        prices = self.prices[-limit:] if limit else self.prices
+        return [self.levels[p] for p in reversed(prices)]
+
+    def iter_ascending(self) -> Iterator[tuple[float, Item]]:
+        return ((p, self.levels[p]) for p in self.prices)
+
+    def iter_descending(self) -> Iterator[tuple[float, Item]]:
+        return ((-p, self.levels[p]) for p in reversed(self.prices))
+
+
+class BookStore(DataStore):
+    """Order book DataStore class.
+
+    板情報の DataStore ベースクラス 。
+    銘柄とサイドごとに価格順のラダーを保持するので、 :meth:`sorted` は全件ソートせずに
+    最良気配から順に板を返す。 価格は行の格納時に一度だけ float に変換される。
+
+    サブクラスは :attr:`_KEYS` に加えて、サイドと価格のキー名、売り板と買い板のサイドの値を
+    設定する。 :attr:`_KEYS` のうちサイドと価格以外のキーが 1 つの板 (銘柄) を識別する。
+    レベルを価格ではなく ID で識別する取引所では、ID のキー名を :attr:`_LEVEL_KEY` に設定する。
+
+    ラダーの並び順は :meth:`_price` の値で決まる。 整数にスケールされた価格を受信する取引所では
+    :meth:`_price` をオーバーライドして行の ``int`` をそのまま返すと、ラダーは行と同じ int
+    オブジェクトを共有し、float の変換と生成を行わない。 1 つの板の価格の型は揃える。
+    """
+
+    _SIDE_KEY = "side"
+    _PRICE_KEY = "price"
+    _LEVEL_KEY: str | None = None
+    _ASKS = "asks"
+    _BIDS = "bids"
+
+    def __init__(
+        self,
+        name: str | None = None,
+        keys: list[str] | None = None,
+        data: list[Item] | None = None,
+    ) -> None:
+        self._books: dict[tuple[Any, ...], dict[Any, _Ladder]] = {}
+        self._book_keys: tuple[str, ...] = tuple(
+            k
+            for k in (keys if keys else self._KEYS)
+            if k not in (self._SIDE_KEY, self._PRICE_KEY, self._LEVEL_KEY)
+        )
+        super().__init__(name, keys, data)
+
+    def _book_id(self, item: Item) -> tuple[Any, ...]:
+        return tuple(item[k] for k in self._book_keys)
+
+    def _price(self, item: Item) -> float | int:
+        """ラダーの並び順に使う行の価格 。"""
+        return float(item[self._PRICE_KEY])
+
+    def _onadd(self, item: Item) -> None:
+        book_id = self._book_id(item)
+        if book_id not in self._books:
+            self._books[book_id] = {}
+        sides = self._books[book_id]
+        side = item[self._SIDE_KEY]
+        if side not in sides:
+            sides[side] = _Ladder()
+        sides[side].add(self._price(item), item)
+
+    def _onreplace(self, old: Item, item: Item) -> None:
+        # The keys are equal, so the row stays on the same price level.
+        self._books[self._book_id(item)][item[self._SIDE_KEY]].add(
+            self._price(item), item
+        )
+
+    def _onremove(self, item: Item) -> None:
+        sides = self._books.get(self._book_id(item))
+        if sides and (ladder := sides.get(item[self._SIDE_KEY])):
+            ladder.remove(self._price(item))
+
+    def _match_books(self, query: Item) -> list[dict[Any, _Ladder]]:
+        if all(k in query for k in self._book_keys):
+            sides = self._books.get(tuple(query[k] for k in self._book_keys))
+            return [sides] if sides else []
+        return [
+            sides
+            for book_id, sides in self._books.items()
+            if all(
+                query[k] == v
+                for k, v in zip(self._book_keys, book_id, strict=True)
+                if k in query
+            )
+        ]
+
+    def sorted(
+        self, query: Item | None = None, limit: int | None = None
+    ) -> dict[str, list[Item]]:
+        """板情報を売り板と買い板に分類して価格順に取得する。
+
+        Args:
+            query: DataStore をフィルタするクエリ辞書
+            limit: 各サイドの最大件数
+
+        Returns:
+            売り板を価格の昇順、買い板を価格の降順に並べたリストの辞書
+        """
+        if query is None:
+            query = {}
+
+        books = self._match_books(query)
+        extra = {k: v for k, v in query.items() if k not in self._book_keys}
+
+        result: dict[str, list[Item]] = {self._ASKS: [], self._BIDS: []}
+        for side, ascending in ((self._ASKS, True), (self._BIDS, False)):
+            ladders = [sides[side] for sides in books if side in sides]
+            if not ladders:
+                continue
+            if len(ladders) == 1 and not extra:
+                if ascending:
+                    result[side] = ladders[0].ascending(limit)
+                else:
+                    result[side] = ladders[0].descending(limit)
+                continue
+
+            merged = heapq.merge(
+                *(
+                    ladder.iter_ascending() if ascending else ladder.iter_descending()
+                    for ladder in ladders
+                ),
+                key=operator.itemgetter(0),
+            )
+            rows = (
+                item
+                for _, item in merged
+                if all(k in item and v == item[k] for k, v in extra.items())
+            )
+            result[side] = list(itertools.islice(rows, limit or None))
+
+        return result
+
+    def best(self, query: Item | None = None) -> dict[str, Item | None]:
+        """最良気配 (売り板の最安値と買い板の最高値) を取得する。
+
+        ``query`` が銘柄などの板を識別するキーだけで 1 つの板を指定する場合は、
+        価格ラダーの端を参照するだけなので板の大きさによらず定数時間で返す。
+
+        Args:
+            query: DataStore をフィルタするクエリ辞書
+
+        Returns:
+            売り板と買い板の最良気配の行の辞書 (板が空のサイドは ``None``)
+        """
+        if query is None:
+            query = {}
+
+        if len(query) == len(self._book_keys) and all(
+            k in query for k in self._book_keys
+        ):
+            sides = self._books.get(tuple(query[k] for k in self._book_keys), {})
+            asks, bids = sides.get(self._ASKS), sides.get(self._BIDS)
+            return {
+                self._ASKS: asks.levels[asks.prices[0]] if asks else None,
+                self._BIDS: bids.levels[bids.prices[-1]] if bids else None,
+            }
+
+        return {
+            side: rows[0] if rows else None
+            for side, rows in self.sorted(query, limit=1).items()
+        }
+
+    def _trim(self, query: Item, depth: int) -> None:
+        """1 つの板の各サイドを最良気配から ``depth`` 件に制限する 。
+
+        超過したレベルは最良気配から遠い側 (売り板は高値、買い板は安値) から削除する 。
+
+        Args:
+            query: 1 つの板を指定するクエリ辞書
+            depth: 各サイドに残すレベル数
+        """
+        sides = self._books.get(tuple(query[k] for k in self._book_keys))
+        if not sides:
+            return
+        targets: list[Item] = []
+        if (asks := sides.get(self._ASKS)) and (excess := len(asks) - depth) > 0:
+            targets.extend(asks.descending(excess))
+        if (bids := sides.get(self._BIDS)) and (excess := len(bids) - depth) > 0:
+            targets.extend(bids.ascending(excess))
+        self._delete(targets)
+
+    def _crc32(self, query: Item, size_key: str, depth: int = 25) -> int:
+        """板の上位 ``depth`` 件から OKX / Bitget 形式のチェックサムを計算する 。
+
+        買い板と売り板のレベルを最良気配から交互に ``価格:数量`` で並べて ``:`` で連結した文字列の
+        CRC32 を符号付き 32 ビット整数で返す 。 価格と数量は受信した文字列のまま使う 。
+        :const:`_SCHEMA` で変換したフィールドは :const:`_RAW_SUFFIX` のフィールドに残した文字列を
+        使う (残していなければ ``str()`` した値) 。
+        価格ラダーから上位のレベルだけを取り出すので全件のソートは行わない 。
+
+        Args:
+            query: 1 つの板を指定するクエリ辞書
+            size_key: 数量のキー名
+            depth: 各サイドの件数
+        """
+        book = self.sorted(query, limit=depth)
+        bids, asks = book[self._BIDS], book[self._ASKS]
+        suffix = self._RAW_SUFFIX
+        parts: list[str] = []
+        for i in range(max(len(bids), len(asks))):
+            for levels in (bids, asks):
+                if i < len(levels):
+                    level = levels[i]
+                    for key in (self._PRICE_KEY, size_key):
+                        value = level[key]
+                        if not isinstance(value, str):
+                            raw = level.get(key + suffix) if suffix else None
+                            value = raw if isinstance(raw, str) else str(value)
+                        parts.append(value)
+        crc = zlib.crc32(":".join(parts).encode())
+        return crc - (1 << 32) if crc & (1 << 31) else crc
+
+
+_REMOVED: Any = object()
+
+
+class RingStore(DataStore):
+    """Append-only DataStore class.
+
+    約定履歴などの追記専用の時系列データの DataStore ベースクラス 。
+    行をリングバッファに追記し、 :const:`_MAXLEN` を超えた行と、最新の行より
+    :const:`_RETENTION` 秒以上古い行を先頭から削除する。
+
+    行の時刻は :const:`_TIME_KEY` のフィールドを :meth:`_time` で UNIX 時間 (秒) に変換して求める。
+    行は時刻の昇順に追記されることを前提とする。 キー (:const:`_KEYS`) と
+    インデックス (:const:`_INDEXES`) は利用できない。
+    """
+
+    _TIME_KEY: str | None = None
+    _TIME_SCALE = 1000.0
+    _RETENTION: float | None = None
+
+    def __init__(
+        self,
+        name: str | None = None,
+        keys: list[str] | None = None,
+        data: list[Item] | None = None,
+    ) -> None:
+        self._rows: list[Item] = []
+        self._times: list[float] = []
+        self._head = 0
+        self._offset = 0
+        self._removed = 0
+        self._newest = float("-inf")
+        super().__init__(name, None, data)
+
+    def __len__(self) -> int:
+        return len(self._rows) - self._head - self._removed
+
+    def __iter__(self) -> Iterator[Item]:
+        rows = itertools.islice(self._rows, self._head, None)
+        if self._removed:
+            return (item for item in rows if item is not _REMOVED)
+        return rows
+
+    def __reversed__(self) -> Iterator[Item]:
+        rows = (self._rows[i] for i in range(len(self._rows) - 1, self._head - 1, -1))
+        if self._removed:
+            return (item for item in rows if item is not _REMOVED)
+        return rows
+
+    def _time(self, item: Item) -> float:
+        """行の時刻を UNIX 時間 (秒) で返す。
+
+        既定では :const:`_TIME_KEY` の値を :const:`_TIME_SCALE` で割る (ミリ秒の場合は 1000) 。
+        """
+        return float(item[cast("str", self._TIME_KEY)]) / self._TIME_SCALE
+
+    def _append(self, operation: Literal["insert", "update"], data: list[Item]) -> None:
+        if self._SCHEMA:
+            data = self._normalize(data)
+        for item in data:
+            self._rows.append(item)
+            if self._TIME_KEY is not None:
+                timestamp = self._time(item)
+                self._times.append(timestamp)
+                if timestamp > self._newest:
+                    self._newest = timestamp
+            self._put(operation, None, item)
+        self._sweep_without_key()
+        self._set()
+
+    def _insert(self, data: list[Item]) -> None:
+        self._append("insert", data)
+
+    def _update(self, data: list[Item]) -> None:
+        self._append("update", data)
+
+    def _sweep_without_key(self) -> None:
+        if self._batching:
+            return
+        head = self._head
+        if len(self._rows) - head > self._MAXLEN:
+            head = len(self._rows) - self._MAXLEN
+        if self._RETENTION is not None and self._times:
+            head = bisect.bisect_left(
+                self._times, self._newest - self._RETENTION, lo=head
+            )
+        if head == self._head:
+            return
+        if self._removed:
+            self._removed -= sum(
+                item is _REMOVED for item in self._rows[self._head : head]
+            )
+        for i in range(self._head, head):
+            self._rows[i] = _REMOVED
+        self._head = head
+        # Compact the evicted prefix once it is at least half of the buffer.
+        if head * 2 >= len(self._rows):
+            del self._rows[:head]
+            del self._times[:head]
+            self._offset += head
+            self._head = 0
+
+    def _clear(self) -> None:
+        for item in self:
+            self._put("delete", None, item)
+        self._offset += len(self._rows)
+        self._rows.clear()
+        self._times.clear()
+        self._head = 0
+        self._removed = 0
+        self._set()
+
+    def _find_with_uuid(self, query: Item | None = None) -> dict[Any, Item]:
+        if query is None:
+            query = {}
+        return {
+            self._offset + i: item
+            for i, item in enumerate(self._rows[self._head :], self._head)
+            if item is not _REMOVED
+            and all(k in item and query[k] == item[k] for k in query)
+        }
+
+    def _remove(self, uuids: list[Any]) -> None:
+        for _id in uuids:
+            i = _id - self._offset
+            if self._head <= i < len(self._rows) and self._rows[i] is not _REMOVED:
+                self._put("delete", None, self._rows[i])
+                self._rows[i] = _REMOVED
+                self._removed += 1
+        self._set()
+
+    def since(self, timestamp: float) -> list[Item]:
+        """指定した時刻以降の行を取得する。
+
+        二分探索で開始位置を求めるので、全件を走査しない。
+
+        Args:
+            timestamp: UNIX 時間 (秒)
+
+        Returns:
+            時刻が ``timestamp`` 以上の行を追記順に並べたリスト
+        """
+        if self._TIME_KEY is None:
+            raise ValueError(f"{type(self).__name__} has no _TIME_KEY")
+        start = bisect.bisect_left(self._times, timestamp, lo=self._head)
+        rows = self._rows[start:]
+        if self._removed:
+            return [item for item in rows if item is not _REMOVED]
+        return rows
 
 
 TDataStore = TypeVar("TDataStore", bound=DataStore)
@@ -313,45 +1281,169 @@ class StoreChange:
         source: 変更に影響したデータ。 なければ None が格納される
         data: 変更されたデータ
 
+    ``source`` と ``data`` は既定では読み取り専用のスナップショット 。
+    書き換える場合は :meth:`.DataStore.watch` に ``deepcopy=True`` を指定する。
+
     Usage example: :ref:`watch`
     """
 
     store: DataStore
     operation: Literal["insert", "update", "delete"]
-    source: Item | None
-    data: Item
+    source: Mapping[str, Any] | None
+    data: Mapping[str, Any]
+
+
+@dataclass
+class StoreChangeBatch:
+    """DataStore の 1 回の更新による変更データをまとめたデータクラス
+
+    変更データを列ごとのリストで保持する。 各リストの同じ位置の要素が 1 つの変更に対応する。
+
+    Attributes:
+        store: 変更対象の DataStore
+        operations: 変更オペレーションのリスト
+        sources: 変更に影響したデータのリスト。 なければ None が格納される
+        data: 変更されたデータのリスト
+
+    Usage example: :ref:`watch`
+    """
+
+    store: DataStore
+    operations: list[Literal["insert", "update", "delete"]]
+    sources: list[Mapping[str, Any] | None]
+    data: list[Mapping[str, Any]]
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __iter__(self) -> Iterator[StoreChange]:
+        """変更データを 1 件ずつ :class:`.StoreChange` として取得する。"""
+        for operation, source, data in zip(
+            self.operations, self.sources, self.data, strict=True
+        ):
+            yield StoreChange(self.store, operation, source, data)
+
 
+_T = TypeVar("_T", StoreChange, StoreChangeBatch)
 
-class StoreStream:
+
+class StoreStream(Generic[_T]):
     """DataStore の変更ストリーム
 
+    Attributes:
+        delivered: 取得された変更データの数
+        dropped: 上限 (``maxsize``) により破棄された変更データの数
+        conflated: 同じキーの新しい変更データにまとめられた変更データの数
+
     Usage example: :ref:`watch`
     """
 
-    def __init__(self, store: "DataStore") -> None:
-        self._queue: asyncio.Queue[StoreChange] = asyncio.Queue()
-        store._queues.append(self._queue)
+    def __init__(
+        self,
+        store: "DataStore",
+        *,
+        deepcopy: bool = False,
+        batched: bool = False,
+        maxsize: int = 0,
+        overflow: Literal["drop_oldest", "drop_newest"] = "drop_oldest",
+        conflate: bool = False,
+    ) -> None:
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Invalid overflow: {overflow}")
+        if conflate and batched:
+            raise ValueError("conflate is not supported for batched streams")
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize)
+        self._deepcopy = deepcopy
+        self._batched = batched
+        self._overflow = overflow
+        self._conflate = conflate
+        self._latest: dict[Any, StoreChange] = {}
+        self._seq = itertools.count()
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self._operations: list[Literal["insert", "update", "delete"]] = []
+        self._sources: list[Mapping[str, Any] | None] = []
+        self._data: list[Mapping[str, Any]] = []
+        store._streams.append(self)
         self._store = store
 
-    async def get(self) -> StoreChange:
-        return await self._queue.get()
+    @property
+    def depth(self) -> int:
+        """取得されていない変更データの数"""
+        return self._queue.qsize()
+
+    def _put(self, change: Any) -> None:
+        if self._conflate:
+            key = self._key(change)
+            if key in self._latest:
+                self._latest[key] = change
+                self.conflated += 1
+                return
+        if self._queue.full():
+            if self._overflow == "drop_newest":
+                self.dropped += 1
+                return
+            oldest = self._queue.get_nowait()
+            if self._conflate:
+                del self._latest[oldest]
+            self.dropped += 1
+        if self._conflate:
+            self._latest[key] = change
+            self._queue.put_nowait(key)
+        else:
+            self._queue.put_nowait(change)
+
+    def _key(self, change: StoreChange) -> Any:
+        if self._store._keys:
+            try:
+                return self._store._keyof(change.data)
+            except KeyError:
+                pass
+        return (next(self._seq),)
+
+    def _flush(self) -> None:
+        self._put(
+            StoreChangeBatch(self._store, self._operations, self._sources, self._data)
+        )
+        self._operations = []
+        self._sources = []
+        self._data = []
+
+    async def get(self) -> _T:
+        item = await self._queue.get()
+        if self._conflate:
+            item = self._latest.pop(item)
+        self.delivered += 1
+        return item
 
     def close(self):
-        self._store._queues.remove(self._queue)
+        self._store._streams.remove(self)
 
-    def __enter__(self) -> "StoreStream":
+    def __enter__(self) -> "StoreStream[_T]":
         return self
 
     def __exit__(self, *args: Any) -> None:
         self.close()
 
-    def __aiter__(self) -> "StoreStream":
+    def __aiter__(self) -> "StoreStream[_T]":
         return self
 
-    async def __anext__(self) -> StoreChange:
+    async def __anext__(self) -> _T:
         return await self.get()
 
 
+class _Route:
+    """:meth:`.DataStoreCollection._route` で登録したチャンネルの経路 。"""
+
+    __slots__ = ("name", "handler", "count")
+
+    def __init__(self, name: str, handler: Callable[..., Any]) -> None:
+        self.name = name
+        self.handler = handler
+        self.count = 0
+
+
 class DataStoreCollection:
     """Abstract DataStoreCollection class.
 
@@ -359,9 +1451,18 @@ class DataStoreCollection:
     DataStore を作成することができ、 1 つまたは複数の DataStore を管理する。
     """
 
+    _ROUTE_CACHE_SIZE = 4096
+
     def __init__(self) -> None:
         self._stores: dict[str, DataStore] = {}
         self._events: list[asyncio.Event] = []
+        self._batching = 0
+        self._changed = False
+        self._routes: dict[str, _Route] = {}
+        self._prefixes: dict[str, Any] = {}
+        self._route_cache: dict[str, _Route | None] = {}
+        self.unrouted = 0
+        self._tasks: set[asyncio.Task[Any]] = set()
         self._iscorofunc = asyncio.iscoroutinefunction(self._onmessage)
         if hasattr(self, "_init"):
             self._init()
@@ -397,6 +1498,92 @@ class DataStoreCollection:
     def _get(self, name: str, type_: type[DataStore] | None = None) -> DataStore | None:
         return self._stores.get(name)
 
+    def _create_task(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task[Any]:
+        """バックグラウンドタスクを作成し、完了するまで参照を保持する。
+
+        イベントループはタスクを弱参照でしか保持しないので、参照を捨てると実行中に
+        ガベージコレクトされることがある。
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _route(
+        self, channel: str, handler: Callable[..., Any], *, prefix: bool = False
+    ) -> None:
+        """チャンネルからハンドラへの経路を登録する。
+
+        :meth:`_init` で登録し、 :meth:`_onmessage` から :meth:`_dispatch` で振り分ける。
+
+        Args:
+            channel: チャンネル名。 ``prefix=True`` の場合はチャンネル名の接頭辞
+            handler: メッセージを渡すハンドラ (通常は DataStore の ``_onmessage``)
+            prefix: 接頭辞で一致させる場合 True 。 完全一致の経路を優先し、複数の接頭辞に
+                一致する場合は最長の接頭辞の経路を使う
+        """
+        if prefix:
+            node = self._prefixes
+            for char in channel:
+                node = node.setdefault(char, {})
+            node[""] = _Route(f"{channel}*", handler)
+        else:
+            self._routes[channel] = _Route(channel, handler)
+        self._route_cache.clear()
+
+    def _resolve(self, channel: str) -> _Route | None:
+        if channel in self._routes:
+            return self._routes[channel]
+        route = None
+        node = self._prefixes
+        for char in channel:
+            if char not in node:
+                break
+            node = node[char]
+            route = node.get("", route)
+        return route
+
+    def _dispatch(self, channel: str, *args: Any) -> bool:
+        """チャンネルに一致する経路のハンドラにメッセージを渡す。
+
+        解決した経路はチャンネルごとにキャッシュするので、 2 回目以降は辞書の参照 1 回で
+        振り分ける。
+
+        Returns:
+            一致する経路があれば True 。 なければ :attr:`unrouted` を加算して False
+        """
+        try:
+            route = self._route_cache[channel]
+        except KeyError:
+            route = self._resolve(channel)
+            if len(self._route_cache) >= self._ROUTE_CACHE_SIZE:
+                self._route_cache.clear()
+            self._route_cache[channel] = route
+        if route is None:
+            self.unrouted += 1
+            return False
+        route.count += 1
+        route.handler(*args)
+        return True
+
+    @property
+    def route_counts(self) -> dict[str, int]:
+        """経路ごとに振り分けたメッセージ数 。
+
+        接頭辞の経路は ``"candle*"`` のように末尾に ``*`` を付けた名前になる。
+        どの経路にも一致しなかったメッセージ数は :attr:`unrouted` に格納される。
+        """
+        routes = list(self._routes.values())
+        stack = [self._prefixes]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char:
+                    stack.append(child)
+                else:
+                    routes.append(child)
+        return {route.name: route.count for route in routes}
+
     def _onmessage(self, msg: Any, ws: ClientWebSocketResponse | None = None) -> None:
         print(msg)
 
@@ -413,10 +1600,38 @@ class DataStoreCollection:
         self._set()
 
     def _set(self) -> None:
+        if self._batching:
+            self._changed = True
+            return
         for event in self._events:
             event.set()
         self._events.clear()
 
+    @contextlib.asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        """配下のすべての DataStore の変更を 1 つのトランザクションとしてまとめる。
+
+        ブロック内で複数のメッセージを :meth:`onmessage` に渡しても、各 DataStore と
+        DataStoreCollection の待機者の起床と変更の配信はブロックを抜けるときに一度だけ行われる。
+
+        .. code-block:: python
+
+            async with store.batch():
+                for msg in messages:
+                    store.onmessage(msg)
+        """
+        with contextlib.ExitStack() as stack:
+            for store in self._stores.values():
+                stack.enter_context(store._batch())
+            self._batching += 1
+            try:
+                yield
+            finally:
+                self._batching -= 1
+        if not self._batching and self._changed:
+            self._changed = False
+            self._set()
+
     async def wait(self) -> None:
         """DataStoreCollection の onmessage ハンドラが呼び出しされるまで待機する。"""
         event = asyncio.Event()
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import contextlib
 import datetime
+import functools
 import hashlib
 import hmac
 import inspect
@@ -19,16 +21,21 @@ from typing import TYPE_CHECKING, Any, cast
 from urllib.parse import urlencode
 
 import aiohttp
+from yarl import URL
 
 from .auth import Auth as _Auth
+from .store import DataStoreCollection
 
 if TYPE_CHECKING:
     from collections.abc import (
         AsyncIterator,
         Awaitable,
+        Callable,
         Generator,
     )
 
+    from aiohttp.typedefs import JSONDecoder, JSONEncoder
+
     from .typedefs import (
         WsBytesHandler,
         WsHeartBeatHandler,
@@ -39,6 +46,17 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_DATA_MSG_TYPES = frozenset({aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY})
+_CLOSE_MSG_TYPES = frozenset(
+    {aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED}
+)
+_KEEPALIVE_MESSAGES = frozenset({"ping", "pong"})
+
+
+def _ws_loads(ws: object) -> JSONDecoder:
+    """WebSocket コネクションに設定された JSON デコーダを返す。 未設定なら :func:`json.loads` 。"""
+    return getattr(ws, "__dict__", {}).get("_json_loads", json.loads)
+
 
 def pretty_modulename(e: Exception) -> str:
     modulename = e.__class__.__name__
@@ -54,6 +72,8 @@ class WebSocketApp:
     _BACKOFF_FACTOR = 1.618
     _BACKOFF_INITIAL = 5.0
     _DEFAULT_BACKOFF = (_BACKOFF_MIN, _BACKOFF_MAX, _BACKOFF_FACTOR, _BACKOFF_INITIAL)
+    # Set when the aiohttp reader has no buffer, so that the warning is logged once
+    _NO_BUFFER = False
 
     def __init__(
         self,
@@ -67,16 +87,32 @@ class WebSocketApp:
         hdlr_bytes: WsBytesHandler | list[WsBytesHandler] | None = None,
         hdlr_json: WsJsonHandler | list[WsJsonHandler] | None = None,
         backoff: tuple[float, float, float, float] = _DEFAULT_BACKOFF,
+        inline: bool = False,
+        drain: bool = False,
+        json_loads: JSONDecoder | None = None,
+        json_dumps: JSONEncoder | None = None,
         **kwargs: Any,
     ) -> None:
         """WebSocket Application.
 
         自動再接続、自動認証、自動 PING/PONG を備えた WebSocket アプリケーション 。
 
+        ``inline`` を有効にすると、受信タスク内でメッセージを一度だけデコードしてハンドラを
+        直接呼び出す。 ``drain`` を有効にすると、受信済みのフレームをまとめて処理してから
+        イベントループに制御を返す。 詳細は :ref:`websocket-inline-dispatch` を参照。
+
+        ``json_loads`` と ``json_dumps`` を指定すると、このコネクションの JSON のデコードと
+        :meth:`.ClientWebSocketResponse.send_json` のエンコードに使う (既定は
+        :class:`.Client` に設定した関数) 。 詳細は :ref:`json-codec` を参照。
+
         Usage example: :ref:`websocketqueue`
         """
         self._session = session
         self._url = url
+        self._inline = inline or drain
+        self._drain = drain
+        self._json_loads = json_loads
+        self._json_dumps = json_dumps
 
         self._loop = session._loop
         self._current_ws: ClientWebSocketResponse | None = None
@@ -84,6 +120,7 @@ class WebSocketApp:
 
         self._autoping = kwargs.pop("autoping", True)
         self._pings: dict[bytes, asyncio.Event] = {}
+        self._received = 0
 
         if send_str is None:
             send_str = []
@@ -100,6 +137,9 @@ class WebSocketApp:
         elif isinstance(send_json, dict):
             send_json = [send_json]
 
+        self._subscriptions = Subscriptions(URL(url).host)
+        self._subscriptions._absorb(send_json)
+
         if hdlr_str is None:
             hdlr_str = []
         elif callable(hdlr_str):
@@ -151,6 +191,36 @@ class WebSocketApp:
         """
         return self._current_ws
 
+    @property
+    def subscriptions(self) -> Subscriptions:
+        """WebSocket subscriptions.
+
+        購読中のチャンネルと、現在のコネクションで確認されたチャンネル 。
+        詳細は :ref:`websocket-subscriptions` を参照。
+        """
+        return self._subscriptions
+
+    async def subscribe(self, *channels: Any) -> None:
+        """Subscribe to channels.
+
+        チャンネルを購読中のチャンネルに追加する。 接続中であれば直ちに購読メッセージを送信し、
+        そうでなければ次回の接続時に購読する。 購読中のチャンネルは再接続時に購読し直される。
+
+        Args:
+            channels: 取引所の購読メッセージの形式のチャンネル
+        """
+        await self._subscriptions._update(True, channels)
+
+    async def unsubscribe(self, *channels: Any) -> None:
+        """Unsubscribe from channels.
+
+        チャンネルを購読中のチャンネルから削除する。 接続中であれば直ちに購読解除メッセージを送信する。
+
+        Args:
+            channels: 取引所の購読メッセージの形式のチャンネル
+        """
+        await self._subscriptions._update(False, channels)
+
     async def _run_forever(
         self,
         *,
@@ -208,11 +278,16 @@ class WebSocketApp:
     ) -> None:
         async with self._session.ws_connect(self._url, autoping=False, **kwargs) as ws:
             ws = cast("ClientWebSocketResponse", ws)
+            if self._json_loads is not None:
+                ws.__dict__["_json_loads"] = self._json_loads
+            if self._json_dumps is not None:
+                ws.__dict__["_json_dumps"] = self._json_dumps
             self._current_ws = ws
             self._event.set()
 
             await ws._wait_authtask()
 
+            send_json = await self._subscriptions._onconnect(ws, send_json)
             await self._ws_send(ws, send_str, send_bytes, send_json)
 
             await self._ws_receive(ws, hdlr_str, hdlr_bytes, hdlr_json)
@@ -237,11 +312,112 @@ class WebSocketApp:
         hdlr_bytes: list[WsBytesHandler],
         hdlr_json: list[WsJsonHandler],
     ) -> None:
+        loads = _ws_loads(ws)
+        if self._inline:
+            await self._ws_receive_inline(ws, hdlr_str, hdlr_bytes, hdlr_json, loads)
+            return
+
         async for msg in ws:
+            self._received += 1
             self._loop.call_soon(
-                self._onmessage, msg, ws, hdlr_str, hdlr_bytes, hdlr_json
+                self._onmessage, msg, ws, hdlr_str, hdlr_bytes, hdlr_json, loads
             )
 
+    async def _ws_receive_inline(
+        self,
+        ws: ClientWebSocketResponse,
+        hdlr_str: list[WsStrHandler],
+        hdlr_bytes: list[WsBytesHandler],
+        hdlr_json: list[WsJsonHandler],
+        loads: JSONDecoder,
+    ) -> None:
+        # Handlers bound to a DataStoreCollection are batched while draining
+        stores = {
+            id(store): store
+            for hdlr in (*hdlr_str, *hdlr_bytes, *hdlr_json)
+            if isinstance(store := getattr(hdlr, "__self__", None), DataStoreCollection)
+        }.values()
+
+        async for msg in ws:
+            self._received += 1
+            if not self._buffered(ws):
+                self._dispatch(msg, ws, hdlr_str, hdlr_bytes, hdlr_json, loads)
+            elif not self._drain:
+                self._dispatch(msg, ws, hdlr_str, hdlr_bytes, hdlr_json, loads)
+                # Let other tasks run between buffered frames
+                await asyncio.sleep(0)
+            else:
+                async with contextlib.AsyncExitStack() as stack:
+                    for store in stores:
+                        await stack.enter_async_context(store.batch())
+                    self._dispatch(msg, ws, hdlr_str, hdlr_bytes, hdlr_json, loads)
+                    while self._buffered(ws):
+                        # Returns without suspending as the frame is already buffered
+                        msg = await ws.receive()
+                        if msg.type in _CLOSE_MSG_TYPES:
+                            break
+                        self._received += 1
+                        self._dispatch(msg, ws, hdlr_str, hdlr_bytes, hdlr_json, loads)
+
+    @classmethod
+    def _buffered(cls, ws: ClientWebSocketResponse) -> bool:
+        """aiohttp のリーダーに受信済みで未読のフレームがあるかを返す。
+
+        aiohttp の非公開の属性を参照する。 属性がない場合は警告を 1 度だけ記録し、
+        フレームを 1 つずつ処理する。
+        """
+        if not hasattr(ws._reader, "_buffer"):
+            if not WebSocketApp._NO_BUFFER:
+                WebSocketApp._NO_BUFFER = True
+                logger.warning(
+                    f"aiohttp {aiohttp.__version__} has no reader buffer, "
+                    "so buffered frames are not drained"
+                )
+            return False
+        return bool(ws._reader._buffer)
+
+    def _dispatch(
+        self,
+        msg: aiohttp.WSMessage,
+        ws: ClientWebSocketResponse,
+        hdlr_str: list[WsStrHandler],
+        hdlr_bytes: list[WsBytesHandler],
+        hdlr_json: list[WsJsonHandler],
+        loads: JSONDecoder,
+    ) -> None:
+        """:meth:`_onmessage` のインライン版 。 ハンドラを受信タスク内で直接呼び出す。
+
+        ハンドラの例外はログに記録して、ほかのハンドラと受信ループには伝播させない。
+        """
+        hdlr: WsStrHandler | WsBytesHandler | WsJsonHandler
+        if msg.type not in _DATA_MSG_TYPES:
+            self._oncontrol(msg, ws)
+            return
+
+        for hdlr in hdlr_str if msg.type == aiohttp.WSMsgType.TEXT else hdlr_bytes:
+            try:
+                hdlr(msg.data, ws)
+            except Exception:
+                logger.exception(f"Error in WebSocket handler {hdlr!r}")
+
+        if hdlr_json or self._subscriptions._pending:
+            try:
+                data = msg.json(loads=loads)
+            except ValueError as e:
+                if hdlr_json and msg.data not in _KEEPALIVE_MESSAGES:
+                    logger.warning(f"{pretty_modulename(e)}: {e} {msg.data}")
+            else:
+                if self._subscriptions._pending:
+                    try:
+                        self._subscriptions._onmessage(data)
+                    except Exception:
+                        logger.exception("Error in WebSocket subscriptions")
+                for hdlr in hdlr_json:
+                    try:
+                        hdlr(data, ws)
+                    except Exception:
+                        logger.exception(f"Error in WebSocket handler {hdlr!r}")
+
     def _onmessage(
         self,
         msg: aiohttp.WSMessage,
@@ -249,6 +425,7 @@ class WebSocketApp:
         hdlr_str: list[WsStrHandler],
         hdlr_bytes: list[WsBytesHandler],
         hdlr_json: list[WsJsonHandler],
+        loads: JSONDecoder = json.loads,
     ) -> None:
         hdlr: WsStrHandler | WsJsonHandler | WsJsonHandler
         if msg.type == aiohttp.WSMsgType.TEXT:
@@ -258,16 +435,24 @@ class WebSocketApp:
             for hdlr in hdlr_bytes:
                 self._loop.call_soon(hdlr, msg.data, ws)
 
-        if hdlr_json and msg.type in {aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY}:
+        if (hdlr_json or self._subscriptions._pending) and msg.type in _DATA_MSG_TYPES:
             try:
-                data = msg.json()
-            except json.JSONDecodeError as e:
-                if msg.data not in {"ping", "pong"}:
-                    logger.warning(f"{pretty_modulename(e)}: {e} {e.doc}")
+                data = msg.json(loads=loads)
+            except ValueError as e:
+                if hdlr_json and msg.data not in _KEEPALIVE_MESSAGES:
+                    logger.warning(f"{pretty_modulename(e)}: {e} {msg.data}")
             else:
+                if self._subscriptions._pending:
+                    try:
+                        self._subscriptions._onmessage(data)
+                    except Exception:
+                        logger.exception("Error in WebSocket subscriptions")
                 for hdlr in hdlr_json:
                     self._loop.call_soon(hdlr, data, ws)
 
+        self._oncontrol(msg, ws)
+
+    def _oncontrol(self, msg: aiohttp.WSMessage, ws: ClientWebSocketResponse) -> None:
         if msg.type == aiohttp.WSMsgType.PING and self._autoping:
             self._loop.create_task(ws.pong(msg.data))
         elif msg.type == aiohttp.WSMsgType.PONG:
@@ -444,7 +629,7 @@ class Auth:
 
         await ws.send_json({"op": "auth", "args": [key, expires, signature]})
         async for msg in ws:
-            data = msg.json()
+            data = msg.json(loads=_ws_loads(ws))
             if data.get("op") == "auth":
                 if not data.get("success"):
                     logger.warning(data)
@@ -477,7 +662,7 @@ class Auth:
             }
         )
         async for msg in ws:
-            data = msg.json()
+            data = msg.json(loads=_ws_loads(ws))
             if data.get("id") == "auth":
                 if "error" in data:
                     logger.warning(data)
@@ -503,7 +688,7 @@ class Auth:
         }
         await ws.send_json(msg_to_send)
         async for msg in ws:
-            data = msg.json()
+            data = msg.json(loads=_ws_loads(ws))
             if data.get("id") == 123:
                 if data.get("error"):
                     logger.warning(data)
@@ -540,8 +725,8 @@ class Auth:
         await ws.send_json(msg_to_send)
         async for msg in ws:
             try:
-                data = msg.json()
-            except json.JSONDecodeError:
+                data = msg.json(loads=_ws_loads(ws))
+            except ValueError:
                 pass
             else:
                 event = data.get("event")
@@ -586,8 +771,8 @@ class Auth:
         await ws.send_json(msg_to_send)
         async for msg in ws:
             try:
-                data = msg.json()
-            except json.JSONDecodeError:
+                data = msg.json(loads=_ws_loads(ws))
+            except ValueError:
                 pass
             else:
                 event = data.get("event")
@@ -647,8 +832,10 @@ class Auth:
             if msg.type != aiohttp.WSMsgType.BINARY:
                 continue
             try:
-                data = json.loads(zlib.decompress(msg.data, -zlib.MAX_WBITS))
-            except json.JSONDecodeError:
+                data = _ws_loads(ws)(
+                    zlib.decompress(msg.data, -zlib.MAX_WBITS).decode()
+                )
+            except ValueError:
                 pass
             else:
                 event = data.get("event")
@@ -705,7 +892,7 @@ class Auth:
             if msg.type != aiohttp.WSMsgType.TEXT:
                 continue
 
-            data: dict[str, Any] = msg.json()
+            data: dict[str, Any] = msg.json(loads=_ws_loads(ws))
             if data.get("ch") == "auth":
                 if data.get("code") == 200:
                     break
@@ -736,7 +923,7 @@ class Auth:
         await ws.send_json(msg_to_send)
 
         async for msg in ws:
-            data: object = msg.json()
+            data: object = msg.json(loads=_ws_loads(ws))
             if isinstance(data, dict) and "success" in data:
                 if not data["success"]:
                     logger.warning(data)
@@ -816,6 +1003,9 @@ class ClientWebSocketResponse(aiohttp.ClientWebSocketResponse):
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
+        session_dict = self._response._session.__dict__
+        self.__dict__["_json_loads"] = session_dict.get("_json_loads", json.loads)
+        self.__dict__["_json_dumps"] = session_dict.get("_json_dumps", json.dumps)
         if self._response.url.host in HeartbeatHosts.items:
             self.__dict__["_pingtask"] = asyncio.create_task(
                 HeartbeatHosts.items[self._response.url.host](self)
@@ -829,7 +1019,6 @@ class ClientWebSocketResponse(aiohttp.ClientWebSocketResponse):
                     self.__dict__["_authtask"] = asyncio.create_task(
                         AuthHosts.items[self._response.url.host].func(self)
                     )
-        self._lock = asyncio.Lock()
 
     async def _wait_authtask(self):
         if "_authtask" in self.__dict__:
@@ -857,45 +1046,112 @@ class ClientWebSocketResponse(aiohttp.ClientWebSocketResponse):
             if data:
                 MessageSignHosts.items[self._response.url.host].func(self, data)
 
+        if "dumps" not in kwargs:
+            kwargs["dumps"] = self.__dict__["_json_dumps"]
         return await super().send_json(*args, **kwargs)
 
+    async def receive_json(self, *args, **kwargs) -> Any:
+        """Receive a message and decode it as JSON."""
+        if "loads" not in kwargs:
+            kwargs["loads"] = self.__dict__["_json_loads"]
+        return await super().receive_json(*args, **kwargs)
 
-class RequestLimit:
-    @staticmethod
-    async def gmocoin(ws: ClientWebSocketResponse, send_str: Awaitable[None]):
-        session = cast("aiohttp.ClientSession", ws._response._session)
-        async with ws._lock:
-            await send_str
-            r = await session.get("https://api.coin.z.com/public/v1/status", auth=_Auth)
-            data = await r.json()
-            before = datetime.datetime.fromisoformat(data["responsetime"][:-1])
-            while True:
-                await asyncio.sleep(1.0)
-                r = await session.get(
-                    "https://api.coin.z.com/public/v1/status", auth=_Auth
-                )
-                data = await r.json()
-                after = datetime.datetime.fromisoformat(data["responsetime"][:-1])
-                delta = after - before
-                if delta.total_seconds() >= 1.0:
-                    break
+    async def _resubscribe(self, channels: list[Any]) -> None:
+        """チャンネルを購読し直す。
 
-    @staticmethod
-    async def binance(ws: ClientWebSocketResponse, send_str: Awaitable[None]) -> None:
-        session = cast("aiohttp.ClientSession", ws._response._session)
-        async with ws._lock:
-            await send_str
-            r = await session.get("https://api.binance.com/api/v3/time", auth=None)
-            data = await r.json()
-            before = datetime.datetime.fromtimestamp(data["serverTime"] / 1000)
-            while True:
-                await asyncio.sleep(0.25)  # limit of 5 incoming messages per second
-                r = await session.get("https://api.binance.com/api/v3/time", auth=None)
-                data = await r.json()
-                after = datetime.datetime.fromtimestamp(data["serverTime"] / 1000)
-                delta = after - before
-                if delta.total_seconds() > 0.25:
-                    break
+        データストアが板の不整合を検出した際に、スナップショットを受信し直すために使う。
+        :class:`WebSocketApp` のコネクションでは :class:`Subscriptions` を通して送信する。
+        """
+        subscriptions = self.__dict__.get("_subscriptions")
+        if subscriptions is not None and subscriptions._ws is self:
+            await subscriptions._resubscribe(self, channels)
+        else:
+            await self.send_json({"op": "unsubscribe", "args": channels})
+            await self.send_json({"op": "subscribe", "args": channels})
+
+
+class TokenBucket:
+    """送信レート制限のトークンバケット 。
+
+    ``rate`` 個/秒でトークンを補充し、最大 ``burst`` 個まで貯める。 :meth:`acquire` は
+    トークンを 1 つ予約し、トークンが補充されるまでローカルの時計 (:func:`time.monotonic`)
+    で待機する。 予約は呼び出し順に行われるので、同時に待機しても送信の順序は保たれる。
+
+    Args:
+        rate: 1 秒あたりのトークンの補充数
+        burst: 貯めておけるトークンの最大数
+    """
+
+    __slots__ = ("rate", "burst", "_tokens", "_last")
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def reserve(self) -> float:
+        """トークンを 1 つ予約して、使用可能になるまでの秒数を返す。"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= 1.0
+        return -self._tokens / self.rate if self._tokens < 0.0 else 0.0
+
+    async def acquire(self) -> None:
+        """トークンを 1 つ取得する。 不足している場合は補充されるまで待機する。"""
+        delay = self.reserve()
+        if delay > 0.0:
+            await asyncio.sleep(delay)
+
+
+class TokenBucketLimit:
+    """トークンバケットによる WebSocket の送信レート制限 。
+
+    :class:`RequestLimitHosts` に登録する :data:`.WsRateLimitHandler` 。
+    ``shared`` が有効な場合は同じホストへのすべてのコネクションで 1 つのバケットを共有し
+    (IP アドレス単位の制限) 、無効な場合はコネクションごとにバケットを持つ。
+
+    Args:
+        rate: 1 秒あたりの送信メッセージ数
+        burst: 連続して送信できるメッセージ数
+        shared: ホスト単位でバケットを共有する
+    """
+
+    def __init__(
+        self, rate: float, burst: float = 1.0, *, shared: bool = False
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.shared = shared
+        self._buckets: dict[str | None, TokenBucket] = {}
+
+    def bucket(self, ws: ClientWebSocketResponse) -> TokenBucket:
+        """コネクションに適用するトークンバケットを返す。"""
+        if self.shared:
+            host = ws._response.url.host
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+        buckets: dict[TokenBucketLimit, TokenBucket] = ws.__dict__.setdefault(
+            "_buckets", {}
+        )
+        if self not in buckets:
+            buckets[self] = TokenBucket(self.rate, self.burst)
+        return buckets[self]
+
+    async def __call__(
+        self, ws: ClientWebSocketResponse, send_str: Awaitable[None]
+    ) -> None:
+        await self.bucket(ws).acquire()
+        await send_str
+
+
+class RequestLimit:
+    # Public WebSocket subscriptions are limited to 1 per second per IP address
+    gmocoin = TokenBucketLimit(1.0, shared=True)
+    # 5 incoming messages per second per connection, including PING/PONG frames
+    binance = TokenBucketLimit(4.0)
 
 
 class RequestLimitHosts:
@@ -905,6 +1161,659 @@ class RequestLimitHosts:
     }
 
 
+class Coalesce:
+    """購読メッセージの結合 。
+
+    同じ操作の連続する購読 / 購読解除メッセージを、取引所が 1 つのメッセージで許可する
+    チャンネル数の範囲で 1 つのフレームにまとめる。 ほかのメッセージと順序は変えない。
+    """
+
+    @staticmethod
+    def _merge(
+        messages: list[dict],
+        *,
+        op_key: str,
+        ops: tuple[str, ...],
+        args_key: str,
+        id_key: str | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        merged: list[dict] = []
+        mergeable = False
+        for msg in messages:
+            if msg.get(op_key) not in ops or not isinstance(msg.get(args_key), list):
+                merged.append(msg)
+                mergeable = False
+                continue
+            if mergeable:
+                prev = merged[-1]
+                if (
+                    (limit is None or len(prev[args_key]) + len(msg[args_key]) <= limit)
+                    and prev.keys() == msg.keys()
+                    and all(
+                        prev[k] == v
+                        for k, v in msg.items()
+                        if k != args_key and k != id_key
+                    )
+                ):
+                    prev[args_key].extend(msg[args_key])
+                    continue
+            # Copy so that the messages resent on reconnection are left intact
+            merged.append({**msg, args_key: list(msg[args_key])})
+            mergeable = True
+        return merged
+
+    @staticmethod
+    def binance(messages: list[dict]) -> list[dict]:
+        return Coalesce._merge(
+            messages,
+            op_key="method",
+            ops=("SUBSCRIBE", "UNSUBSCRIBE"),
+            args_key="params",
+            id_key="id",
+        )
+
+    @staticmethod
+    def bybit(messages: list[dict]) -> list[dict]:
+        # Spot accepts up to 10 args per request
+        return Coalesce._merge(
+            messages,
+            op_key="op",
+            ops=("subscribe", "unsubscribe"),
+            args_key="args",
+            id_key="req_id",
+            limit=10,
+        )
+
+    @staticmethod
+    def okx(messages: list[dict]) -> list[dict]:
+        return Coalesce._merge(
+            messages,
+            op_key="op",
+            ops=("subscribe", "unsubscribe"),
+            args_key="args",
+            id_key="id",
+        )
+
+
+class CoalesceHosts:
+    items: dict[str | None, Callable[[list[dict]], list[dict]]] = {
+        "stream.binance.com": Coalesce.binance,
+        "fstream.binance.com": Coalesce.binance,
+        "dstream.binance.com": Coalesce.binance,
+        "stream.bybit.com": Coalesce.bybit,
+        "stream-testnet.bybit.com": Coalesce.bybit,
+        "ws.okx.com": Coalesce.okx,
+        "wsaws.okx.com": Coalesce.okx,
+        "wspap.okx.com": Coalesce.okx,
+        "ws.bitget.com": Coalesce.okx,
+    }
+
+
+class SubscriptionProtocol:
+    """購読メッセージのプロトコル 。
+
+    :class:`Subscriptions` が購読メッセージの解析と生成、購読の応答の判定に使う。
+    既定の実装は ``{"op": "subscribe", "args": [...]}`` 形式 。
+    """
+
+    _OP_KEY = "op"
+    _OPS = ("subscribe", "unsubscribe")
+    _ARGS_KEY = "args"
+    _ID_KEY: str | None = None
+
+    def parse(self, msg: dict) -> tuple[bool, list[Any]] | None:
+        """購読メッセージを (購読かどうか, チャンネルのリスト) に変換する。 購読メッセージでなければ None 。"""
+        op = msg.get(self._OP_KEY)
+        if op not in self._OPS or not isinstance(msg.get(self._ARGS_KEY), list):
+            return None
+        return op == self._OPS[0], msg[self._ARGS_KEY]
+
+    def build(self, subscribe: bool, channel: Any) -> dict:
+        """1 つのチャンネルの購読メッセージを生成する。"""
+        return {self._OP_KEY: self._OPS[not subscribe], self._ARGS_KEY: [channel]}
+
+    def replace(self, msg: dict, channels: list[Any]) -> dict:
+        """購読メッセージのチャンネルを置き換える。 ほかのフィールドはそのまま残す。"""
+        return {**msg, self._ARGS_KEY: channels}
+
+    def identify(self, msg: dict, request_id: int) -> dict:
+        """購読メッセージにリクエスト ID を設定する。"""
+        if self._ID_KEY is None:
+            return msg
+        return {**msg, self._ID_KEY: request_id}
+
+    def response(self, data: Any) -> tuple[Any, Any, bool] | None:
+        """受信したメッセージが購読の応答であれば (リクエスト ID, チャンネル, 成功したか) を返す。
+
+        応答にチャンネルが含まれる取引所ではチャンネルも返し、チャンネルごとに判定する。
+        どの購読の応答か分からない失敗は (None, None, False) を返す。
+        """
+        return None
+
+
+class BinanceSubscription(SubscriptionProtocol):
+    _OP_KEY = "method"
+    _OPS = ("SUBSCRIBE", "UNSUBSCRIBE")
+    _ARGS_KEY = "params"
+    _ID_KEY = "id"
+
+    def response(self, data: Any) -> tuple[Any, Any, bool] | None:
+        if (
+            isinstance(data, dict)
+            and "id" in data
+            and ("result" in data or "error" in data)
+        ):
+            return data["id"], None, "error" not in data
+        return None
+
+
+class BybitSubscription(SubscriptionProtocol):
+    _ID_KEY = "req_id"
+
+    def identify(self, msg: dict, request_id: int) -> dict:
+        return {**msg, "req_id": str(request_id)}
+
+    def response(self, data: Any) -> tuple[Any, Any, bool] | None:
+        if isinstance(data, dict) and data.get("op") in self._OPS and "success" in data:
+            return data.get("req_id"), None, bool(data["success"])
+        return None
+
+
+class OKXSubscription(SubscriptionProtocol):
+    _ID_KEY: str | None = "id"
+
+    def identify(self, msg: dict, request_id: int) -> dict:
+        if self._ID_KEY is None:
+            return msg
+        return {**msg, self._ID_KEY: str(request_id)}
+
+    def response(self, data: Any) -> tuple[Any, Any, bool] | None:
+        if not isinstance(data, dict):
+            return None
+        if data.get("event") in self._OPS and "arg" in data:
+            return data.get("id"), data["arg"], True
+        if data.get("event") == "error":
+            # Error events carry the id of the request but not the channel
+            return data.get("id"), None, False
+        return None
+
+
+class BitgetSubscription(OKXSubscription):
+    _ID_KEY = None
+
+
+class bitFlyerSubscription(SubscriptionProtocol):
+    _ID_KEY = "id"
+
+    def parse(self, msg: dict) -> tuple[bool, list[Any]] | None:
+        params = msg.get("params")
+        if msg.get("method") not in self._OPS or not isinstance(params, dict):
+            return None
+        if "channel" not in params:
+            return None
+        return msg["method"] == self._OPS[0], [params["channel"]]
+
+    def build(self, subscribe: bool, channel: Any) -> dict:
+        return {"method": self._OPS[not subscribe], "params": {"channel": channel}}
+
+    def response(self, data: Any) -> tuple[Any, Any, bool] | None:
+        if (
+            isinstance(data, dict)
+            and "id" in data
+            and ("result" in data or "error" in data)
+        ):
+            return data["id"], None, data.get("result") is True
+        return None
+
+
+class SubscriptionHosts:
+    # NOTE: yarl.URL.host is also allowed to be None. So, for brevity, relax the type check on the `items` key.
+    items: dict[str | None, SubscriptionProtocol] = {
+        "stream.binance.com": BinanceSubscription(),
+        "fstream.binance.com": BinanceSubscription(),
+        "dstream.binance.com": BinanceSubscription(),
+        "stream.bybit.com": BybitSubscription(),
+        "stream-testnet.bybit.com": BybitSubscription(),
+        "ws.okx.com": OKXSubscription(),
+        "wsaws.okx.com": OKXSubscription(),
+        "wspap.okx.com": OKXSubscription(),
+        "ws.bitget.com": BitgetSubscription(),
+        "ws.lightstream.bitflyer.com": bitFlyerSubscription(),
+    }
+
+
+class Subscriptions:
+    """WebSocket subscriptions.
+
+    :class:`WebSocketApp` の購読中のチャンネルを管理する。 :meth:`WebSocketApp.subscribe` と
+    :meth:`WebSocketApp.unsubscribe` で変更したチャンネルを送信し、再接続時には購読中の
+    チャンネルだけを :class:`CoalesceHosts` の範囲でまとめて購読し直す。
+
+    チャンネルの形式は取引所の購読メッセージに従う (Binance の ``"btcusdt@trade"`` 、
+    OKX の ``{"channel": "books", "instId": "BTC-USDT"}`` など) 。
+    """
+
+    def __init__(self, host: str | None) -> None:
+        self._host = host
+        self._protocol = SubscriptionHosts.items.get(host)
+        self._ws: ClientWebSocketResponse | None = None
+        self._active: dict[str, Any] = {}
+        self._confirmed: set[str] = set()
+        self._pending: dict[str, bool] = {}
+        self._requests: dict[Any, list[str]] = {}
+        self._request_id = 0
+        # Set by WebSocketGroup to move channels between shards before resubscribing
+        self._rebalance: Callable[[], Awaitable[None]] | None = None
+
+    @property
+    def active(self) -> list[Any]:
+        """購読中のチャンネル 。 再接続時にはこれらのチャンネルを購読し直す。"""
+        return list(self._active.values())
+
+    @property
+    def confirmed(self) -> list[Any]:
+        """現在のコネクションで取引所が購読を確認したチャンネル 。"""
+        return [v for k, v in self._active.items() if k in self._confirmed]
+
+    @property
+    def pending(self) -> list[Any]:
+        """現在のコネクションで購読の応答を待っているチャンネル 。"""
+        return [v for k, v in self._active.items() if self._pending.get(k)]
+
+    @staticmethod
+    def _key(channel: Any) -> str:
+        return json.dumps(channel, sort_keys=True)
+
+    def _absorb(self, send_json: list[dict]) -> None:
+        """``send_json`` の購読メッセージのチャンネルを購読中のチャンネルに取り込む。"""
+        if self._protocol is None:
+            return
+        for msg in send_json:
+            parsed = self._protocol.parse(msg)
+            if parsed is None:
+                continue
+            subscribe, channels = parsed
+            for channel in channels:
+                if subscribe:
+                    self._active[self._key(channel)] = channel
+                else:
+                    self._active.pop(self._key(channel), None)
+
+    async def _onconnect(
+        self, ws: ClientWebSocketResponse, send_json: list[dict]
+    ) -> list[dict]:
+        """接続時に送信する ``send_json`` を返す。
+
+        ``send_json`` の購読メッセージは購読中のチャンネルだけに絞り込み、ほかのフィールドと
+        メッセージの順序はそのまま残す。 ``send_json`` にない購読中のチャンネルは末尾で購読する。
+        """
+        if self._protocol is None:
+            return self._coalesce(send_json)
+        # The shards are balanced when they are created, so only on reconnection
+        if self._rebalance is not None and self._ws is not None:
+            await self._rebalance()
+        self._ws = ws
+        ws.__dict__["_subscriptions"] = self
+        self._confirmed.clear()
+        self._pending.clear()
+        self._requests.clear()
+
+        messages: list[dict] = []
+        covered: set[str] = set()
+        for msg in send_json:
+            parsed = self._protocol.parse(msg)
+            if parsed is None or not parsed[0]:
+                messages.append(msg)
+                continue
+            channels = []
+            for channel in parsed[1]:
+                key = self._key(channel)
+                if key in self._active and key not in covered:
+                    channels.append(channel)
+                    covered.add(key)
+            if len(channels) == len(parsed[1]):
+                messages.append(msg)
+            elif channels:
+                messages.append(self._protocol.replace(msg, channels))
+        messages.extend(
+            self._protocol.build(True, channel)
+            for key, channel in self._active.items()
+            if key not in covered
+        )
+        return self._track(messages)
+
+    async def _update(self, subscribe: bool, channels: tuple[Any, ...]) -> None:
+        if self._protocol is None:
+            raise ValueError(f"Subscriptions are not supported for {self._host}")
+        changed: list[Any] = []
+        for channel in channels:
+            key = self._key(channel)
+            if subscribe and key not in self._active:
+                self._active[key] = channel
+            elif not subscribe and key in self._active:
+                del self._active[key]
+                self._confirmed.discard(key)
+            else:
+                continue
+            changed.append(channel)
+        # Otherwise the channels are sent on the next connection
+        if changed and self._ws is not None and not self._ws.closed:
+            await self._send(self._ws, subscribe, changed)
+
+    async def _resubscribe(
+        self, ws: ClientWebSocketResponse, channels: list[Any]
+    ) -> None:
+        """チャンネルの購読を解除して購読し直す。
+
+        購読中のチャンネルは購読の応答を待つ。 購読解除の応答と、リクエスト ID のない
+        取引所 (Bitget) の応答は待たない。
+        """
+        protocol = cast("SubscriptionProtocol", self._protocol)
+        active = [x for x in channels if self._key(x) in self._active]
+        others = [x for x in channels if self._key(x) not in self._active]
+        if protocol._ID_KEY is None:
+            # The acks cannot be told apart from those of the unsubscription
+            active, others = [], channels
+        self._confirmed.difference_update(self._key(x) for x in active)
+        # The acks of the untracked request IDs are ignored
+        messages = [
+            self._identify(msg)
+            for msg in self._coalesce([protocol.build(False, x) for x in channels])
+        ]
+        messages.extend(self._track([protocol.build(True, x) for x in active]))
+        messages.extend(
+            self._identify(msg)
+            for msg in self._coalesce([protocol.build(True, x) for x in others])
+        )
+        for msg in messages:
+            await ws.send_json(msg)
+
+    async def _send(
+        self, ws: ClientWebSocketResponse, subscribe: bool, channels: list[Any]
+    ) -> None:
+        protocol = cast("SubscriptionProtocol", self._protocol)
+        messages = self._track([protocol.build(subscribe, x) for x in channels])
+        await asyncio.gather(*(ws.send_json(msg) for msg in messages))
+
+    def _coalesce(self, messages: list[dict]) -> list[dict]:
+        if self._host in CoalesceHosts.items:
+            return CoalesceHosts.items[self._host](messages)
+        return messages
+
+    def _track(self, messages: list[dict]) -> list[dict]:
+        """購読メッセージを :class:`CoalesceHosts` の範囲でまとめ、応答待ちに登録する。
+
+        リクエスト ID のないメッセージにはリクエスト ID を設定する。
+        """
+        protocol = cast("SubscriptionProtocol", self._protocol)
+        tracked: list[dict] = []
+        for msg in self._coalesce(messages):
+            parsed = protocol.parse(msg)
+            if parsed is not None:
+                keys = [self._key(channel) for channel in parsed[1]]
+                for key in keys:
+                    self._pending[key] = parsed[0]
+                if protocol._ID_KEY is not None:
+                    if protocol._ID_KEY not in msg:
+                        msg = self._identify(msg)
+                    elif isinstance(msg[protocol._ID_KEY], int):
+                        self._request_id = max(self._request_id, msg[protocol._ID_KEY])
+                    self._requests[msg[protocol._ID_KEY]] = keys
+            tracked.append(msg)
+        return tracked
+
+    def _identify(self, msg: dict) -> dict:
+        protocol = cast("SubscriptionProtocol", self._protocol)
+        if protocol._ID_KEY is None:
+            return msg
+        # Skip the IDs given in send_json
+        while True:
+            self._request_id += 1
+            identified = protocol.identify(msg, self._request_id)
+            if identified[protocol._ID_KEY] not in self._requests:
+                return identified
+
+    def _onmessage(self, data: Any) -> None:
+        ack = cast("SubscriptionProtocol", self._protocol).response(data)
+        if ack is None:
+            return
+        request_id, channel, success = ack
+        if channel is not None:
+            keys = [self._key(channel)]
+            if request_id is not None:
+                # Acknowledged one channel at a time
+                request = self._requests.get(request_id)
+                if request is None or keys[0] not in request:
+                    return
+                request.remove(keys[0])
+                if not request:
+                    del self._requests[request_id]
+        elif request_id is not None:
+            keys = self._requests.pop(request_id, [])
+        else:
+            # The failed request is unknown, so the pending channels are left as is
+            if not success:
+                logger.warning(f"Subscription failed: {data}")
+            return
+        for key in keys:
+            if not self._pending.pop(key, False):
+                continue
+            if success:
+                if key in self._active:
+                    self._confirmed.add(key)
+            else:
+                # Not resubscribed on reconnection
+                self._active.pop(key, None)
+        if keys and not success:
+            logger.warning(f"Subscription failed: {data}")
+
+
+class WebSocketGroup:
+    """Sharded WebSocket connections.
+
+    多数のチャンネルを複数の WebSocket コネクション (シャード) に分散して購読する。
+    すべてのシャードは同じハンドラ (:meth:`.DataStoreCollection.onmessage` など) を共有する。
+
+    ``weights`` を指定しない場合はチャンネルのハッシュでシャードを決める。 この割り当ては
+    プロセスをまたいでも変わらない。 ``weights`` を指定した場合はチャンネルごとの重みの合計が
+    均等になるように割り当て、シャードが再接続する際にそのシャードと他のシャードの間で
+    チャンネルを移動して偏りを解消する。
+
+    購読の管理には :class:`Subscriptions` を使うので、対応しているホストは
+    ``SubscriptionHosts.items`` と同じ 。 詳細は :ref:`websocket-sharding` を参照。
+    """
+
+    def __init__(
+        self,
+        connect: Callable[..., WebSocketApp],
+        url: str,
+        channels: list[Any],
+        *,
+        shards: int,
+        weights: list[float] | None = None,
+        send_json: dict | list[dict] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        protocol = SubscriptionHosts.items.get(URL(url).host)
+        if protocol is None:
+            raise ValueError(f"Subscriptions are not supported for {URL(url).host}")
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if weights is not None and len(weights) != len(channels):
+            raise ValueError("weights must have the same length as channels")
+
+        if send_json is None:
+            send_json = []
+        elif isinstance(send_json, dict):
+            send_json = [send_json]
+
+        self._weighted = weights is not None
+        self._weights: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+        assigned: list[list[Any]] = [[] for _ in range(shards)]
+        loads = [0.0] * shards
+        order = list(zip(channels, weights or [1.0] * len(channels), strict=True))
+        if self._weighted:
+            # Heaviest first so that the greedy placement stays close to even
+            order.sort(key=lambda x: x[1], reverse=True)
+        for channel, weight in order:
+            index = self._place(channel, loads)
+            assigned[index].append(channel)
+            loads[index] += weight
+            self._weights[Subscriptions._key(channel)] = weight
+
+        self._apps = [
+            connect(
+                url,
+                send_json=[*send_json, *(protocol.build(True, x) for x in shard)],
+                **kwargs,
+            )
+            for shard in assigned
+        ]
+        for index, app in enumerate(self._apps):
+            app._subscriptions._rebalance = functools.partial(self._rebalance, index)
+
+        self._sampled_at = time.monotonic()
+        self._sampled = [0] * shards
+
+    @property
+    def shards(self) -> list[WebSocketApp]:
+        """シャードの :class:`WebSocketApp` のリスト 。"""
+        return list(self._apps)
+
+    def _place(self, channel: Any, loads: list[float]) -> int:
+        if self._weighted:
+            return loads.index(min(loads))
+        return zlib.crc32(Subscriptions._key(channel).encode()) % len(loads)
+
+    def _loads(self) -> list[float]:
+        return [
+            sum(self._weights.get(key, 1.0) for key in app._subscriptions._active)
+            for app in self._apps
+        ]
+
+    def _owner(self, channel: Any) -> WebSocketApp | None:
+        key = Subscriptions._key(channel)
+        for app in self._apps:
+            if key in app._subscriptions._active:
+                return app
+        return None
+
+    async def subscribe(self, *channels: Any, weight: float = 1.0) -> None:
+        """Subscribe to channels.
+
+        購読していないチャンネルをシャードに割り当てて購読する。
+
+        Args:
+            channels: 取引所の購読メッセージの形式のチャンネル
+            weight: チャンネルの重み (``weights`` を指定した場合のみ使われる)
+        """
+        async with self._lock:
+            loads = self._loads()
+            assigned: dict[int, list[Any]] = {}
+            for channel in channels:
+                if self._owner(channel) is not None:
+                    continue
+                index = self._place(channel, loads)
+                assigned.setdefault(index, []).append(channel)
+                loads[index] += weight
+                self._weights[Subscriptions._key(channel)] = weight
+            await asyncio.gather(
+                *(self._apps[i].subscribe(*x) for i, x in assigned.items())
+            )
+
+    async def unsubscribe(self, *channels: Any) -> None:
+        """Unsubscribe from channels.
+
+        チャンネルを購読しているシャードで購読を解除する。
+
+        Args:
+            channels: 取引所の購読メッセージの形式のチャンネル
+        """
+        async with self._lock:
+            for channel in channels:
+                app = self._owner(channel)
+                if app is not None:
+                    await app.unsubscribe(channel)
+                self._weights.pop(Subscriptions._key(channel), None)
+
+    async def _rebalance(self, index: int) -> None:
+        """再接続するシャードとほかのシャードの間でチャンネルを移動して、重みの偏りを減らす。
+
+        再接続するシャードはまだ購読し直していないので、移動元で購読を解除してから
+        移動先で購読する。 同じチャンネルのメッセージが重複して届くことはない。
+        """
+        if not self._weighted or len(self._apps) < 2:
+            return
+        async with self._lock:
+            target = self._apps[index]._subscriptions
+            loads = self._loads()
+            others = [i for i in range(len(self._apps)) if i != index]
+            moves: list[tuple[int, int, str]] = []
+            moved: set[str] = set()
+            while True:
+                low = min(others, key=loads.__getitem__)
+                high = max(others, key=loads.__getitem__)
+                for src, dst in ((index, low), (high, index)):
+                    active = self._apps[src]._subscriptions._active
+                    # A move strictly reduces the sum of squared loads, so this terminates
+                    candidates = [
+                        key
+                        for key in active
+                        if key not in moved
+                        and loads[dst] + self._weights.get(key, 1.0) < loads[src]
+                    ]
+                    if candidates:
+                        key = max(candidates, key=lambda k: self._weights.get(k, 1.0))
+                        moves.append((src, dst, key))
+                        moved.add(key)
+                        loads[src] -= self._weights.get(key, 1.0)
+                        loads[dst] += self._weights.get(key, 1.0)
+                        break
+                else:
+                    break
+
+            for src, dst, key in moves:
+                channel = self._apps[src]._subscriptions._active[key]
+                if src == index:
+                    del target._active[key]
+                    await self._apps[dst].subscribe(channel)
+                else:
+                    await self._apps[src].unsubscribe(channel)
+                    target._active[key] = channel
+            if moves:
+                logger.info(f"Rebalanced {len(moves)} channels on shard {index}")
+
+    def rates(self) -> list[float]:
+        """シャードごとの前回の呼び出しからの受信メッセージ数/秒 。"""
+        now = time.monotonic()
+        received = [app._received for app in self._apps]
+        elapsed = now - self._sampled_at
+        rates = [
+            (x - y) / elapsed if elapsed > 0.0 else 0.0
+            for x, y in zip(received, self._sampled, strict=True)
+        ]
+        self._sampled_at = now
+        self._sampled = received
+        return rates
+
+    async def wait(self) -> None:
+        """Wait all shards.
+
+        すべてのシャードの :meth:`WebSocketApp.wait` を待つ。
+        """
+        await asyncio.gather(*(app.wait() for app in self._apps))
+
+    async def _wait_handshake(self) -> "WebSocketGroup":
+        await asyncio.gather(*(app._wait_handshake() for app in self._apps))
+        return self
+
+    def __await__(self) -> Generator[Any, None, "WebSocketGroup"]:
+        return self._wait_handshake().__await__()
+
+
 class MessageSign:
     @staticmethod
     def binance(ws: ClientWebSocketResponse, data: dict[str, Any]):